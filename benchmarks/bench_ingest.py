@@ -0,0 +1,239 @@
+"""
+Ingestion benchmark harness.
+
+Generates a synthetic archive, serves it from a local stub FTP server and
+measures the ingest path against a throwaway test database:
+- validate_xml_structure: parse-only throughput
+- process_batch: the single-row write path
+- process_xml_files: the full task (discovery, download, parse, bulk write)
+
+Each scenario reports files/sec, batches/sec, peak RSS and DB queries per
+batch; results are printed and optionally written as JSON so runs can be
+compared between releases.
+
+Usage:
+    python -m benchmarks.bench_ingest --files 20 --batches 500 --output results.json
+
+Uses DJANGO_SETTINGS_MODULE (default roadstone_project.settings); the cache
+and channel layer configured there must be reachable.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roadstone_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from benchmarks.ftp_server import StubFTPServer  # noqa: E402
+from benchmarks.xml_generator import DAILY_SECTIONS, generate_archive  # noqa: E402
+
+try:
+    import psutil
+except ImportError:  # Fall back to the process high-water mark
+    psutil = None
+
+REMOTE_DIR = '/archive'
+
+class QueryCounter:
+    """connection.execute_wrapper hook counting statements on the benchmark connection"""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+class PeakRSS:
+    """Sample resident memory in the background while a scenario runs"""
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _current(self):
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._current()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+        return False
+
+def measure(name, files, batches, run):
+    """Run a scenario callable and collect its metrics"""
+    counter = QueryCounter()
+    with PeakRSS() as rss, connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        details = run() or {}
+        elapsed = time.perf_counter() - started
+
+    result = {
+        'seconds': round(elapsed, 4),
+        'files': files,
+        'batches': batches,
+        'files_per_sec': round(files / elapsed, 2) if elapsed else None,
+        'batches_per_sec': round(batches / elapsed, 1) if elapsed else None,
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+        'queries': counter.count,
+        'queries_per_batch': round(counter.count / batches, 3) if batches else None,
+    }
+    result.update(details)
+    print(
+        f"{name:<24} {result['seconds']:>8.2f}s {result['files_per_sec']:>9} files/s "
+        f"{result['batches_per_sec']:>10} batches/s {result['peak_rss_mb']:>8} MB "
+        f"{result['queries_per_batch']} queries/batch"
+    )
+    return result
+
+def reset_tables():
+    from data_processing.models import (
+        BatchLog, DailyMaterials, DailyRecipes, OEEDailyData, PlantRunTime, ProcessedFile, RemoteFileListing
+    )
+    for model in (BatchLog, DailyMaterials, DailyRecipes, OEEDailyData, PlantRunTime, ProcessedFile, RemoteFileListing):
+        model.objects.all().delete()
+
+def bench_validate(archive):
+    from data_processing.tasks import validate_xml_structure
+
+    def run():
+        for content in archive.values():
+            tree, root = validate_xml_structure(BytesIO(content))
+            root.clear()
+
+    return run
+
+def bench_process_batch(archive):
+    import xml.etree.ElementTree as ET
+    from data_processing.tasks import process_batch
+
+    def run():
+        inserted = 0
+        for name, content in archive.items():
+            for batch in ET.fromstring(content).iter('BatchLog'):
+                inserted += process_batch(batch, name)
+        return {'inserted': inserted}
+
+    return run
+
+def bench_process_xml_files(server):
+    from data_processing.tasks import process_xml_files
+
+    def run():
+        os.environ.update({
+            'FTP_HOST': '127.0.0.1',
+            'FTP_PORT': str(server.port),
+            'FTP_USER': 'bench',
+            'FTP_PASS': 'bench',
+            'REMOTE_DIR': REMOTE_DIR,
+        })
+        outcome = process_xml_files.apply(kwargs={'parallel': False})
+        if outcome.failed():
+            raise RuntimeError(f"process_xml_files failed: {outcome.result}")
+        return {'task_result': outcome.result}
+
+    return run
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--files', type=int, default=10, help='Report files in the synthetic archive')
+    arg_parser.add_argument('--batches', type=int, default=500, help='BatchLog entries per file')
+    arg_parser.add_argument('--hot-bins', type=int, default=8, help='HotBin entries per batch')
+    arg_parser.add_argument('--sections', default=','.join(DAILY_SECTIONS),
+                            help='Daily report sections to include (comma separated, empty for none)')
+    arg_parser.add_argument('--root-tag', default='DailyXMLReport', choices=['DailyXMLReport', 'BatchLogs'])
+    arg_parser.add_argument('--scenarios', default='validate_xml_structure,process_batch,process_xml_files',
+                            help='Comma separated scenarios to run')
+    arg_parser.add_argument('--output', help='Write JSON results to this path')
+    arg_parser.add_argument('--keepdb', action='store_true', help='Reuse the benchmark test database')
+    args = arg_parser.parse_args()
+
+    sections = tuple(section for section in args.sections.split(',') if section)
+    archive = generate_archive(
+        args.files, batches=args.batches, hot_bins=args.hot_bins,
+        daily_sections=sections, root_tag=args.root_tag
+    )
+    total_batches = args.files * args.batches
+    scenarios = [name for name in args.scenarios.split(',') if name]
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    results = {}
+    try:
+        with StubFTPServer(archive, remote_dir=REMOTE_DIR) as server:
+            runners = {
+                'validate_xml_structure': lambda: bench_validate(archive),
+                'process_batch': lambda: bench_process_batch(archive),
+                'process_xml_files': lambda: bench_process_xml_files(server),
+            }
+            for name in scenarios:
+                reset_tables()
+                results[name] = measure(name, args.files, total_batches, runners[name]())
+
+            from data_processing.tasks import ftp_pool
+            ftp_pool.clear()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    report = {
+        'benchmark': 'ingest',
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'params': {
+            'files': args.files,
+            'batches_per_file': args.batches,
+            'hot_bins': args.hot_bins,
+            'daily_sections': list(sections),
+            'root_tag': args.root_tag,
+            'archive_bytes': sum(len(content) for content in archive.values()),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2, default=str)
+        print(f"Results written to {args.output}")
+    return report
+
+if __name__ == '__main__':
+    main()
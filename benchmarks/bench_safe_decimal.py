@@ -0,0 +1,69 @@
+"""
+Micro-benchmark for the BatchLog numeric conversion path.
+
+Compares the character-filtering conversion (_clean_decimal, the original
+safe_decimal body) with the current safe_decimal fast path, and times
+parse_batch on a representative <BatchLog> element.
+
+Usage:
+    python benchmarks/bench_safe_decimal.py [--number 200000]
+"""
+import argparse
+import os
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roadstone_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from data_processing.tasks import _clean_decimal, _parse_decimal, parse_batch, safe_decimal  # noqa: E402
+
+# Typical report values: repeated zeros/targets plus varying actuals
+SAMPLE_VALUES = ['0.00', '120.00', '12.5', '163.7', '5.50', '6.00', '', '  48.25 ', '1,024.5', '-0.40']
+
+SAMPLE_BATCH = ET.fromstring(
+    "<BatchLog><BatchNo>1042</BatchNo><Time>2025-03-01T08:00:00</Time><JobNo>10</JobNo>"
+    "<RecipeNo>3</RecipeNo><RecipeName>SMA 10</RecipeName>"
+    + "".join(
+        f"<{section}><Actual>{actual}</Actual><Target>{target}</Target></{section}>"
+        for section, actual, target in [
+            ('Bitumen', '120.50', '120.00'), ('Filler', '0.00', '0.00'),
+            ('Reclaim', '12.5', '12.00'), ('Temperature', '163.7', '165.00'),
+        ]
+    )
+    + "".join(f"<HotBin><Actual>{n}.50</Actual><Target>{n}.00</Target></HotBin>" for n in range(1, 9))
+    + "</BatchLog>"
+)
+
+def legacy_safe_decimal(value):
+    if value is None:
+        return None
+    return _clean_decimal(str(value).strip())
+
+def run(label, stmt, number, calls_per_run=1):
+    seconds = min(timeit.repeat(stmt, number=number, repeat=3))
+    print(f"{label:<32} {seconds * 1e9 / (number * calls_per_run):>9.1f} ns/call")
+    return seconds
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--number', type=int, default=200000, help='Conversions per timing run')
+    args = arg_parser.parse_args()
+
+    values = SAMPLE_VALUES
+    number = args.number // len(values)
+
+    legacy = run('legacy safe_decimal', lambda: [legacy_safe_decimal(v) for v in values], number, len(values))
+    _parse_decimal.cache_clear()
+    current = run('safe_decimal (cached fast path)', lambda: [safe_decimal(v) for v in values], number, len(values))
+    print(f"{'speedup':<32} {legacy / current:>9.1f}x")
+    run('parse_batch', lambda: parse_batch(SAMPLE_BATCH), max(1, args.number // 100))
+    print(_parse_decimal.cache_info())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Minimal in-process FTP server serving an in-memory archive.
+
+Implements the subset of RFC 959/3659 the ingest path uses (login, CWD, PASV,
+MLSD, LIST, NLST, SIZE, RETR, NOOP), so benchmarks exercise the real
+ftplib/FTPConnectionManager code over loopback sockets.
+"""
+import socket
+import socketserver
+import threading
+from datetime import datetime, timezone
+
+class StubFTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('utf-8'))
+
+    def handle(self):
+        self.data_listener = None
+        self.reply("220 Stub FTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command, _, arg = line.decode('utf-8').strip().partition(' ')
+            handler = getattr(self, f"ftp_{command.upper()}", None)
+            if handler is None:
+                self.reply(f"502 {command} not implemented")
+                continue
+            if handler(arg) is False:
+                break
+
+    def ftp_USER(self, arg):
+        self.reply("331 Password required")
+
+    def ftp_PASS(self, arg):
+        self.reply("230 Logged in")
+
+    def ftp_CWD(self, arg):
+        if arg.rstrip('/') == self.server.remote_dir.rstrip('/'):
+            self.reply("250 Directory changed")
+        else:
+            self.reply("550 No such directory")
+
+    def ftp_PWD(self, arg):
+        self.reply(f'257 "{self.server.remote_dir}"')
+
+    def ftp_TYPE(self, arg):
+        self.reply("200 Type set")
+
+    def ftp_OPTS(self, arg):
+        self.reply("200 OK")
+
+    def ftp_NOOP(self, arg):
+        self.reply("200 OK")
+
+    def ftp_SYST(self, arg):
+        self.reply("215 UNIX Type: L8")
+
+    def ftp_QUIT(self, arg):
+        self.reply("221 Bye")
+        return False
+
+    def ftp_PASV(self, arg):
+        self.data_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.data_listener.bind(('127.0.0.1', 0))
+        self.data_listener.listen(1)
+        port = self.data_listener.getsockname()[1]
+        self.reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 0xFF})")
+
+    def ftp_SIZE(self, arg):
+        if arg in self.server.files:
+            self.reply(f"213 {len(self.server.files[arg])}")
+        else:
+            self.reply("550 No such file")
+
+    def ftp_MLSD(self, arg):
+        modify = self.server.modified.strftime('%Y%m%d%H%M%S')
+        self._transfer(''.join(
+            f"type=file;size={len(content)};modify={modify}; {name}\r\n"
+            for name, content in self.server.files.items()
+        ).encode('utf-8'))
+
+    def ftp_LIST(self, arg):
+        modified = self.server.modified.strftime('%b %d %H:%M')
+        self._transfer(''.join(
+            f"-rw-r--r--   1 owner    group {len(content):>12} {modified} {name}\r\n"
+            for name, content in self.server.files.items()
+        ).encode('utf-8'))
+
+    def ftp_NLST(self, arg):
+        self._transfer(''.join(f"{name}\r\n" for name in self.server.files).encode('utf-8'))
+
+    def ftp_RETR(self, arg):
+        if arg not in self.server.files:
+            self.reply("550 No such file")
+            return
+        self._transfer(self.server.files[arg])
+
+    def _transfer(self, payload):
+        if self.data_listener is None:
+            self.reply("425 Use PASV first")
+            return
+        self.reply("150 Opening data connection")
+        conn, _ = self.data_listener.accept()
+        try:
+            conn.sendall(payload)
+        finally:
+            conn.close()
+            self.data_listener.close()
+            self.data_listener = None
+        self.reply("226 Transfer complete")
+
+class StubFTPServer(socketserver.ThreadingTCPServer):
+    """
+    Serve `files` ({name: bytes}) from `remote_dir` on 127.0.0.1.
+    Use as a context manager; `port` is assigned on start.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, files, remote_dir='/archive', modified=None):
+        super().__init__(('127.0.0.1', 0), StubFTPHandler)
+        self.files = files
+        self.remote_dir = remote_dir
+        self.modified = modified or datetime.now(timezone.utc)
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='stub-ftp', daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        self.server_close()
+        return False
@@ -0,0 +1,83 @@
+"""
+Synthetic archive generator matching the FTP export format.
+
+Produces BatchLogs / DailyXMLReport documents with a configurable number of
+batches, hot bins and daily report sections, named like the plant's exports
+(Report_DDMMYY.xml) so parse_date_from_filename accepts them.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+DAILY_SECTIONS = ('OEEPerformance', 'PlantRunTime', 'RecipeTotals', 'MaterialTotals')
+
+RECIPES = [(1, 'SMA 10'), (3, 'AC 20 Dense'), (7, 'HRA 30/14'), (12, 'AC 6 Surf')]
+MATERIALS = [(1, 'Bitumen'), (2, 'Filler'), (3, 'Reclaim Asphalt'), (4, '20mm'), (5, '10mm'), (6, 'Dust')]
+RUNTIME_ITEMS = [
+    'Mixing Active', 'Mixer', 'Screen', 'Hot Elevator', 'Dryer', 'Burner Flame On',
+    'Slinger Forward', 'Slinger Reverse', 'Collect Conveyor', 'Dust Blower', 'Dust Blower Rotary Valve',
+]
+
+def _measurement(tag, target, rng):
+    actual = target * rng.uniform(0.97, 1.03)
+    return f"<{tag}><Actual>{actual:.2f}</Actual><Target>{target:.2f}</Target></{tag}>"
+
+def _duration(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def generate_report(report_date, batches=500, hot_bins=8, daily_sections=DAILY_SECTIONS,
+                    root_tag='DailyXMLReport', batch_offset=0, seed=None):
+    """Build one report document as bytes"""
+    rng = random.Random(seed if seed is not None else report_date.toordinal())
+    start = datetime.combine(report_date, datetime.min.time()) + timedelta(hours=6)
+    parts = [f'<?xml version="1.0" encoding="utf-8"?>\n<{root_tag}>']
+
+    for idx in range(batches):
+        recipe_no, recipe_name = RECIPES[idx // 50 % len(RECIPES)]
+        batch_time = start + timedelta(seconds=45 * idx)
+        parts.append(
+            f"<BatchLog><BatchNo>{batch_offset + idx + 1}</BatchNo>"
+            f"<Time>{batch_time.isoformat()}</Time><JobNo>{1000 + idx // 50}</JobNo>"
+            f"<RecipeNo>{recipe_no}</RecipeNo><RecipeName>{recipe_name}</RecipeName>"
+            + _measurement('Bitumen', 120.0, rng)
+            + _measurement('Filler', 40.0, rng)
+            + _measurement('Reclaim', 300.0, rng)
+            + _measurement('Temperature', 165.0, rng)
+            + ''.join(_measurement('HotBin', 250.0 + 25 * n, rng) for n in range(hot_bins))
+            + "</BatchLog>"
+        )
+
+    if 'OEEPerformance' in daily_sections:
+        parts.append(
+            f"<OEEPerformance><TotalProduction>{batches * 3.5:.2f}</TotalProduction>"
+            f"<TotalEmptyOut>{rng.uniform(0, 20):.2f}</TotalEmptyOut>"
+            f"<ProductionBatches>{batches}</ProductionBatches><EmptyOutBatches>{rng.randint(0, 5)}</EmptyOutBatches>"
+            "</OEEPerformance>"
+        )
+    if 'PlantRunTime' in daily_sections:
+        parts.append("<PlantRunTime>" + ''.join(
+            f"<RunTime><ItemName>{item}</ItemName><RunningTime>{_duration(rng.randint(3600, 36000))}</RunningTime></RunTime>"
+            for item in RUNTIME_ITEMS
+        ) + "</PlantRunTime>")
+    if 'RecipeTotals' in daily_sections:
+        parts.append("<RecipeTotals>" + ''.join(
+            f"<RecipeTotal><RecipeNo>{no}</RecipeNo><RecipeName>{name}</RecipeName>"
+            f"<Total>{rng.uniform(50, 500):.2f}</Total></RecipeTotal>"
+            for no, name in RECIPES
+        ) + "</RecipeTotals>")
+    if 'MaterialTotals' in daily_sections:
+        parts.append("<MaterialTotals>" + ''.join(
+            f"<Material><MaterialNo>{no}</MaterialNo><Name>{name}</Name>"
+            f"<Quantity>{rng.uniform(10, 900):.2f}</Quantity></Material>"
+            for no, name in MATERIALS
+        ) + "</MaterialTotals>")
+
+    parts.append(f"</{root_tag}>")
+    return '\n'.join(parts).encode('utf-8')
+
+def generate_archive(files=10, start_date=date(2025, 1, 1), **options):
+    """{filename: content} for consecutive daily reports"""
+    archive = {}
+    for offset in range(files):
+        report_date = start_date + timedelta(days=offset)
+        archive[f"Report_{report_date:%d%m%y}.xml"] = generate_report(report_date, **options)
+    return archive
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Profile, BatchLog, ProcessedFile,ParsingSchedule, ParsingTask
+from .models import Profile, BatchLog, ProcessedFile,ParsingSchedule, ParsingTask, DailyProductionRollup, ExportJob, EnergyMeterWatermark, EnergyDataGap, RemoteFileListing
 
 class ProfileInline(admin.StackedInline):
     model = Profile
@@ -74,9 +74,59 @@ class BatchLogAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(DailyProductionRollup)
+class DailyProductionRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        'date', 'RecipeName', 'batch_count', 'Bitumen_Actual', 'Filler_Actual', 'Reclaim_Actual', 'updated_at'
+    )
+    list_filter = ('date',)
+    search_fields = ('RecipeName',)
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'dataset', 'file_format', 'status', 'rows_written', 'rows_total', 'file_size',
+        'created_by', 'created_at', 'completed_at'
+    )
+    list_filter = ('status', 'dataset', 'file_format', 'created_at')
+    readonly_fields = [field.name for field in ExportJob._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(EnergyMeterWatermark)
+class EnergyMeterWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('meter_name', 'last_timestamp', 'updated_at')
+    search_fields = ('meter_name',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(EnergyDataGap)
+class EnergyDataGapAdmin(admin.ModelAdmin):
+    list_display = ('meter_name', 'start_date', 'end_date', 'attempts', 'detected_at', 'last_attempt_at')
+    list_filter = ('meter_name',)
+    readonly_fields = [field.name for field in EnergyDataGap._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(ProcessedFile)
 class ProcessedFileAdmin(admin.ModelAdmin):
-    list_display = ('file_name', 'get_file_type', 'status', 'export_time', 'trigger_source')
+    list_display = (
+        'file_name', 'get_file_type', 'status', 'export_time', 'trigger_source',
+        'batches_inserted', 'batches_duplicate', 'batches_rejected'
+    )
     list_filter = ('status', 'file_type', 'trigger_source', 'export_time')
     search_fields = ('file_name',)
     date_hierarchy = 'export_time'
@@ -85,6 +135,16 @@ class ProcessedFileAdmin(admin.ModelAdmin):
         return obj.file_type
     get_file_type.short_description = 'File Type'
 
+@admin.register(RemoteFileListing)
+class RemoteFileListingAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'remote_dir', 'size', 'modified', 'last_seen')
+    list_filter = ('remote_dir',)
+    search_fields = ('file_name',)
+    readonly_fields = [field.name for field in RemoteFileListing._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(ParsingSchedule)
 class ParsingScheduleAdmin(admin.ModelAdmin):
     list_display = ('name', 'get_schedule_description', 'is_active', 'created_by')
@@ -157,19 +217,19 @@ class ParsingTaskAdmin(admin.ModelAdmin):
     list_display = ('id', 'status', 'progress', 'current_file', 'created_at', 'last_updated')
     list_filter = ('status', 'created_at', 'last_updated')
     search_fields = ('id', 'current_file')
-    readonly_fields = ('id', 'created_at', 'last_updated', 'progress')
+    readonly_fields = ('id', 'created_at', 'last_updated', 'completed_at', 'progress')
     fieldsets = (
         (None, {
-            'fields': ('id', 'status', 'created_at', 'last_updated')
+            'fields': ('id', 'status', 'schedule', 'celery_task_id', 'created_at', 'last_updated', 'completed_at')
         }),
         ('Progress', {
-            'fields': ('total_files', 'processed_files', 'progress', 'current_file'),
+            'fields': ('total_files', 'processed_files_count', 'batches_processed', 'progress', 'current_file'),
             'classes': ('collapse',)
         }),
     )
     
     def progress(self, obj):
         if obj.total_files > 0:
-            return f"{obj.processed_files}/{obj.total_files} ({(obj.processed_files/obj.total_files)*100:.1f}%)"
+            return f"{obj.processed_files_count}/{obj.total_files} ({(obj.processed_files_count/obj.total_files)*100:.1f}%)"
         return "0/0 (0%)"
-    progress.short_description = 'Progress'
\ No newline at end of file
+    progress.short_description = 'Progress'
@@ -8,8 +8,4 @@ class DataProcessingConfig(AppConfig):
     def ready(self):
         # Import models to prevent double registration
         from .models import ProcessedFile, ParsingSchedule  # noqa
-        # Skip signals import if file doesn't exist
-        try:
-            from . import signals  # noqa
-        except ImportError:
-            pass
+        from . import signals  # noqa
@@ -1,8 +1,10 @@
 import json
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from celery.result import AsyncResult
+from .live_dashboard import parse_topic, register_topic, topic_group
 
 class ParsingProgressConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -51,3 +53,68 @@ class EnergyConsumer(AsyncWebsocketConsumer):
 
     async def task_update(self, event):
         await self.send(text_data=json.dumps(event))
+
+class ExportJobConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        await self.channel_layer.group_add(
+            f"export_{self.job_id}",
+            self.channel_name
+        )
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            f"export_{self.job_id}",
+            self.channel_name
+        )
+
+    async def task_update(self, event):
+        await self.send(text_data=json.dumps(event['data']))
+
+class DashboardConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live dashboard updates. Clients send
+    {"action": "subscribe" | "unsubscribe", "view": ..., "time_range": ..., "recipe": ...}
+    and receive a dashboard.update message for each push to their topics.
+    """
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.topics = set()
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for group in getattr(self, 'topics', ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action')
+        if action not in ('subscribe', 'unsubscribe'):
+            await self.send_json({'type': 'error', 'message': f'Unknown action: {action}'})
+            return
+        try:
+            view, time_range, recipe = parse_topic(content)
+        except ValueError as e:
+            await self.send_json({'type': 'error', 'message': str(e)})
+            return
+
+        group = topic_group(view, time_range, recipe)
+        if action == 'subscribe':
+            await self.channel_layer.group_add(group, self.channel_name)
+            await sync_to_async(register_topic)(view, time_range, recipe)
+            self.topics.add(group)
+            await self.send_json({'type': 'subscribed', 'topic': group})
+        else:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.topics.discard(group)
+            await self.send_json({'type': 'unsubscribed', 'topic': group})
+
+    async def dashboard_update(self, event):
+        await self.send_json(dict(event['data'], type='dashboard.update', topic=event['topic']))
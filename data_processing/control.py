@@ -0,0 +1,106 @@
+"""
+Pause, resume and cancel commands for running parsing jobs.
+
+A command for a job is published on its Redis channel
+(`parsing_control:<job id>`) and a ControlListener thread in the worker
+running the job receives it straight away; the worker acts on it at the
+next file boundary, where the work queue has checkpointed everything
+before it. The command is also left in the cache for a worker that has not
+subscribed yet. On cache backends without pub/sub the listener polls that
+key instead, every INGEST_CONTROL_POLL_SECONDS, which is good enough for
+development and tests.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .locks import redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+CONTROL_PREFIX = 'parsing_control'
+COMMANDS = ('pause', 'resume', 'cancel')
+
+
+def control_key(parsing_task_id):
+    return f'{CONTROL_PREFIX}:{parsing_task_id}'
+
+
+def publish_command(parsing_task_id, command):
+    """Send `command` to whichever worker runs the job, now or once it starts"""
+    if command not in COMMANDS:
+        raise ValueError(f"Unknown parsing command: {command}")
+    key = control_key(parsing_task_id)
+    cache.set(key, command, timeout=getattr(settings, 'INGEST_LEASE_SECONDS', 600) * 6)
+    client = redis_client()
+    if client is not None:
+        client.publish(redis_key(key), command)
+
+
+class ControlListener:
+    """
+    Receives the commands for one job while it runs. `command` is the
+    outstanding request ('pause' or 'cancel', None after a resume), so the
+    worker only reads an attribute between files.
+    """
+    def __init__(self, parsing_task_id, poll_interval=None):
+        self.key = control_key(parsing_task_id)
+        self.poll_interval = poll_interval or getattr(settings, 'INGEST_CONTROL_POLL_SECONDS', 1)
+        self.command = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._pubsub = None
+
+    def __enter__(self):
+        client = redis_client()
+        if client is not None:
+            # Subscribe before reading the key so no command falls in between
+            self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(redis_key(self.key))
+            target = self._listen
+        else:
+            target = self._poll
+        self._apply(cache.get(self.key))
+        self._thread = threading.Thread(target=target, name=f'{CONTROL_PREFIX}-listener', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._pubsub is not None:
+            self._pubsub.close()
+        # The key stays: workers of the job that start later must see it too,
+        # until a 'resume' replaces it
+        return False
+
+    def _apply(self, command):
+        if isinstance(command, bytes):
+            command = command.decode()
+        if command == 'resume':
+            self.command = None
+        elif command in COMMANDS:
+            if command != self.command:
+                logger.info(f"Received {command} for {self.key}")
+            self.command = command
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                message = self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                logger.error(f"Control channel {self.key} failed: {str(e)}")
+                self._poll()
+                return
+            if message is not None:
+                self._apply(message['data'])
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._apply(cache.get(self.key))
+            except Exception as e:
+                logger.error(f"Reading {self.key} failed: {str(e)}")
@@ -0,0 +1,286 @@
+"""
+Backfill of EnergyData from the Priority Metrics GetConsumptions API.
+
+Each meter's newest stored reading is kept in EnergyMeterWatermark; the
+forward fetch starts after the newest of them, and days missing behind it
+are found per meter by find_energy_gaps and refetched on their own.
+A range to fetch is split into multi-day windows that are requested
+concurrently from an asyncio loop over one pooled HTTP session, at most
+ENERGY_FETCH_CONCURRENCY at a time. The loop runs on its own thread and the
+calling thread does all database work, handed the windows in date order so an
+interrupted backfill never leaves a hole behind the newest stored reading.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from datetime import date, datetime, timedelta
+
+import pytz
+import requests
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import EnergyData, EnergyMeterWatermark
+
+logger = logging.getLogger(__name__)
+dublin_tz = pytz.timezone('Europe/Dublin')
+
+ENERGY_BACKFILL_START = date(2023, 7, 3)
+ENERGY_API_DEFAULT_URL = 'https://tzcapi.azurewebsites.net/publicapi/GetConsumptions/72/1716'
+
+
+def _window_days():
+    return max(1, getattr(settings, 'ENERGY_FETCH_WINDOW_DAYS', 7))
+
+
+def _concurrency():
+    return max(1, getattr(settings, 'ENERGY_FETCH_CONCURRENCY', 4))
+
+
+def energy_api_url(start_day, end_day):
+    """GetConsumptions URL for the local days start_day..end_day, e.g. .../2025-04-01/2025-04-02"""
+    base_url = getattr(settings, 'ENERGY_API_BASE_URL', ENERGY_API_DEFAULT_URL).rstrip('/')
+    return f"{base_url}/{start_day:%Y-%m-%d}/{end_day:%Y-%m-%d}"
+
+
+def energy_windows(start_day, end_day, window_days=None):
+    """
+    (start, end) day pairs covering start_day..end_day. Each window ends on
+    the day the next one starts, as the daily requests always did, so the
+    boundary day is fetched in full whichever way the API treats its end date;
+    readings fetched twice are dropped by store_energy_readings.
+    """
+    window_days = window_days or _window_days()
+    windows = []
+    current = start_day
+    while True:
+        window_end = min(current + timedelta(days=window_days), end_day)
+        windows.append((current, window_end))
+        if window_end >= end_day:
+            return windows
+        current = window_end
+
+
+def merge_day_ranges(ranges):
+    """Sorted (start, end) day ranges with overlapping and adjacent ones joined"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def energy_session(pool_size=None):
+    """requests session keeping up to pool_size connections to the API open for reuse"""
+    pool_size = pool_size or _concurrency()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['x-api-key'] = settings.PRIORITY_METRICS_API_KEY
+    return session
+
+
+async def _fetch_windows(session, windows, concurrency, timeout, results, stop_event):
+    """
+    Fetch every window, concurrency at a time, putting ('window', (index,
+    window, payload)) or ('failed', (index, error)) on results. Windows after
+    the first failure are not requested.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    first_failure = [len(windows)]
+
+    async def fetch(index, window):
+        async with semaphore:
+            if stop_event.is_set() or index > first_failure[0]:
+                return None
+            try:
+                # requests is blocking; the session's pool is shared by the worker threads
+                response = await asyncio.to_thread(session.get, energy_api_url(*window), timeout=timeout)
+                response.raise_for_status()
+                return 'window', (index, window, response.json())
+            except Exception as e:
+                first_failure[0] = min(first_failure[0], index)
+                return 'failed', (index, e)
+
+    pending = [asyncio.ensure_future(fetch(index, window)) for index, window in enumerate(windows)]
+    try:
+        for next_done in asyncio.as_completed(pending):
+            result = await next_done
+            if result is not None:
+                results.put(result)
+    except Exception as e:
+        results.put(('fatal', e))
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_energy_windows(windows, concurrency=None, timeout=None):
+    """
+    Yield (window, payload) for each window in order while later windows are
+    still being fetched. A failed request is raised here, once the windows
+    before it have been yielded, however the requests finished.
+    """
+    concurrency = concurrency or _concurrency()
+    timeout = timeout or getattr(settings, 'ENERGY_FETCH_TIMEOUT', 30)
+    results = queue.Queue()
+    stop_event = threading.Event()
+    session = energy_session(concurrency)
+
+    def run():
+        try:
+            asyncio.run(_fetch_windows(session, windows, concurrency, timeout, results, stop_event))
+        except BaseException as e:
+            results.put(('fatal', e))
+
+    thread = threading.Thread(target=run, name='energy-fetch', daemon=True)
+    thread.start()
+    try:
+        fetched = {}
+        for index in range(len(windows)):
+            # Windows can finish out of order; hold on to them until their turn
+            while index not in fetched:
+                kind, item = results.get()
+                if kind == 'fatal':
+                    raise item
+                fetched[item[0]] = kind, item[1:]
+            kind, item = fetched.pop(index)
+            if kind == 'failed':
+                raise item[0]
+            yield item
+    finally:
+        stop_event.set()
+        thread.join(timeout=timeout)
+        session.close()
+
+
+def parse_energy_reading(record):
+    """Unsaved EnergyData for one API record; timestamps are Dublin local time"""
+    record_time = dublin_tz.localize(datetime.strptime(record["timestamp"], '%Y-%m-%dT%H:%M:%S'))
+    return EnergyData(
+        date=record_time.date(),
+        timestamp=record_time,
+        meter_name=record["meterName"],
+        value=record["value"],
+        consumption=record["consumption"]
+    )
+
+
+def store_energy_readings(payload):
+    """
+    Save the readings of one API response that are not stored yet, checked
+    with a single query on (timestamp, meter_name) for the whole response.
+    Advances the meters' watermarks to the newest reading in the response.
+    Returns the number of readings added and the set of their dates.
+    """
+    readings = {}
+    for record in payload:
+        try:
+            reading = parse_energy_reading(record)
+        except Exception as e:
+            logger.error(f"Error processing record: {str(e)}")
+            continue
+        readings[(reading.timestamp, reading.meter_name)] = reading
+    if not readings:
+        return 0, set()
+
+    timestamps = [timestamp for timestamp, _ in readings]
+    existing = set(
+        EnergyData.objects.filter(
+            timestamp__gte=min(timestamps),
+            timestamp__lte=max(timestamps),
+            meter_name__in={meter_name for _, meter_name in readings},
+        ).values_list('timestamp', 'meter_name')
+    )
+    new_readings = [reading for key, reading in readings.items() if key not in existing]
+    # The unique key also covers a concurrent fetch writing the same readings
+    EnergyData.objects.bulk_create(
+        new_readings,
+        batch_size=getattr(settings, 'BATCH_INSERT_CHUNK_SIZE', 500),
+        ignore_conflicts=True
+    )
+    advance_watermarks(readings)
+    return len(new_readings), {reading.date for reading in new_readings}
+
+
+def advance_watermarks(readings):
+    """Move each meter's watermark up to its newest (timestamp, meter_name) in readings"""
+    latest = {}
+    for timestamp, meter_name in readings:
+        if meter_name and (meter_name not in latest or timestamp > latest[meter_name]):
+            latest[meter_name] = timestamp
+    current = dict(
+        EnergyMeterWatermark.objects.filter(meter_name__in=latest).values_list('meter_name', 'last_timestamp')
+    )
+    advanced = [
+        EnergyMeterWatermark(meter_name=meter_name, last_timestamp=timestamp)
+        for meter_name, timestamp in latest.items()
+        if meter_name not in current or timestamp > current[meter_name]
+    ]
+    if advanced:
+        EnergyMeterWatermark.objects.bulk_create(
+            advanced,
+            update_conflicts=True,
+            unique_fields=['meter_name'],
+            update_fields=['last_timestamp', 'updated_at']
+        )
+
+
+def energy_watermark():
+    """Newest reading stored for any meter, where the forward fetch resumes"""
+    return EnergyMeterWatermark.objects.aggregate(last=Max('last_timestamp'))['last']
+
+
+def missing_day_ranges(present_days, first_day, last_day):
+    """(start, end) ranges of the days first_day..last_day not in present_days"""
+    ranges = []
+    gap_start = None
+    day = first_day
+    while day <= last_day:
+        if day in present_days:
+            if gap_start is not None:
+                ranges.append((gap_start, day - timedelta(days=1)))
+                gap_start = None
+        elif gap_start is None:
+            gap_start = day
+        day += timedelta(days=1)
+    if gap_start is not None:
+        ranges.append((gap_start, last_day))
+    return ranges
+
+
+def find_energy_gaps(min_readings=None):
+    """
+    {meter_name: [(start, end), ...]} of the days each meter has fewer than
+    min_readings readings for, from its first stored day up to the day before
+    the watermark (that day is still being filled by the forward fetch).
+    Counted in one grouped query over the (date, meter_name) index.
+    """
+    min_readings = min_readings or getattr(settings, 'ENERGY_GAP_MIN_READINGS', 1)
+    watermark = energy_watermark()
+    if watermark is None:
+        return {}
+    last_day = timezone.localtime(watermark, dublin_tz).date() - timedelta(days=1)
+
+    present = {}
+    first_days = {}
+    coverage = EnergyData.objects.filter(
+        date__gte=ENERGY_BACKFILL_START, date__lte=last_day, meter_name__isnull=False
+    ).values_list('date', 'meter_name').annotate(readings=Count('id')).order_by()
+    for day, meter_name, readings in coverage:
+        first_days[meter_name] = min(day, first_days.get(meter_name, day))
+        if readings >= min_readings:
+            present.setdefault(meter_name, set()).add(day)
+
+    gaps = {}
+    for meter_name, first_day in first_days.items():
+        ranges = missing_day_ranges(present.get(meter_name, set()), first_day, last_day)
+        if ranges:
+            gaps[meter_name] = ranges
+    return gaps
@@ -0,0 +1,248 @@
+import csv
+import logging
+import os
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.db import models
+from django.urls import reverse
+
+from .models import BatchLog, DailyMaterials, EnergyData
+from .partitioning import time_range_q
+
+logger = logging.getLogger(__name__)
+
+# (CSV header, BatchLog field) in export column order
+BATCHLOG_EXPORT_COLUMNS = [
+    ('ID', 'id'),
+    ('Date', 'Time'),
+    ('Time', 'Time'),
+    ('Batch No', 'BatchNo'),
+    ('Job No', 'JobNo'),
+    ('Recipe No', 'RecipeNo'),
+    ('Recipe Name', 'RecipeName'),
+    ('Bitumen Actual', 'Bitumen_Actual'),
+    ('Filler Actual', 'Filler_Actual'),
+    ('Reclaim Actual', 'Reclaim_Actual'),
+    ('Temperature Actual', 'Temperature_Actual'),
+] + [
+    (f'HotBin {n} Actual', f'HotBin{n}_Actual') for n in range(1, 9)
+] + [
+    ('Bitumen Target', 'Bitumen_Target'),
+    ('Filler Target', 'Filler_Target'),
+    ('Reclaim Target', 'Reclaim_Target'),
+    ('Temperature Target', 'Temperature_Target'),
+] + [
+    (f'HotBin {n} Target', f'HotBin{n}_Target') for n in range(1, 9)
+]
+
+# Fields selected per row; Time is selected once and split into Date and Time
+BATCHLOG_EXPORT_FIELDS = ['id', 'Time'] + [field for _, field in BATCHLOG_EXPORT_COLUMNS[3:]]
+
+
+def _chunk_size():
+    return getattr(settings, 'CSV_EXPORT_CHUNK_SIZE', 2000)
+
+
+def filtered_batchlogs(params):
+    """BatchLog rows matching the BatchLog table filters (date_start, date_end, recipe)"""
+    queryset = BatchLog.objects.filter(time_range_q(params.get('date_start'), params.get('date_end')))
+    if params.get('recipe'):
+        queryset = queryset.filter(RecipeName=params['recipe'])
+    return queryset
+
+
+def export_date_range(from_date, to_date):
+    """Date range part of an export filename, e.g. 01JAN2025-31JAN2025"""
+    def _fmt(value):
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%d%b%Y').upper()
+
+    if from_date and to_date:
+        return f"{_fmt(from_date)}-{_fmt(to_date)}"
+    if from_date:
+        return _fmt(from_date) + "-CURRENT"
+    if to_date:
+        return "START-" + _fmt(to_date)
+    return "ALL-DATES"
+
+
+class _LineBuffer:
+    """File-like sink for csv.writer that hands each formatted line back"""
+    def write(self, value):
+        return value
+
+
+def iter_batchlog_csv(queryset, chunk_size=None, buffer_bytes=64 * 1024):
+    """
+    Yield the CSV export of `queryset` in ~buffer_bytes pieces.
+    Rows are read as tuples through a server-side cursor, so memory use does
+    not grow with the size of the export and no model instances are built.
+    """
+    writer = csv.writer(_LineBuffer())
+    rows = queryset.order_by('Time', 'id').values_list(*BATCHLOG_EXPORT_FIELDS).iterator(
+        chunk_size=chunk_size or _chunk_size()
+    )
+
+    pending = [writer.writerow([header for header, _ in BATCHLOG_EXPORT_COLUMNS])]
+    pending_size = 0
+    try:
+        for row in rows:
+            batch_time = row[1]
+            line = writer.writerow((
+                row[0],
+                batch_time.strftime('%Y-%m-%d') if batch_time else '',
+                batch_time.strftime('%H:%M:%S') if batch_time else '',
+            ) + row[2:])
+            pending.append(line)
+            pending_size += len(line)
+            if pending_size >= buffer_bytes:
+                yield ''.join(pending)
+                pending = []
+                pending_size = 0
+    except Exception as e:
+        # Headers are already sent; all we can do is log and end the stream
+        logger.error(f"Error streaming BatchLog CSV export: {str(e)}")
+        raise
+    if pending:
+        yield ''.join(pending)
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress an iterable of text chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Columnar export datasets: model and the field date filters apply to
+COLUMNAR_DATASETS = {
+    'batchlog': (BatchLog, 'Time'),
+    'daily_materials': (DailyMaterials, 'date'),
+    'energy_data': (EnergyData, 'date'),
+}
+COLUMNAR_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def _row_group_size():
+    return getattr(settings, 'EXPORT_ROW_GROUP_SIZE', 50000)
+
+
+def export_root():
+    """Directory under MEDIA_ROOT that export job files are written to"""
+    return getattr(settings, 'EXPORT_ROOT', os.path.join(settings.MEDIA_ROOT, 'exports'))
+
+
+def export_job_queryset(job):
+    """Rows of the job's dataset matching its filters"""
+    model, date_field = COLUMNAR_DATASETS[job.dataset]
+    date_start, date_end = job.filters.get('date_start'), job.filters.get('date_end')
+    if model is BatchLog:
+        queryset = model.objects.filter(time_range_q(date_start, date_end))
+    else:
+        queryset = model.objects.all()
+        if date_start:
+            queryset = queryset.filter(**{f'{date_field}__gte': date_start})
+        if date_end:
+            queryset = queryset.filter(**{f'{date_field}__lte': date_end})
+    if job.filters.get('recipe') and model is BatchLog:
+        queryset = queryset.filter(RecipeName=job.filters['recipe'])
+    return queryset.order_by(date_field, 'pk')
+
+
+def _arrow_type(pa, field):
+    """Arrow type for a model field, keeping decimals exact"""
+    if isinstance(field, models.DecimalField):
+        # Includes CentiDecimalField, whose internal type is its integer column when compact
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    internal_type = field.get_internal_type()
+    if internal_type == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC')
+    if internal_type == 'DateField':
+        return pa.date32()
+    if internal_type == 'FloatField':
+        return pa.float64()
+    if internal_type in ('BigIntegerField', 'BigAutoField'):
+        return pa.int64()
+    if internal_type in ('IntegerField', 'AutoField', 'PositiveIntegerField', 'SmallIntegerField'):
+        return pa.int32()
+    if internal_type == 'BooleanField':
+        return pa.bool_()
+    return pa.string()
+
+
+def write_columnar_export(job, on_progress=None):
+    """
+    Write the job's dataset to export_root() as Parquet or Arrow IPC, one
+    row group / record batch per EXPORT_ROW_GROUP_SIZE rows, so memory stays
+    bounded by a single row group. Calls on_progress(rows_written) after each
+    group and returns (path relative to MEDIA_ROOT, file size, rows written).
+    """
+    # Imported here so the rest of the app does not require pyarrow
+    import pyarrow as pa
+
+    model, _ = COLUMNAR_DATASETS[job.dataset]
+    fields = model._meta.concrete_fields
+    names = [field.attname for field in fields]
+    schema = pa.schema([pa.field(name, _arrow_type(pa, field)) for name, field in zip(names, fields)])
+
+    os.makedirs(export_root(), exist_ok=True)
+    path = os.path.join(export_root(), f'{job.id}.{COLUMNAR_EXTENSIONS[job.file_format]}')
+    partial_path = path + '.part'
+
+    if job.file_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(partial_path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(partial_path, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+
+    row_group_size = _row_group_size()
+    rows_written = 0
+    rows = []
+
+    def _write_group():
+        columns = [pa.array(values, type=column.type) for values, column in zip(zip(*rows), schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+
+    try:
+        for row in export_job_queryset(job).values_list(*names).iterator(chunk_size=row_group_size):
+            rows.append(row)
+            if len(rows) >= row_group_size:
+                _write_group()
+                rows_written += len(rows)
+                rows = []
+                if on_progress:
+                    on_progress(rows_written)
+        if rows:
+            _write_group()
+            rows_written += len(rows)
+    except Exception:
+        writer.close()
+        os.remove(partial_path)
+        raise
+    writer.close()
+
+    os.replace(partial_path, path)
+    return os.path.relpath(path, settings.MEDIA_ROOT), os.path.getsize(path), rows_written
+
+
+def export_job_payload(job):
+    """JSON-ready status of an export job, as served by the status endpoint and websocket"""
+    payload = {
+        'job_id': str(job.id),
+        'dataset': job.dataset,
+        'file_format': job.file_format,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_total': job.rows_total,
+        'rows_written': job.rows_written,
+        'file_size': job.file_size,
+        'error': job.error_message,
+        'download_url': None,
+    }
+    if job.status == 'completed':
+        payload['download_url'] = reverse('export_job_download', args=[job.id])
+    return payload
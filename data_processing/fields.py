@@ -0,0 +1,127 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+
+# Hundredths that fit a 32-bit integer column
+COMPACT_LIMIT = Decimal(2 ** 31 - 1).scaleb(-2)
+
+
+def compact_columns():
+    return getattr(settings, 'COMPACT_DECIMAL_COLUMNS', False)
+
+
+class CentiDecimalField(models.DecimalField):
+    """
+    A two-place DecimalField that COMPACT_DECIMAL_COLUMNS stores as a whole
+    number of hundredths in an integer column: 4 bytes per value instead of a
+    variable-length numeric. With the setting off (the default) it is a plain
+    DecimalField. Python code, forms, admin and exports see Decimals with two
+    places either way.
+    Compact columns hold values up to +/-21,474,836.47. Sum, Min and Max come
+    back scaled, but Avg resolves to a plain DecimalField and returns
+    hundredths, so average compact columns as Sum / Count. Change the setting
+    only together with `manage.py convert_compact_columns`.
+    """
+    SCALE = 2
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_digits', 10)
+        kwargs['decimal_places'] = self.SCALE
+        super().__init__(*args, **kwargs)
+
+    @property
+    def validators(self):
+        validators = super().validators
+        if compact_columns():
+            validators = validators + [MinValueValidator(-COMPACT_LIMIT), MaxValueValidator(COMPACT_LIMIT)]
+        return validators
+
+    def get_internal_type(self):
+        # Backends pick column types and converters from this
+        return 'IntegerField' if compact_columns() else 'DecimalField'
+
+    def db_type(self, connection):
+        if compact_columns():
+            return models.IntegerField().db_type(connection)
+        return super().db_type(connection)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not compact_columns():
+            return super().get_db_prep_value(value, connection, prepared)
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None or hasattr(value, 'as_sql'):
+            return value
+        return int(value.scaleb(self.SCALE).quantize(Decimal(1)))
+
+    def get_db_prep_save(self, value, connection):
+        if not compact_columns():
+            return super().get_db_prep_save(value, connection)
+        # DecimalField adapts saved values itself; route them through the scaling above
+        return self.get_db_prep_value(value, connection)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or not compact_columns():
+            return value
+        if isinstance(value, float):
+            value = repr(value)
+        return Decimal(value).scaleb(-self.SCALE)
+
+
+def _column_field(model, field, compact):
+    """Stand-in for `field` with the column type of the given storage"""
+    if compact:
+        column = models.IntegerField(null=field.null, db_column=field.db_column)
+    else:
+        column = models.DecimalField(max_digits=field.max_digits, decimal_places=field.decimal_places,
+                                     null=field.null, db_column=field.db_column)
+    column.set_attributes_from_name(field.name)
+    column.model = model
+    return column
+
+
+def convert_centi_columns(schema_editor, model, compact):
+    """
+    Change the CentiDecimalField columns of `model` to integer hundredths
+    (compact) or back to numeric, rescaling stored values. Columns already
+    stored that way are left alone; returns the names of those converted.
+    """
+    fields = [field for field in model._meta.concrete_fields if isinstance(field, CentiDecimalField)]
+    if not fields:
+        return []
+    connection = schema_editor.connection
+    qn = schema_editor.quote_name
+    table = qn(model._meta.db_table)
+    with connection.cursor() as cursor:
+        column_types = {
+            info.name: connection.introspection.get_field_type(info.type_code, info)
+            for info in connection.introspection.get_table_description(cursor, model._meta.db_table)
+        }
+    wanted = 'IntegerField' if compact else 'DecimalField'
+    fields = [field for field in fields if column_types.get(field.column) not in (None, wanted)]
+    if not fields:
+        return []
+
+    if connection.vendor == 'postgresql':
+        # One rewrite of the table (and each partition) for all columns
+        if compact:
+            changes = [f'ALTER COLUMN {qn(f.column)} TYPE integer USING round({qn(f.column)} * 100)::integer'
+                       for f in fields]
+        else:
+            changes = [f'ALTER COLUMN {qn(f.column)} TYPE numeric({f.max_digits}, {f.decimal_places}) '
+                       f'USING {qn(f.column)} / 100.0' for f in fields]
+        schema_editor.execute(f'ALTER TABLE {table} ' + ', '.join(changes))
+        return [f.name for f in fields]
+
+    # Other backends: change the column types, scaling the stored values on the numeric side
+    if not compact:
+        schema_editor.execute(f'UPDATE {table} SET ' + ', '.join(
+            f'{qn(f.column)} = {qn(f.column)} / 100.0' for f in fields))
+    for field in fields:
+        schema_editor.alter_field(model, _column_field(model, field, not compact), _column_field(model, field, compact))
+    if compact:
+        schema_editor.execute(f'UPDATE {table} SET ' + ', '.join(
+            f'{qn(f.column)} = round({qn(f.column)} * 100)' for f in fields))
+    return [f.name for f in fields]
@@ -0,0 +1,155 @@
+"""
+Database-backed work queue for XML ingestion runs.
+
+A ParsingTask holds one ParsingTaskFile per file to ingest. Workers claim
+files under a lease (INGEST_LEASE_SECONDS) that they renew as they go and
+mark each file finished once it is stored. If a worker dies, its leases run
+out and the unfinished files can be claimed by any other worker, so a
+resumed run starts at the first unfinished file and never downloads a
+finished one again.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ParsingTask, ParsingTaskFile
+
+logger = logging.getLogger(__name__)
+
+
+def lease_seconds():
+    return getattr(settings, 'INGEST_LEASE_SECONDS', 600)
+
+
+def max_file_attempts():
+    return getattr(settings, 'INGEST_MAX_FILE_ATTEMPTS', 3)
+
+
+def worker_id(celery_task_id=None):
+    """Lease owner name for this process (and Celery task, when given)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{celery_task_id or '-'}"
+
+
+def create_parsing_task(filenames, remote_meta=None, schedule_id=None, celery_task_id=''):
+    """Create a job with its files queued in the given order"""
+    remote_meta = remote_meta or {}
+    with transaction.atomic():
+        parsing_task = ParsingTask.objects.create(
+            status='processing',
+            total_files=len(filenames),
+            schedule_id=schedule_id,
+            celery_task_id=celery_task_id or '',
+        )
+        ParsingTaskFile.objects.bulk_create(
+            ParsingTaskFile(task=parsing_task, position=position, file_name=name, remote_meta=remote_meta.get(name, {}))
+            for position, name in enumerate(filenames)
+        )
+    return parsing_task
+
+
+def _claimable(now):
+    return Q(status='pending') | Q(status='claimed', lease_expires_at__lt=now)
+
+
+def claim_files(parsing_task, owner, limit=1, names=None):
+    """
+    Lease up to `limit` unfinished files of the job to `owner`, in queue
+    order, and return them. Files that have used up INGEST_MAX_FILE_ATTEMPTS
+    claims are marked failed instead of being handed out again.
+    """
+    now = timezone.now()
+    queued = ParsingTaskFile.objects.filter(_claimable(now), task=parsing_task)
+    if names is not None:
+        queued = queued.filter(file_name__in=names)
+
+    exhausted = queued.filter(attempts__gte=max_file_attempts())
+    for name in exhausted.values_list('file_name', flat=True):
+        logger.error(f"Giving up on {name}: claimed {max_file_attempts()} times without finishing")
+    exhausted.update(status='failed', error_message='Lease expired too many times', finished_at=now)
+
+    with transaction.atomic():
+        candidates = queued.order_by('position')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        pks = list(candidates.values_list('pk', flat=True)[:limit])
+        # Conditional on still being claimable, so a racing worker cannot take the same files
+        ParsingTaskFile.objects.filter(_claimable(now), pk__in=pks).update(
+            status='claimed',
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds()),
+            attempts=F('attempts') + 1,
+        )
+    return list(ParsingTaskFile.objects.filter(pk__in=pks, status='claimed', lease_owner=owner).order_by('position'))
+
+
+def renew_leases(parsing_task, owner):
+    """Heartbeat: push back the expiry of every file `owner` holds in the job"""
+    return ParsingTaskFile.objects.filter(task=parsing_task, status='claimed', lease_owner=owner).update(
+        lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds())
+    )
+
+
+def release_files(parsing_task, owner):
+    """Hand `owner`'s unfinished files back to the queue, e.g. before a retry"""
+    return ParsingTaskFile.objects.filter(task=parsing_task, status='claimed', lease_owner=owner).update(
+        status='pending', lease_owner='', lease_expires_at=None, attempts=F('attempts') - 1
+    )
+
+
+def finish_file(item, batches_processed=0):
+    """Mark a claimed file done and count it on its job"""
+    with transaction.atomic():
+        updated = ParsingTaskFile.objects.filter(pk=item.pk, status='claimed', lease_owner=item.lease_owner).update(
+            status='done', batches_processed=batches_processed, lease_expires_at=None, finished_at=timezone.now()
+        )
+        if not updated:
+            # The lease ran out and another worker took the file over; it counts it
+            logger.warning(f"Lease on {item.file_name} was lost before it finished")
+            return False
+        ParsingTask.objects.filter(pk=item.task_id).update(
+            processed_files_count=F('processed_files_count') + 1,
+            batches_processed=F('batches_processed') + batches_processed,
+            current_file=item.file_name,
+            last_updated=timezone.now(),
+        )
+    return True
+
+
+def remaining_files(parsing_task):
+    """Files of the job that are not finished yet"""
+    return ParsingTaskFile.objects.filter(task=parsing_task, status__in=['pending', 'claimed'])
+
+
+def complete_if_drained(parsing_task):
+    """Mark the job completed once none of its files are left; returns whether it is"""
+    if remaining_files(parsing_task).exists():
+        return False
+    ParsingTask.objects.filter(pk=parsing_task.pk).exclude(status='completed').update(
+        status='completed', completed_at=timezone.now(), last_updated=timezone.now()
+    )
+    return True
+
+
+def mark_interrupted_tasks():
+    """
+    Flag processing jobs that nobody is working on any more: files remain but
+    no lease is live and the job has not moved for a lease period.
+    Returns the jobs flagged.
+    """
+    now = timezone.now()
+    idle_since = now - timedelta(seconds=lease_seconds())
+    unfinished = ParsingTaskFile.objects.filter(status__in=['pending', 'claimed']).values('task_id')
+    leased = ParsingTaskFile.objects.filter(status='claimed', lease_expires_at__gte=now).values('task_id')
+    stalled = ParsingTask.objects.filter(
+        status='processing', last_updated__lt=idle_since, pk__in=unfinished
+    ).exclude(pk__in=leased)
+    flagged = list(stalled)
+    if flagged:
+        ParsingTask.objects.filter(pk__in=[job.pk for job in flagged]).update(status='interrupted', last_updated=now)
+    return flagged
@@ -0,0 +1,157 @@
+"""
+Live dashboard updates over Channels.
+
+Dashboard pages subscribe over ws/dashboard/ to a topic: a view ('home',
+'oee' or 'production') with its time range and, for production, a recipe.
+Every ingest or energy commit queues the dates it changed; the first one
+after a push schedules the next push DASHBOARD_PUSH_DEBOUNCE_SECONDS later,
+so a burst of commits ends in a single push. A push computes the widgets of
+each subscribed topic whose window covers the changed dates once and sends
+them to the topic's group, however many screens show it.
+
+Subscribed topics are kept in the cache for DASHBOARD_TOPIC_TTL seconds;
+clients subscribe again well within that to stay on the push list.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import date, timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .metrics import _date_window, compute_dashboard_metrics, compute_oee_metrics, compute_production_metrics
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_VIEWS = ('home', 'oee', 'production')
+TOPIC_INDEX_KEY = 'dashboard_topics'
+PENDING_DATES_KEY = 'dashboard_push:dates'
+PUSH_DUE_KEY = 'dashboard_push:due'
+
+
+def push_delay():
+    return getattr(settings, 'DASHBOARD_PUSH_DEBOUNCE_SECONDS', 5)
+
+
+def _topic_ttl():
+    return getattr(settings, 'DASHBOARD_TOPIC_TTL', 3600)
+
+
+def parse_topic(message):
+    """(view, time_range, recipe) of a subscribe message; ValueError if it names no valid topic"""
+    view = message.get('view')
+    if view not in DASHBOARD_VIEWS:
+        raise ValueError(f"Unknown dashboard view: {view}")
+    try:
+        time_range = int(message.get('time_range', 30))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid time range: {message.get('time_range')}")
+    if time_range < 0:
+        raise ValueError(f"Invalid time range: {time_range}")
+    recipe = str(message.get('recipe') or '').strip() if view == 'production' else ''
+    return view, time_range, recipe
+
+
+def topic_group(view, time_range, recipe=''):
+    """Channel layer group of a topic; recipe names are hashed to fit group name rules"""
+    recipe_part = hashlib.md5(recipe.encode()).hexdigest()[:12] if recipe else 'all'
+    return f'dashboard.{view}.{time_range}.{recipe_part}'
+
+
+def register_topic(view, time_range, recipe=''):
+    """Keep a topic on the push list for another DASHBOARD_TOPIC_TTL seconds"""
+    index = cache.get(TOPIC_INDEX_KEY) or {}
+    index[topic_group(view, time_range, recipe)] = {
+        'view': view,
+        'time_range': time_range,
+        'recipe': recipe,
+        'expires': time.time() + _topic_ttl(),
+    }
+    cache.set(TOPIC_INDEX_KEY, index, _topic_ttl())
+
+
+def active_topics():
+    """{group: topic} of the topics subscribed to within DASHBOARD_TOPIC_TTL"""
+    now = time.time()
+    return {group: topic for group, topic in (cache.get(TOPIC_INDEX_KEY) or {}).items() if topic['expires'] > now}
+
+
+def queue_dashboard_push(dates=None):
+    """
+    Add changed dates to the next push. Returns True when no push is due
+    yet, so the caller schedules one; False when one already is or nobody
+    is subscribed.
+    """
+    if not active_topics():
+        return False
+    pending = cache.get(PENDING_DATES_KEY) or set()
+    if dates:
+        pending.update(day.isoformat() for day in dates)
+    else:
+        pending.add('')  # Unknown dates: every topic is refreshed
+    cache.set(PENDING_DATES_KEY, pending, _topic_ttl())
+    return cache.add(PUSH_DUE_KEY, True, push_delay() * 10)
+
+
+def _covers(time_range, dates):
+    """Whether a topic's window includes any of the changed dates (all of them when unknown)"""
+    if not time_range or not dates:
+        return True
+    window_start = timezone.now().date() - timedelta(days=time_range)
+    return any(day >= window_start for day in dates)
+
+
+def dashboard_update(view, time_range, recipe='', dates=()):
+    """
+    Push payload for one topic: its widgets, computed as its page computes
+    them, and the daily totals of the changed dates within its window
+    """
+    daily = {}
+    if view == 'home':
+        widgets = compute_dashboard_metrics(*_date_window(time_range))
+        daily = dict(zip(json.loads(widgets['labels']), json.loads(widgets['values'])))
+    elif view == 'production':
+        widgets = compute_production_metrics(time_range, recipe)
+        daily = dict(zip(widgets['chart_labels'], widgets['chart_data']))
+    else:
+        widgets = compute_oee_metrics(time_range)
+    changed = [day.isoformat() for day in dates]
+    return {
+        'view': view,
+        'time_range': time_range,
+        'recipe': recipe,
+        'changed_dates': changed,
+        'daily_totals': {day: daily[day] for day in changed if day in daily},
+        'widgets': widgets,
+    }
+
+
+def broadcast_dashboard_updates():
+    """Send every subscribed topic affected by the queued dates its refreshed widgets; returns topics sent"""
+    # Commits from here on schedule the next push
+    cache.delete(PUSH_DUE_KEY)
+    pending = cache.get(PENDING_DATES_KEY) or set()
+    cache.delete(PENDING_DATES_KEY)
+    dates = [] if '' in pending else sorted(date.fromisoformat(day) for day in pending)
+
+    channel_layer = get_channel_layer()
+    sent = 0
+    for group, topic in active_topics().items():
+        if not _covers(topic['time_range'], dates):
+            continue
+        try:
+            payload = dashboard_update(topic['view'], topic['time_range'], topic['recipe'], dates)
+            async_to_sync(channel_layer.group_send)(group, {
+                'type': 'dashboard.update',
+                'topic': group,
+                'data': payload,
+            })
+            sent += 1
+        except Exception as e:
+            logger.error(f"Dashboard push to {group} failed: {str(e)}")
+    return sent
@@ -0,0 +1,143 @@
+"""
+Lease locks for long-running tasks.
+
+A LeaseLock is held under a random owner token for `ttl` seconds and kept
+alive by a heartbeat thread while its holder works, so it outlives neither a
+crashed holder nor a slow one. Renewal and release only act while the lock
+still carries the holder's token: on Redis both are a single Lua script
+(compare-and-expire / compare-and-delete); on other cache backends they are
+a best-effort get-then-write, good enough for development and tests.
+"""
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = 'lease_lock'
+
+
+def redis_client():
+    """Raw client on the default cache's connection pool when it is Redis, else None"""
+    backend = caches['default']
+    if not isinstance(backend, RedisCache):
+        return None
+    return backend._cache.get_client(write=True)
+
+
+def redis_key(key):
+    """`key` as the default cache stores it (with its prefix and version)"""
+    return caches['default'].make_and_validate_key(key)
+
+
+class LockLost(Exception):
+    """The lease ran out and another holder took the lock"""
+
+
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLock:
+    """
+    Lock `name` for one holder at a time. Pass the token of an existing hold
+    to renew or release it from another task, e.g. a chord callback.
+    """
+    def __init__(self, name, ttl=None, token=None):
+        self.name = name
+        self.key = f'{LOCK_PREFIX}:{name}'
+        self.ttl = ttl or getattr(settings, 'INGEST_LOCK_TTL', 120)
+        self.token = token or uuid.uuid4().hex
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _redis(self):
+        client = redis_client()
+        return (client, redis_key(self.key)) if client is not None else (None, None)
+
+    def acquire(self):
+        client, key = self._redis()
+        if client is not None:
+            return bool(client.set(key, self.token, nx=True, px=int(self.ttl * 1000)))
+        return cache.add(self.key, self.token, self.ttl)
+
+    def renew(self):
+        """Extend the lease; False when the lock is no longer ours"""
+        client, key = self._redis()
+        if client is not None:
+            return bool(client.eval(RENEW_SCRIPT, 1, key, self.token, int(self.ttl * 1000)))
+        if cache.get(self.key) != self.token:
+            return False
+        return cache.touch(self.key, self.ttl)
+
+    def release(self):
+        """Delete the lock only if it is still ours; returns whether it was"""
+        self.stop_heartbeat()
+        client, key = self._redis()
+        if client is not None:
+            released = bool(client.eval(RELEASE_SCRIPT, 1, key, self.token))
+        elif cache.get(self.key) == self.token:
+            released = cache.delete(self.key)
+        else:
+            released = False
+        if not released:
+            logger.warning(f"Lock {self.name} was no longer held by {self.token}, left in place")
+        return released
+
+    def holder(self):
+        """Token of the current holder, or None"""
+        client, key = self._redis()
+        if client is not None:
+            value = client.get(key)
+            return value.decode() if value is not None else None
+        return cache.get(self.key)
+
+    def check(self):
+        """Raise LockLost once the heartbeat has found the lock taken"""
+        if self.lost.is_set():
+            raise LockLost(f"Lock {self.name} was taken over by another holder")
+
+    def start_heartbeat(self, interval=None):
+        """Renew the lease every interval (default ttl / 3) until released; sets `lost` if it is taken"""
+        if self._heartbeat is not None:
+            return
+        interval = interval or self.ttl / 3
+        self._stop.clear()
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    # A lease that lapsed without being taken is simply taken back
+                    renewed = self.renew() or self.acquire()
+                except Exception as e:
+                    logger.error(f"Heartbeat for lock {self.name} failed: {str(e)}")
+                    continue
+                if not renewed:
+                    logger.error(f"Lock {self.name} lost to another holder")
+                    self.lost.set()
+                    return
+
+        self._heartbeat = threading.Thread(target=beat, name=f'lock-heartbeat-{self.name}', daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        if self._heartbeat is not None:
+            self._stop.set()
+            self._heartbeat.join(timeout=5)
+            self._heartbeat = None
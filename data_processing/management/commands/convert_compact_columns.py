@@ -0,0 +1,22 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from data_processing.fields import compact_columns, convert_centi_columns
+
+
+class Command(BaseCommand):
+    help = "Convert CentiDecimalField columns to the storage COMPACT_DECIMAL_COLUMNS selects"
+
+    def handle(self, *args, **options):
+        # Run with the new setting before the application starts writing with it
+        compact = compact_columns()
+        converted = 0
+        with connection.schema_editor() as schema_editor:
+            for model in apps.get_models():
+                names = convert_centi_columns(schema_editor, model, compact)
+                if names:
+                    converted += len(names)
+                    self.stdout.write(f"{model._meta.db_table}: {', '.join(names)}")
+        storage = 'integer hundredths' if compact else 'numeric'
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} columns to {storage}"))
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from data_processing.metrics import invalidate_dashboard_metrics
+from data_processing.rollup import rebuild_production_rollup
+
+
+class Command(BaseCommand):
+    help = "Recompute DailyProductionRollup rows from BatchLog history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--days', type=int, help="Rebuild only the last N days")
+        parser.add_argument(
+            '--chunk-days', type=int, default=31,
+            help="Days recomputed per transaction when rebuilding a range"
+        )
+
+    def handle(self, *args, **options):
+        start, end = self._parse_day(options['start']), self._parse_day(options['end'])
+        if options['days']:
+            end = timezone.localdate()
+            start = end - timedelta(days=options['days'])
+
+        if start is None and end is None:
+            rows = rebuild_production_rollup()
+            invalidate_dashboard_metrics()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows"))
+            return
+
+        if start is None or end is None:
+            raise CommandError("--start and --end must be given together")
+        if start > end:
+            raise CommandError("--start must not be after --end")
+
+        # Bounded transactions keep long backfills from holding locks for hours
+        rows = 0
+        chunk = max(1, options['chunk_days'])
+        day = start
+        while day <= end:
+            chunk_end = min(end, day + timedelta(days=chunk - 1))
+            rows += rebuild_production_rollup(start_date=day, end_date=chunk_end)
+            self.stdout.write(f"{day} .. {chunk_end}: {rows} rows so far")
+            day = chunk_end + timedelta(days=1)
+        # Cached dashboards still show the totals from before the rebuild
+        invalidate_dashboard_metrics([start + timedelta(days=n) for n in range((end - start).days + 1)])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows for {start} .. {end}"))
+
+    def _parse_day(self, value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        return day
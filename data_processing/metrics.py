@@ -0,0 +1,395 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, FloatField, ExpressionWrapper, Func, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import (
+    OEEDailyData, DailyMaterials, DailyRecipes, EnergyData, PlantRunTime, DailyProductionRollup, ProcessedFile
+)
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_PREFIX = 'dashboard_metrics'
+DASHBOARD_GENERATION_PREFIX = f'{DASHBOARD_CACHE_PREFIX}:generation'
+# Windows of up to 2**n days share generation n; longer ones share the last
+DASHBOARD_GENERATION_BUCKETS = 16
+DATA_MODIFIED_KEY = f'{DASHBOARD_CACHE_PREFIX}:data_modified'
+RAP_MATERIAL_NAME = 'Reclaim Asphalt'
+RUNTIME_FIELDS = [
+    'MixingActive', 'Mixer', 'Screen', 'HotElevator', 'Dryer',
+    'BurnerFlameOn', 'SlingerForward', 'SlingerReverse',
+    'CollectConveyor', 'DustBlower', 'DustBlowerRotaryValve'
+]
+
+# Sent once dashboard source data has changed and committed, with the changed `dates`
+dashboard_data_changed = Signal()
+
+
+def _cache_timeout():
+    return getattr(settings, 'DASHBOARD_METRICS_CACHE_TIMEOUT', 600)
+
+
+def _date_window(time_range):
+    """(start_date, end_date) for a dashboard time range; 0 means all time"""
+    end_date = timezone.now().date()
+    if time_range > 0:
+        return end_date - timedelta(days=time_range), end_date
+    return None, end_date
+
+
+def _generation_bucket(time_range):
+    """Generation bucket of a time range: 0 for all time, else the bit length of its days"""
+    if time_range <= 0:
+        return 0
+    return min(int(time_range).bit_length(), DASHBOARD_GENERATION_BUCKETS)
+
+
+def _generation(bucket):
+    key = f'{DASHBOARD_GENERATION_PREFIX}:{bucket}'
+    generation = cache.get(key)
+    if generation is None:
+        # A fresh start value, so entries of an evicted generation are never served
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump_generation(bucket):
+    key = f'{DASHBOARD_GENERATION_PREFIX}:{bucket}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def get_dashboard_metrics(time_range, role):
+    """
+    Home dashboard widgets for a (time_range, role), served from the cache:
+    - Total production and the daily production chart
+    - Electricity consumption
+    - RAP consumption and the material consumption table
+    Keys carry the generation of the window's bucket, which
+    invalidate_dashboard_metrics bumps when new data lands.
+    """
+    start_date, end_date = _date_window(time_range)
+    generation = _generation(_generation_bucket(time_range))
+    key = f'{DASHBOARD_CACHE_PREFIX}:{role}:{time_range}:{end_date.isoformat()}:{generation}'
+    metrics = cache.get(key)
+    if metrics is not None:
+        return metrics
+
+    metrics = compute_dashboard_metrics(start_date, end_date)
+    cache.set(key, metrics, _cache_timeout())
+    return metrics
+
+
+def compute_dashboard_metrics(start_date, end_date):
+    """Compute the home dashboard context in three queries"""
+    date_filter = Q()
+    if start_date:
+        date_filter = Q(date__gte=start_date) & Q(date__lte=end_date)
+
+    # Production chart; its non-null days also give the production total
+    chart_data = OEEDailyData.objects.filter(date_filter).annotate(
+        daily_production=ExpressionWrapper(
+            F('TotalProduction') + F('TotalEmptyOut'),
+            output_field=FloatField()
+        )
+    ).values('date', 'daily_production').order_by('date')
+
+    labels = []
+    values = []
+    total_production = 0.0
+    for entry in chart_data:
+        labels.append(entry['date'].strftime('%Y-%m-%d'))
+        values.append(float(entry['daily_production'] or 0))
+        total_production += entry['daily_production'] or 0
+
+    electricity_consumption = EnergyData.objects.filter(date_filter).aggregate(
+        total=Coalesce(Sum('consumption'), 0.0, output_field=FloatField())
+    )['total']
+
+    # Material totals; RAP is the Reclaim Asphalt row of the same grouping
+    material_query = Q()
+    if start_date:
+        material_query = Q(date__gte=start_date)
+
+    materials = DailyMaterials.objects.filter(material_query) \
+        .exclude(MaterialName__isnull=True) \
+        .exclude(MaterialName__exact='') \
+        .exclude(MaterialName__iexact='undefined') \
+        .values('MaterialName') \
+        .annotate(total_quantity=Sum('Quantity')) \
+        .order_by('MaterialName')
+
+    rap_consumption = 0.0
+    material_data = []
+    for index, material in enumerate(materials, start=1):
+        if material['MaterialName'] == RAP_MATERIAL_NAME:
+            rap_consumption = float(material['total_quantity'] or 0)
+
+        # Clean the material name
+        material_name = material['MaterialName'].strip() if material['MaterialName'] else 'Other Material'
+
+        # Only include if name is valid
+        if material_name and material_name.lower() not in ['null', 'undefined', '']:
+            material_data.append({
+                'index': index,
+                'MaterialName': material_name,
+                'Quantity': "{:,.2f}".format(material['total_quantity']) if material['total_quantity'] is not None else "0.00"
+            })
+
+    return {
+        'labels': json.dumps(labels),
+        'values': json.dumps(values),
+        'total_production': "{:,.2f} t".format(total_production),
+        'rap_consumption': "{:,.2f} t".format(rap_consumption),
+        'electricity_consumption': "{:,.2f} kWh".format(electricity_consumption),
+        'material_data': json.dumps(material_data),
+    }
+
+
+def invalidate_dashboard_metrics(dates=None):
+    """
+    Retire cached dashboard entries whose window may cover any of `dates`
+    (all entries when no dates are given) by bumping their generations, and
+    stamp the data modification time. Runs after the surrounding transaction
+    commits so readers never re-cache the old data, then announces the change
+    (dashboard_data_changed).
+    """
+    dates = [day for day in (dates or []) if day is not None]
+
+    def _invalidate():
+        cache.set(DATA_MODIFIED_KEY, timezone.now(), None)
+        first = 1
+        if dates:
+            # A window of N days covers a date at most N days old
+            first = max(first, _generation_bucket((timezone.now().date() - max(dates)).days))
+        stale = [0] + list(range(first, DASHBOARD_GENERATION_BUCKETS + 1))
+        for bucket in stale:
+            _bump_generation(bucket)
+        logger.debug(f"Bumped {len(stale)} dashboard metric generations")
+
+        for receiver, response in dashboard_data_changed.send_robust(sender=None, dates=dates):
+            if isinstance(response, Exception):
+                logger.error(f"Dashboard change receiver {receiver.__name__} failed: {str(response)}")
+
+    transaction.on_commit(_invalidate)
+
+
+def dashboard_data_modified():
+    """Time dashboard source data last changed: the latest ingest or energy commit"""
+    modified = cache.get(DATA_MODIFIED_KEY)
+    if modified is None:
+        # Cold cache: fall back to the latest recorded ingest
+        modified = ProcessedFile.objects.aggregate(latest=Max('export_time'))['latest'] or \
+            datetime(2000, 1, 1, tzinfo=timezone.get_fixed_timezone(0))
+        cache.add(DATA_MODIFIED_KEY, modified, None)
+    return modified
+
+
+def _sum_select(queryset, **fields):
+    """Compile a one-row SUM() select; SUM via Func keeps Django from adding GROUP BY"""
+    return queryset.order_by().values(**{
+        alias: Func(F(field), function='SUM', output_field=FloatField())
+        for alias, field in fields.items()
+    }).query.sql_with_params()
+
+
+def compute_oee_metrics(days):
+    """
+    OEE dashboard figures for the last `days` days (0 for all time) in a
+    single round trip: one SUM() select per source table, cross joined.
+    BatchLog figures come from DailyProductionRollup, so no BatchLog rows
+    are scanned.
+    """
+    started = time.perf_counter()
+    end_date = timezone.now().date()
+    date_filter = Q()
+    if days:
+        date_filter = Q(date__gte=end_date - timedelta(days=days)) & Q(date__lte=end_date)
+
+    selects = [
+        _sum_select(OEEDailyData.objects.filter(date_filter),
+                    total_production='TotalProduction', total_emptyout='TotalEmptyOut'),
+        _sum_select(PlantRunTime.objects.filter(date_filter),
+                    **{f'runtime_{field}': field for field in RUNTIME_FIELDS}),
+        _sum_select(DailyMaterials.objects.filter(date_filter), total_materials='Quantity'),
+        _sum_select(DailyProductionRollup.objects.filter(date_filter),
+                    total_rap='Reclaim_Actual', total_bitumen='Bitumen_Actual'),
+        _sum_select(EnergyData.objects.filter(date_filter), total_consumption='consumption'),
+    ]
+    sql = 'SELECT * FROM ' + ' CROSS JOIN '.join(
+        f'({select_sql}) AS part{idx}' for idx, (select_sql, _) in enumerate(selects)
+    )
+    params = [param for _, select_params in selects for param in select_params]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        totals = {column: float(value or 0) for column, value in zip(columns, cursor.fetchone())}
+
+    runtime_data = {field: totals[f'runtime_{field}'] for field in RUNTIME_FIELDS}
+    total_mixer_hours = runtime_data['Mixer'] / 3600
+    drying_efficiency = {
+        'avg_drying_rate': 0.0,
+        'total_materials': totals['total_materials'],
+        'total_rap': totals['total_rap'] / 1000,
+        'total_bitumen': totals['total_bitumen'] / 1000,
+        'total_mixer_hours': total_mixer_hours
+    }
+
+    # Calculate average drying rate safely
+    if total_mixer_hours > 0:
+        numerator = (drying_efficiency['total_materials']
+                     - drying_efficiency['total_rap']
+                     - drying_efficiency['total_bitumen'])
+        drying_efficiency['avg_drying_rate'] = round(numerator / total_mixer_hours, 2)
+
+    return {
+        'total_production': totals['total_production'],
+        'total_emptyout': totals['total_emptyout'],
+        'total_consumption': totals['total_consumption'],
+        'runtime_data': runtime_data,
+        'drying_efficiency': drying_efficiency,
+        'computed_in_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def compute_production_metrics(time_range, selected_recipe='', unit='t'):
+    """
+    Production dashboard figures for the last `time_range` days (0 for all
+    time), optionally for one recipe, with totals in tonnes ('t') or
+    kilotonnes ('kt'). Batch figures come from DailyProductionRollup.
+    """
+    # Calculate date range
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=time_range) if time_range > 0 else None
+
+    # Base queries; batch figures come from the daily BatchLog rollup
+    daily_recipes = DailyRecipes.objects.all()
+    batch_rollups = DailyProductionRollup.objects.all()
+    rap_materials = DailyMaterials.objects.filter(MaterialName='Reclaim Asphalt')
+
+    # Apply date filters
+    if start_date:
+        daily_recipes = daily_recipes.filter(date__gte=start_date.date(), date__lte=end_date.date())
+        batch_rollups = batch_rollups.filter(date__gte=start_date.date(), date__lte=end_date.date())
+        rap_materials = rap_materials.filter(date__gte=start_date.date(), date__lte=end_date.date())
+
+    # Get available recipes from DailyRecipes
+    recipe_names = daily_recipes.exclude(RecipeName__isnull=True)\
+                              .order_by('RecipeName')\
+                              .values_list('RecipeName', flat=True)\
+                              .distinct()
+
+    # Apply recipe filter
+    if selected_recipe:
+        daily_recipes = daily_recipes.filter(RecipeName=selected_recipe)
+        batch_rollups = batch_rollups.filter(RecipeName=selected_recipe)
+        # Note: DailyMaterials typically doesn't have RecipeName, so it don't filter it but the date range is possible
+
+    # Production calculation from DailyRecipes
+    production_expression = ExpressionWrapper(
+        Coalesce(F('Total'), Value(0.0)),
+        output_field=FloatField()
+    )
+
+    # Aggregate metrics
+    production_metrics = daily_recipes.aggregate(
+        total_production=Coalesce(Sum(production_expression, output_field=FloatField()), 0.0)
+    )
+
+    # Get RAP consumption from DailyMaterials
+    if selected_recipe:
+        # Calculate RAP from BatchLog's Reclaim_Actual for the selected recipe
+        rap_metrics = batch_rollups.aggregate(
+            total_reclaim=Coalesce(Sum('Reclaim_Actual', output_field=FloatField()), Value(0.0, output_field=FloatField())
+        ))
+    else:
+        # Calculate RAP from DailyMaterials
+        rap_metrics = rap_materials.aggregate(
+            total_reclaim=Coalesce(Sum('Quantity', output_field=FloatField()), Value(0.0, output_field=FloatField())
+        ))
+
+    bitumen_metrics = batch_rollups.aggregate(
+        total_bitumen=Coalesce(Sum('Bitumen_Actual', output_field=FloatField()), 0.0)
+    )
+
+    temp_totals = batch_rollups.aggregate(
+        temp_target=Coalesce(Sum('Temperature_Target', output_field=FloatField()), 0.0),
+        temp_target_count=Coalesce(Sum('Temperature_Target_count'), 0),
+        temp_actual=Coalesce(Sum('Temperature_Actual', output_field=FloatField()), 0.0),
+        temp_actual_count=Coalesce(Sum('Temperature_Actual_count'), 0)
+    )
+    temp_metrics = {
+        'avg_temp_target': temp_totals['temp_target'] / temp_totals['temp_target_count']
+        if temp_totals['temp_target_count'] else 0.0,
+        'avg_temp_actual': temp_totals['temp_actual'] / temp_totals['temp_actual_count']
+        if temp_totals['temp_actual_count'] else 0.0,
+    }
+
+    # Convert values based on selected unit
+    conversion_factor = 1000 if unit == 'kt' else 1
+    production_total = float(production_metrics['total_production'])
+    total_prod = production_total / conversion_factor
+
+    # Calculate RAP in tons and apply conversion factor
+    if selected_recipe:
+        rap_total = float(rap_metrics['total_reclaim']) / 1000  # Convert kg to tons
+    else:
+        rap_total = float(rap_metrics['total_reclaim'])  # Already in tons
+
+    # Bitumen conversion (kg to tons)
+    bitumen_total = float(bitumen_metrics['total_bitumen']) / 1000  # Convert kg to tons
+
+    # Calculate percentages - now using RAP from DailyMaterials
+    if production_total > 0:
+        rap_percent = (rap_total / production_total) * 100
+        bitumen_percent = (bitumen_total / production_total) * 100
+        aggregates_percent = 100 - rap_percent - bitumen_percent
+    else:
+        rap_percent = 0.0
+        bitumen_percent = 0.0
+        aggregates_percent = 0.0
+
+    # Temperature metrics
+    avg_temp_target = float(temp_metrics['avg_temp_target'])
+    avg_temp_actual = float(temp_metrics['avg_temp_actual'])
+    temp_deviation = avg_temp_actual - avg_temp_target
+
+    # Chart data
+    chart_data = daily_recipes.values('date').annotate(
+        daily_total=ExpressionWrapper(
+            Coalesce(Sum(production_expression, output_field=FloatField()), 0.0) / conversion_factor,
+            output_field=FloatField()
+        )
+    ).order_by('date')
+
+    return {
+        'recipe_names': list(recipe_names),
+
+        # Production metrics
+        'total_production': f"{total_prod:,.2f} {unit}",
+        'production_total': production_total,  # Tonnes, for live updates shown in another unit
+        'rap_percentage': f"{rap_percent:.2f}%",
+        'bitumen_percentage': f"{bitumen_percent:.2f}%",
+        'aggregates_percentage': f"{aggregates_percent:.2f}%",
+
+        # Temperature metrics
+        'avg_temp_target': f"{avg_temp_target:.1f}°C",
+        'avg_temp_actual': f"{avg_temp_actual:.1f}°C",
+        'temp_deviation': f"{temp_deviation:.1f}°C",
+
+        # Chart data
+        'chart_labels': [item['date'].isoformat() for item in chart_data],
+        'chart_data': [float(item['daily_total']) for item in chart_data],
+        'has_data': daily_recipes.exists(),
+    }
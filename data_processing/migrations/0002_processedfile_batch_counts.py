@@ -0,0 +1,28 @@
+# Generated by Django 5.0.13 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedfile',
+            name='batches_duplicate',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='batches_inserted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='batches_rejected',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
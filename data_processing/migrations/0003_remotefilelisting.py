@@ -0,0 +1,28 @@
+# Generated by Django 5.0.13 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0002_processedfile_batch_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemoteFileListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_dir', models.CharField(max_length=255)),
+                ('file_name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('modified', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'remote_file_listing',
+                'unique_together': {('remote_dir', 'file_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.13 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0003_remotefilelisting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedfile',
+            name='batches_updated',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='content_digest',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='remote_modified',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.13 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0004_processedfile_content_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('RecipeName', models.CharField(blank=True, default='', max_length=255)),
+                ('batch_count', models.PositiveIntegerField(default=0)),
+                ('Bitumen_Actual', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Bitumen_Target', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Filler_Actual', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Filler_Target', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Reclaim_Actual', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Reclaim_Target', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Temperature_Actual', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Temperature_Actual_count', models.PositiveIntegerField(default=0)),
+                ('Temperature_Target', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('Temperature_Target_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'daily_production_rollup',
+                'unique_together': {('date', 'RecipeName')},
+            },
+        ),
+    ]
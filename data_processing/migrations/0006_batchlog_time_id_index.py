@@ -0,0 +1,17 @@
+# Generated by Django 5.0.13 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0005_dailyproductionrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batchlog',
+            index=models.Index(fields=['Time', 'id'], name='batchlogs_time_id_idx'),
+        ),
+    ]
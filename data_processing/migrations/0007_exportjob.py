@@ -0,0 +1,40 @@
+# Generated by Django 5.0.13 on 2026-10-18 09:46
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0006_batchlog_time_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('dataset', models.CharField(choices=[('batchlog', 'Batch Log'), ('daily_materials', 'Daily Materials'), ('energy_data', 'Energy Data')], max_length=20)),
+                ('file_format', models.CharField(choices=[('parquet', 'Parquet'), ('arrow', 'Arrow IPC')], default='parquet', max_length=10)),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('rows_total', models.BigIntegerField(default=0)),
+                ('rows_written', models.BigIntegerField(default=0)),
+                ('file_path', models.CharField(blank=True, max_length=255)),
+                ('file_size', models.BigIntegerField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('celery_task_id', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'export_jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
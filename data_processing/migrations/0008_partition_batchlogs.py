@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from data_processing.partitioning import BATCHLOG_PARTITION_COLUMN, BATCHLOG_TABLE, rebuild_table
+
+
+def partition_batchlogs(apps, schema_editor):
+    """Convert BatchLogs into a table range partitioned by month on Time (PostgreSQL only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, BATCHLOG_TABLE, BATCHLOG_PARTITION_COLUMN, partitioned=True)
+
+
+def unpartition_batchlogs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, BATCHLOG_TABLE, BATCHLOG_PARTITION_COLUMN, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_batchlogs, unpartition_batchlogs),
+    ]
@@ -0,0 +1,39 @@
+import data_processing.fields
+from django.db import migrations
+
+HOTBIN_FIELDS = [f'HotBin{n}_{kind}' for n in range(1, 9) for kind in ('Actual', 'Target')]
+
+
+def compact_hotbins(apps, schema_editor):
+    """Store the hot-bin columns as integer hundredths when COMPACT_DECIMAL_COLUMNS is on"""
+    BatchLog = apps.get_model('data_processing', 'BatchLog')
+    data_processing.fields.convert_centi_columns(
+        schema_editor, BatchLog, compact=data_processing.fields.compact_columns()
+    )
+
+
+def expand_hotbins(apps, schema_editor):
+    BatchLog = apps.get_model('data_processing', 'BatchLog')
+    data_processing.fields.convert_centi_columns(schema_editor, BatchLog, compact=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0008_partition_batchlogs'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='batchlog',
+                    name=name,
+                    field=data_processing.fields.CentiDecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+                )
+                for name in HOTBIN_FIELDS
+            ],
+        ),
+        # After the state change, so the historical model has CentiDecimalFields to convert
+        migrations.RunPython(compact_hotbins, expand_hotbins),
+    ]
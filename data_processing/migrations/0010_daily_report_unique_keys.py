@@ -0,0 +1,53 @@
+# Generated by Django 5.0.13 on 2026-10-18 09:56
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+# (model, unique key) of the daily report tables
+DAILY_KEYS = [
+    ('OEEDailyData', ['date']),
+    ('PlantRunTime', ['date']),
+    ('DailyRecipes', ['date', 'RecipeNo']),
+    ('DailyMaterials', ['date', 'MaterialNo']),
+]
+
+
+def dedupe_daily_rows(apps, schema_editor):
+    """Keep the newest row (highest id) of each duplicated key so the unique keys can be added"""
+    for model_name, key_fields in DAILY_KEYS:
+        model = apps.get_model('data_processing', model_name)
+        duplicates = model.objects.exclude(**{f'{key_fields[-1]}__isnull': True}) \
+            .values(*key_fields).annotate(rows=Count('id'), keep=Max('id')).filter(rows__gt=1).order_by()
+        for group in list(duplicates):
+            keep = group.pop('keep')
+            group.pop('rows')
+            model.objects.filter(**group).exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0009_compact_hotbin_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_daily_rows, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='oeedailydata',
+            name='date',
+            field=models.DateField(unique=True),
+        ),
+        migrations.AlterField(
+            model_name='plantruntime',
+            name='date',
+            field=models.DateField(unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailymaterials',
+            unique_together={('date', 'MaterialNo')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyrecipes',
+            unique_together={('date', 'RecipeNo')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.13 on 2026-10-18 11:20
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def dedupe_energy_readings(apps, schema_editor):
+    """Keep the newest row (highest id) of each duplicated reading so the unique key can be added"""
+    EnergyData = apps.get_model('data_processing', 'EnergyData')
+    duplicates = EnergyData.objects.exclude(timestamp__isnull=True).exclude(meter_name__isnull=True) \
+        .values('timestamp', 'meter_name').annotate(rows=Count('id'), keep=Max('id')).filter(rows__gt=1).order_by()
+    for group in list(duplicates):
+        EnergyData.objects.filter(timestamp=group['timestamp'], meter_name=group['meter_name']) \
+            .exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0010_daily_report_unique_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_energy_readings, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='energydata',
+            unique_together={('timestamp', 'meter_name')},
+        ),
+    ]
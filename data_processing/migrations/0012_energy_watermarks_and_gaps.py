@@ -0,0 +1,55 @@
+# Generated by Django 5.0.13 on 2026-10-18 10:02
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_watermarks(apps, schema_editor):
+    """Start each meter's watermark at its newest stored reading"""
+    EnergyData = apps.get_model('data_processing', 'EnergyData')
+    EnergyMeterWatermark = apps.get_model('data_processing', 'EnergyMeterWatermark')
+    latest = EnergyData.objects.exclude(meter_name__isnull=True).exclude(timestamp__isnull=True) \
+        .values('meter_name').annotate(last=Max('timestamp')).order_by()
+    EnergyMeterWatermark.objects.bulk_create(
+        EnergyMeterWatermark(meter_name=row['meter_name'], last_timestamp=row['last']) for row in latest
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0011_energydata_unique_reading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnergyMeterWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meter_name', models.CharField(max_length=100, unique=True)),
+                ('last_timestamp', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'energy_meter_watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='EnergyDataGap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meter_name', models.CharField(max_length=100)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'energy_data_gaps',
+                'ordering': ['meter_name', 'start_date'],
+                'unique_together': {('meter_name', 'start_date')},
+            },
+        ),
+        migrations.RunPython(seed_watermarks, migrations.RunPython.noop),
+    ]
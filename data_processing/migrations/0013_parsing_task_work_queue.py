@@ -0,0 +1,66 @@
+# Generated by Django 5.0.13 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0012_energy_watermarks_and_gaps'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='parsingtask',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AddField(
+            model_name='parsingtask',
+            name='batches_processed',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='parsingtask',
+            name='celery_task_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='parsingtask',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='parsingtask',
+            name='schedule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='data_processing.parsingschedule'),
+        ),
+        migrations.AlterField(
+            model_name='processedfile',
+            name='task',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='processed_files_rel', to='data_processing.parsingtask'),
+        ),
+        migrations.CreateModel(
+            name='ParsingTaskFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('file_name', models.CharField(max_length=255)),
+                ('remote_meta', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('claimed', 'Claimed'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('lease_owner', models.CharField(blank=True, max_length=255)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('batches_processed', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='data_processing.parsingtask')),
+            ],
+            options={
+                'db_table': 'parsing_task_files',
+                'ordering': ['task', 'position'],
+                'indexes': [models.Index(fields=['task', 'status', 'position'], name='parsing_file_queue_idx')],
+                'unique_together': {('task', 'file_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.13 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0013_parsing_task_work_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parsingtask',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('interrupted', 'Interrupted'), ('paused', 'Paused'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+    ]
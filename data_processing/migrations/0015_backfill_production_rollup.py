@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def backfill_production_rollup(apps, schema_editor):
+    """Fill DailyProductionRollup from existing BatchLogs; the dashboards read only the rollup"""
+    from data_processing.rollup import rebuild_production_rollup
+
+    rebuild_production_rollup(
+        batch_model=apps.get_model('data_processing', 'BatchLog'),
+        rollup_model=apps.get_model('data_processing', 'DailyProductionRollup'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0014_parsing_task_paused_cancelled'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_production_rollup, migrations.RunPython.noop),
+    ]
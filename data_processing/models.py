@@ -5,6 +5,7 @@ from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.core.validators import RegexValidator
+from .fields import CentiDecimalField
 
 class Profile(models.Model):
     ROLE_CHOICES = [
@@ -32,7 +33,7 @@ def save_user_profile(sender, instance, **kwargs):
 
 class OEEDailyData(models.Model):
     id = models.AutoField(primary_key=True)
-    date = models.DateField()
+    date = models.DateField(unique=True)
     TotalProduction = models.FloatField(null=True, blank=True)
     TotalEmptyOut = models.FloatField(null=True, blank=True)
     ProductionBatches = models.IntegerField(null=True, blank=True)
@@ -42,7 +43,7 @@ class OEEDailyData(models.Model):
  
 class PlantRunTime(models.Model):
     id = models.AutoField(primary_key=True)
-    date = models.DateField()
+    date = models.DateField(unique=True)
     MixingActive = models.FloatField(null=True, blank=True)
     Mixer = models.FloatField(null=True, blank=True)
     Screen = models.FloatField(null=True, blank=True)   
@@ -65,6 +66,7 @@ class DailyRecipes(models.Model):
     Total = models.FloatField(null=True, blank=True)
     class Meta:
         db_table = 'daily_recipes'
+        unique_together = ['date', 'RecipeNo']
  
 class DailyMaterials(models.Model):
     id = models.AutoField(primary_key=True)
@@ -74,6 +76,7 @@ class DailyMaterials(models.Model):
     Quantity = models.FloatField(null=True, blank=True)
     class Meta:
         db_table = 'daily_materials'
+        unique_together = ['date', 'MaterialNo']
 
 class EnergyData(models.Model):
     date = models.DateField(null=True, blank=True)
@@ -84,13 +87,45 @@ class EnergyData(models.Model):
 
     class Meta:
         verbose_name = "Energy Meter Data"
+        unique_together = ['timestamp', 'meter_name']
         indexes = [
             models.Index(fields=['date', 'meter_name']),
         ]
 
     def __str__(self):
         return f"{self.meter_name} - {self.date}"
-    
+
+
+class EnergyMeterWatermark(models.Model):
+    """Newest reading stored for a meter; the forward energy fetch starts after the newest of these"""
+    meter_name = models.CharField(max_length=100, unique=True)
+    last_timestamp = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'energy_meter_watermarks'
+
+    def __str__(self):
+        return f"{self.meter_name} @ {self.last_timestamp}"
+
+
+class EnergyDataGap(models.Model):
+    """Days missing from a meter's readings (inclusive range), found by scan_energy_gaps"""
+    meter_name = models.CharField(max_length=100)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    attempts = models.PositiveIntegerField(default=0)  # Refetches requested so far
+    detected_at = models.DateTimeField(auto_now_add=True)
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'energy_data_gaps'
+        unique_together = ['meter_name', 'start_date']
+        ordering = ['meter_name', 'start_date']
+
+    def __str__(self):
+        return f"{self.meter_name} {self.start_date}..{self.end_date}"
+
 
 class BatchLog(models.Model):
     id = models.AutoField(primary_key=True)
@@ -107,22 +142,22 @@ class BatchLog(models.Model):
     Filler_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     Reclaim_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     Temperature_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin1_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin1_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin2_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin2_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin3_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin3_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin4_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin4_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin5_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin5_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin6_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin6_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin7_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin7_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin8_Actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    HotBin8_Target = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    HotBin1_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin1_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin2_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin2_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin3_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin3_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin4_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin4_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin5_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin5_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin6_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin6_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin7_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin7_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin8_Actual = CentiDecimalField(max_digits=10, null=True, blank=True)
+    HotBin8_Target = CentiDecimalField(max_digits=10, null=True, blank=True)
 
     class Meta:
         db_table = 'BatchLogs'
@@ -131,11 +166,41 @@ class BatchLog(models.Model):
         indexes = [
             models.Index(fields=['Time']),
             models.Index(fields=['RecipeName']),
+            # Keyset pagination seeks on (Time, id)
+            models.Index(fields=['Time', 'id'], name='batchlogs_time_id_idx'),
         ]
 
     def __str__(self):
         return f"BatchLog {self.BatchNo} - {self.Time}"
 
+class DailyProductionRollup(models.Model):
+    """
+    Per-day, per-recipe BatchLog totals maintained at ingest time.
+    Measurement columns hold the day's sums of the BatchLog column of the same
+    name; temperature counts allow averages that skip missing readings.
+    """
+    date = models.DateField()
+    RecipeName = models.CharField(max_length=255, blank=True, default='')
+    batch_count = models.PositiveIntegerField(default=0)
+    Bitumen_Actual = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Bitumen_Target = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Filler_Actual = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Filler_Target = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Reclaim_Actual = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Reclaim_Target = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Temperature_Actual = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Temperature_Actual_count = models.PositiveIntegerField(default=0)
+    Temperature_Target = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    Temperature_Target_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_production_rollup'
+        unique_together = ['date', 'RecipeName']
+
+    def __str__(self):
+        return f"{self.date} - {self.RecipeName or 'Unknown'}"
+
 User = get_user_model()
 
 class ParsingSchedule(models.Model):
@@ -227,7 +292,7 @@ class ParsingSchedule(models.Model):
 
 class ProcessedFile(models.Model):
 
-    task = models.ForeignKey('ParsingTask', on_delete=models.CASCADE, null=True, related_name='processed_files_rel')
+    task = models.ForeignKey('ParsingTask', on_delete=models.SET_NULL, null=True, related_name='processed_files_rel')
 
     STATUS_CHOICES = [
         ('success', 'Success'),
@@ -247,6 +312,13 @@ class ProcessedFile(models.Model):
     error_message = models.TextField(null=True, blank=True)
     trigger_source = models.CharField(max_length=20, choices=TRIGGER_SOURCES, default='manual')
     schedule = models.ForeignKey(ParsingSchedule, null=True, blank=True, on_delete=models.SET_NULL)
+    batches_inserted = models.PositiveIntegerField(default=0)
+    batches_duplicate = models.PositiveIntegerField(default=0)
+    batches_rejected = models.PositiveIntegerField(default=0)
+    batches_updated = models.PositiveIntegerField(default=0)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    remote_modified = models.DateTimeField(null=True, blank=True)
+    content_digest = models.CharField(max_length=64, blank=True)  # SHA-256 of the downloaded file
 
     class Meta:
         ordering = ['-export_time']
@@ -255,21 +327,143 @@ class ProcessedFile(models.Model):
         return self.file_name
     
 
+class RemoteFileListing(models.Model):
+    """Snapshot of the last accounted-for FTP listing entry for a file"""
+    remote_dir = models.CharField(max_length=255)
+    file_name = models.CharField(max_length=255)
+    size = models.BigIntegerField(null=True, blank=True)
+    modified = models.DateTimeField(null=True, blank=True)  # Remote mtime from MLSD/LIST
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'remote_file_listing'
+        unique_together = ['remote_dir', 'file_name']
+
+    def __str__(self):
+        return f"{self.remote_dir}/{self.file_name}"
+
+
 class ParsingTask(models.Model):
+    """
+    One ingestion run over a set of FTP files. Its files are queued as
+    ParsingTaskFile rows that workers claim under a lease, so an interrupted
+    run can be picked up by any worker from the first unfinished file.
+    A paused job holds no worker; resuming queues it again.
+    """
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('interrupted', 'Interrupted'),
+        ('paused', 'Paused'),
+        ('cancelled', 'Cancelled'),
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_files = models.IntegerField(default=0)
     processed_files_count = models.IntegerField(default=0)
+    batches_processed = models.BigIntegerField(default=0)
     current_file = models.CharField(max_length=255, blank=True)
+    schedule = models.ForeignKey(ParsingSchedule, null=True, blank=True, on_delete=models.SET_NULL)
+    celery_task_id = models.CharField(max_length=255, blank=True)  # Worker task currently running the job
     created_at = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
-    
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def progress(self):
+        if self.total_files:
+            return int(self.processed_files_count / self.total_files * 100)
+        return 100 if self.status == 'completed' else 0
+
     def __str__(self):
         return f"Task {self.id} ({self.status})"
+
+
+class ParsingTaskFile(models.Model):
+    """
+    A file in a ParsingTask's work queue. A worker claims it by taking the
+    lease; a claim whose lease has expired is free to be taken again.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('claimed', 'Claimed'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.ForeignKey(ParsingTask, on_delete=models.CASCADE, related_name='files')
+    position = models.PositiveIntegerField()  # Discovery order
+    file_name = models.CharField(max_length=255)
+    remote_meta = models.JSONField(default=dict, blank=True)  # Listing size/mtime and reingest flag
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    lease_owner = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    batches_processed = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'parsing_task_files'
+        unique_together = ['task', 'file_name']
+        ordering = ['task', 'position']
+        indexes = [
+            models.Index(fields=['task', 'status', 'position'], name='parsing_file_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+
+class ExportJob(models.Model):
+    """A background columnar (Parquet / Arrow IPC) export of one dataset"""
+    DATASET_CHOICES = [
+        ('batchlog', 'Batch Log'),
+        ('daily_materials', 'Daily Materials'),
+        ('energy_data', 'Energy Data'),
+    ]
+    FORMAT_CHOICES = [
+        ('parquet', 'Parquet'),
+        ('arrow', 'Arrow IPC'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    dataset = models.CharField(max_length=20, choices=DATASET_CHOICES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='parquet')
+    filters = models.JSONField(default=dict, blank=True)  # date_start, date_end, recipe
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    rows_total = models.BigIntegerField(default=0)
+    rows_written = models.BigIntegerField(default=0)
+    file_path = models.CharField(max_length=255, blank=True)  # Relative to MEDIA_ROOT
+    file_size = models.BigIntegerField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+    celery_task_id = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'export_jobs'
+        ordering = ['-created_at']
+
+    @property
+    def progress(self):
+        if self.status == 'completed':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_written * 100 / self.rows_total))
+
+    def __str__(self):
+        return f"Export {self.dataset}.{self.file_format} ({self.status})"
@@ -0,0 +1,128 @@
+import base64
+import binascii
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F, Q
+
+from .metrics import dashboard_data_modified
+
+logger = logging.getLogger(__name__)
+
+COUNT_CACHE_PREFIX = 'row_count'
+
+
+def _count_timeout():
+    return getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 300)
+
+
+def encode_cursor(order_field, value, pk):
+    """Opaque cursor for the row (value, pk) of a listing sorted on order_field"""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    elif value is not None and not isinstance(value, (int, str)):
+        value = str(value)  # Decimal
+    payload = json.dumps([order_field, value, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, order_field):
+    """
+    (value, pk) from a cursor produced by encode_cursor, or None when the
+    cursor is malformed or belongs to a different sort column.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        field_name, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if field_name != order_field:
+            return None
+        if value is not None:
+            value = model._meta.get_field(order_field).to_python(value)
+        return value, int(pk)
+    except (ValueError, TypeError, binascii.Error, ValidationError) as e:
+        logger.debug(f"Ignoring invalid cursor {cursor!r}: {e}")
+        return None
+
+
+def keyset_order(queryset, order_field, descending):
+    """
+    Order on (order_field, pk) with NULLs last in both directions, so every
+    row has a stable position a cursor can seek past.
+    """
+    if descending:
+        return queryset.order_by(F(order_field).desc(nulls_last=True), F('pk').desc())
+    return queryset.order_by(F(order_field).asc(nulls_last=True), F('pk').asc())
+
+
+def keyset_seek(queryset, order_field, descending, value, pk):
+    """
+    Restrict a keyset-ordered queryset to the rows after (value, pk).
+    `field <= value AND (field < value OR pk < cursor_pk)` keeps the leading
+    range condition on the indexed column so the database can seek directly
+    to the page instead of scanning the skipped rows.
+    """
+    beyond = 'lt' if descending else 'gt'
+    at_or_beyond = 'lte' if descending else 'gte'
+    pk_beyond = Q(**{f'pk__{beyond}': pk})
+    if value is None:
+        # Already in the trailing NULL block
+        return queryset.filter(Q(**{f'{order_field}__isnull': True}) & pk_beyond)
+    return queryset.filter(
+        (Q(**{f'{order_field}__{at_or_beyond}': value})
+         & (Q(**{f'{order_field}__{beyond}': value}) | pk_beyond))
+        | Q(**{f'{order_field}__isnull': True})
+    )
+
+
+def estimated_row_count(model):
+    """
+    Approximate row count for a whole table, cached. On PostgreSQL this is the
+    planner's reltuples statistic (summed over the partitions of a partitioned
+    table), which costs nothing to read; elsewhere, or before the table has
+    been analyzed, an exact count.
+    """
+    table = model._meta.db_table
+    key = f'{COUNT_CACHE_PREFIX}:estimate:{table}'
+    estimate = cache.get(key)
+    if estimate is not None:
+        return estimate
+
+    estimate = 0
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT COALESCE(
+                    (SELECT SUM(GREATEST(c.reltuples, 0)) FROM pg_inherits i
+                     JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass),
+                    (SELECT GREATEST(reltuples, 0) FROM pg_class WHERE oid = %s::regclass)
+                )::bigint
+                """,
+                [connection.ops.quote_name(table)] * 2
+            )
+            estimate = cursor.fetchone()[0] or 0
+    if not estimate:
+        estimate = model.objects.count()
+
+    cache.set(key, estimate, _count_timeout())
+    return estimate
+
+
+def cached_count(queryset, signature):
+    """
+    Exact count of a filtered queryset, cached per filter `signature` and
+    source data version so repeated page requests do not recount.
+    """
+    stamp = dashboard_data_modified().isoformat()
+    digest = hashlib.md5(f'{signature}:{stamp}'.encode()).hexdigest()
+    key = f'{COUNT_CACHE_PREFIX}:{queryset.model._meta.db_table}:{digest}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, _count_timeout())
+    return count
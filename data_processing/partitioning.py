@@ -0,0 +1,207 @@
+"""
+Monthly range partitioning of BatchLogs on Time (PostgreSQL only).
+
+The table is converted by migration 0008; after that create_batchlog_partitions
+keeps partitions for the coming months in place. Rows outside every month
+partition land in a DEFAULT partition and are moved out when their month's
+partition is created.
+"""
+import logging
+from datetime import date, datetime
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+logger = logging.getLogger(__name__)
+
+BATCHLOG_TABLE = 'BatchLogs'
+BATCHLOG_PARTITION_COLUMN = 'Time'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_y{month.year}m{month.month:02d}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def _month_bound(month):
+    """Lower bound of a month partition: local midnight on the 1st, so partitions follow local dates"""
+    return timezone.make_aware(datetime.combine(month, datetime.min.time()))
+
+
+def _day_bound(value):
+    if isinstance(value, str):
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f"Invalid date: {value!r}")
+        value = parsed
+    return timezone.make_aware(datetime.combine(value, datetime.min.time()))
+
+
+def time_range_q(date_start=None, date_end=None, field=BATCHLOG_PARTITION_COLUMN):
+    """
+    Q for the local calendar days date_start..date_end (inclusive, dates or
+    YYYY-MM-DD strings) as a plain range on `field`. Unlike Time__date lookups
+    this compares the column itself, so Postgres can prune partitions and use
+    the Time index.
+    """
+    q = Q()
+    if date_start:
+        q &= Q(**{f'{field}__gte': _day_bound(date_start)})
+    if date_end:
+        end = parse_date(date_end) if isinstance(date_end, str) else date_end
+        if end is None:
+            raise ValueError(f"Invalid date: {date_end!r}")
+        q &= Q(**{f'{field}__lt': _day_bound(date.fromordinal(end.toordinal() + 1))})
+    return q
+
+
+def is_partitioned(table=BATCHLOG_TABLE, using=None):
+    using = using or connection
+    if using.vendor != 'postgresql':
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [using.ops.quote_name(table)]
+        )
+        return cursor.fetchone()[0]
+
+
+def _partitions(cursor, table):
+    cursor.execute(
+        """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        [connection.ops.quote_name(table)]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _create_month_partition(cursor, table, column, month, existing):
+    """Create one month partition, moving any of its rows out of the DEFAULT partition"""
+    qn = connection.ops.quote_name
+    lower, upper = _month_bound(month), _month_bound(add_months(month, 1))
+    default = default_partition_name(table)
+
+    strays = False
+    if default in existing:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE {qn(column)} >= %s AND {qn(column)} < %s)",
+            [lower, upper]
+        )
+        strays = cursor.fetchone()[0]
+    if strays:
+        # A new partition cannot overlap rows held by the default partition
+        cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}')
+
+    cursor.execute(
+        f"CREATE TABLE {qn(partition_name(table, month))} PARTITION OF {qn(table)} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+
+    if strays:
+        in_month = f"{qn(column)} >= %s AND {qn(column)} < %s"
+        cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(default)} WHERE {in_month}', [lower, upper])
+        cursor.execute(f'DELETE FROM {qn(default)} WHERE {in_month}', [lower, upper])
+        cursor.execute(f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT')
+        logger.info(f"Moved {month:%Y-%m} rows of {table} out of the default partition")
+
+
+def ensure_monthly_partitions(start_month, end_month, table=BATCHLOG_TABLE, column=BATCHLOG_PARTITION_COLUMN):
+    """
+    Create any missing month partitions from start_month to end_month
+    (inclusive). Returns the names of the partitions created.
+    """
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = _partitions(cursor, table)
+        month = month_start(start_month)
+        while month <= end_month:
+            name = partition_name(table, month)
+            if name not in existing:
+                _create_month_partition(cursor, table, column, month, existing)
+                existing.add(name)
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def _table_keys(cursor, table):
+    """(constraints, index definitions) of a table, for recreating them after a rebuild"""
+    cursor.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u')
+        ORDER BY contype
+        """,
+        [connection.ops.quote_name(table)]
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x
+        WHERE x.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+        """,
+        [connection.ops.quote_name(table)]
+    )
+    return constraints, [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_table(cursor, table, column, partitioned, months_ahead=3):
+    """
+    Copy `table` into a new table of the same name that is (or is no longer)
+    range partitioned by month on `column`, keeping its constraints, index
+    names and id sequence. PostgreSQL requires the partition column in every
+    unique key, so the partitioned primary key is (id, column).
+    """
+    qn = connection.ops.quote_name
+    previous = f'{table}_previous'
+    sequence = f'{table}_id_seq'
+    constraints, indexes = _table_keys(cursor, table)
+    cursor.execute(f'SELECT min({qn(column)}) FROM {qn(table)}')
+    first = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(previous)}')
+    if partitioned:
+        cursor.execute(f'CREATE TABLE {qn(table)} (LIKE {qn(previous)}) PARTITION BY RANGE ({qn(column)})')
+        cursor.execute(f'CREATE TABLE {qn(default_partition_name(table))} PARTITION OF {qn(table)} DEFAULT')
+        this_month = month_start(timezone.localdate())
+        month = month_start(timezone.localtime(first).date()) if first else this_month
+        existing = {default_partition_name(table)}
+        while month <= add_months(this_month, months_ahead):
+            _create_month_partition(cursor, table, column, month, existing)
+            month = add_months(month, 1)
+    else:
+        cursor.execute(f'CREATE TABLE {qn(table)} (LIKE {qn(previous)})')
+
+    cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(previous)}')
+    # Dropping the old table frees its constraint, index and sequence names
+    cursor.execute(f'DROP TABLE {qn(previous)}')
+
+    for name, kind, definition in constraints:
+        if kind == 'p':
+            definition = f'PRIMARY KEY (id, {qn(column)})' if partitioned else 'PRIMARY KEY (id)'
+        cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+    for definition in indexes:
+        # Indexes read from a partitioned parent are "ON ONLY"; recreate them on the whole table
+        cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+
+    cursor.execute(f'CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id')
+    cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{qn(sequence)}')")
+    cursor.execute(f"SELECT setval('{qn(sequence)}', COALESCE(MAX(id), 0) + 1, false) FROM {qn(table)}")
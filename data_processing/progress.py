@@ -0,0 +1,65 @@
+"""
+Throttled progress reporting for long-running tasks.
+
+Every progress update used to be a channel layer group_send plus a result
+backend write, several per file. A ProgressReporter publishes at most
+PROGRESS_UPDATES_PER_SECOND updates; updates arriving in between are merged
+into the pending state (later values win) and go out with the next one.
+Final updates and flush() always publish, so the last state is never lost.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """
+    Coalescing publisher for one task's progress. `send(data)` delivers an
+    update, e.g. to the task's websocket group; with `task` set, each
+    published state is also stored with task.update_state.
+    A rate of 0 publishes every update.
+    """
+    def __init__(self, send, task=None, state='RUNNING', max_rate=None, clock=time.monotonic):
+        self.send = send
+        self.task = task
+        self.state = state
+        rate = getattr(settings, 'PROGRESS_UPDATES_PER_SECOND', 2) if max_rate is None else max_rate
+        self.interval = 1 / rate if rate > 0 else 0
+        self.clock = clock
+        self.published = 0
+        self._pending = {}
+        self._last_published = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+        return False
+
+    def update(self, data=None, final=False, **fields):
+        """Merge an update into the pending state; publish it now if final or due"""
+        if data:
+            self._pending.update(data)
+        self._pending.update(fields)
+        due = self._last_published is None or self.clock() - self._last_published >= self.interval
+        if final or due:
+            self.flush()
+
+    def flush(self):
+        """Publish the pending state, if any; returns whether something was sent"""
+        if not self._pending:
+            return False
+        data, self._pending = self._pending, {}
+        self._last_published = self.clock()
+        self.published += 1
+        if self.task is not None and self.task.request.id:
+            try:
+                self.task.update_state(state=self.state, meta=data)
+            except Exception as e:
+                logger.error(f"Failed to store task progress: {str(e)}")
+        self.send(data)
+        return True
@@ -0,0 +1,122 @@
+"""
+DailyProductionRollup maintenance: per-day, per-recipe BatchLog totals that
+the dashboards read instead of scanning BatchLogs.
+
+Bulk ingest adds deltas for the rows it inserts, the BatchLog signal
+receivers handle single-row writes and anything else rebuilds the affected
+days from BatchLog. Models are looked up through the app registry, so
+migration 0015 can run the rebuild against historical models.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+ROLLUP_SUM_FIELDS = (
+    'Bitumen_Actual', 'Bitumen_Target', 'Filler_Actual', 'Filler_Target',
+    'Reclaim_Actual', 'Reclaim_Target', 'Temperature_Actual', 'Temperature_Target',
+)
+ROLLUP_COUNT_FIELDS = ('Temperature_Actual', 'Temperature_Target')
+
+
+def rollup_date(batch_time):
+    """Local calendar day of a batch, matching Time__date and TruncDate"""
+    if timezone.is_naive(batch_time):
+        return batch_time.date()
+    return timezone.localtime(batch_time).date()
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def add_rollup_delta(deltas, batch_data):
+    """Accumulate one inserted batch into {(date, RecipeName): field increments}"""
+    key = (rollup_date(batch_data['Time']), batch_data.get('RecipeName') or '')
+    delta = deltas.get(key)
+    if delta is None:
+        delta = deltas[key] = dict.fromkeys(
+            ('batch_count',) + ROLLUP_SUM_FIELDS + tuple(f'{field}_count' for field in ROLLUP_COUNT_FIELDS), 0
+        )
+    delta['batch_count'] += 1
+    for field in ROLLUP_SUM_FIELDS:
+        value = batch_data.get(field)
+        if value is None:
+            continue
+        delta[field] += Decimal(value)
+        if field in ROLLUP_COUNT_FIELDS:
+            delta[f'{field}_count'] += 1
+
+
+def apply_rollup_deltas(deltas):
+    """Add accumulated deltas to DailyProductionRollup, one UPDATE per (date, recipe)"""
+    DailyProductionRollup = apps.get_model('data_processing', 'DailyProductionRollup')
+    for (day, recipe), delta in deltas.items():
+        changes = {field: F(field) + value for field, value in delta.items() if value}
+        rollup = DailyProductionRollup.objects.filter(date=day, RecipeName=recipe)
+        if rollup.update(updated_at=timezone.now(), **changes):
+            continue
+        try:
+            with transaction.atomic():
+                DailyProductionRollup.objects.create(date=day, RecipeName=recipe, **delta)
+        except IntegrityError:
+            # Created by a concurrent writer in the meantime
+            rollup.update(updated_at=timezone.now(), **changes)
+
+
+def rebuild_production_rollup(dates=None, start_date=None, end_date=None, batch_model=None, rollup_model=None):
+    """
+    Recompute DailyProductionRollup rows from BatchLog:
+    - dates: specific days, e.g. after a re-ingest or an admin edit
+    - start_date/end_date: an inclusive range; neither means all history
+    - batch_model/rollup_model: historical models, when run from a migration
+    Returns the number of rollup rows written.
+    """
+    batch_model = batch_model or apps.get_model('data_processing', 'BatchLog')
+    rollup_model = rollup_model or apps.get_model('data_processing', 'DailyProductionRollup')
+    batches = batch_model.objects.all()
+    rollups = rollup_model.objects.all()
+    if dates is not None:
+        dates = sorted(set(dates))
+        if not dates:
+            return 0
+        time_filter = Q()
+        for day in dates:
+            time_filter |= Q(Time__gte=_day_start(day), Time__lt=_day_start(day + timedelta(days=1)))
+        batches = batches.filter(time_filter)
+        rollups = rollups.filter(date__in=dates)
+    if start_date:
+        batches = batches.filter(Time__gte=_day_start(start_date))
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date:
+        batches = batches.filter(Time__lt=_day_start(end_date + timedelta(days=1)))
+        rollups = rollups.filter(date__lte=end_date)
+
+    totals = batches.annotate(day=TruncDate('Time')).values('day', 'RecipeName').annotate(
+        rollup_batch_count=Count('id'),
+        **{f'rollup_{field}': Sum(field) for field in ROLLUP_SUM_FIELDS},
+        **{f'rollup_{field}_count': Count(field) for field in ROLLUP_COUNT_FIELDS},
+    ).order_by()
+
+    rows = {}
+    for entry in totals.iterator():
+        # NULL and blank recipe names share one rollup row
+        key = (entry['day'], entry['RecipeName'] or '')
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = rollup_model(date=key[0], RecipeName=key[1])
+        row.batch_count += entry['rollup_batch_count']
+        for field in ROLLUP_SUM_FIELDS:
+            setattr(row, field, getattr(row, field) + (entry[f'rollup_{field}'] or 0))
+        for field in ROLLUP_COUNT_FIELDS:
+            count_field = f'{field}_count'
+            setattr(row, count_field, getattr(row, count_field) + entry[f'rollup_{count_field}'])
+
+    with transaction.atomic():
+        rollups.delete()
+        rollup_model.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
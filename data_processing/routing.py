@@ -4,5 +4,7 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/parsing_progress/$', consumers.ParsingProgressConsumer.as_asgi()),
-    re_path(r'ws/energy/(?P<task_id>\w+)/$', consumers.EnergyDataConsumer.as_asgi()),
-]
\ No newline at end of file
+    re_path(r'ws/energy/(?P<task_id>\w+)/$', consumers.EnergyConsumer.as_asgi()),
+    re_path(r'ws/exports/(?P<job_id>[0-9a-f-]+)/$', consumers.ExportJobConsumer.as_asgi()),
+    re_path(r'ws/dashboard/$', consumers.DashboardConsumer.as_asgi()),
+]
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .live_dashboard import push_delay, queue_dashboard_push
+from .metrics import dashboard_data_changed, invalidate_dashboard_metrics
+from .models import BatchLog, ProcessedFile, RemoteFileListing
+from .rollup import ROLLUP_SUM_FIELDS, add_rollup_delta, apply_rollup_deltas, rebuild_production_rollup, rollup_date
+from .tasks import push_dashboard_updates
+
+
+@receiver(dashboard_data_changed)
+def schedule_live_dashboard_push(sender, dates=None, **kwargs):
+    """Debounced push of fresh widgets to subscribed dashboards after each data commit"""
+    if queue_dashboard_push(dates):
+        push_dashboard_updates.apply_async(countdown=push_delay())
+
+
+# Single-row BatchLog writes (the edit views, admin, row-by-row ingest) keep
+# DailyProductionRollup and the cached dashboards in step here; the bulk
+# ingest paths fire no signals and maintain them themselves.
+@receiver(pre_save, sender=BatchLog)
+def remember_batchlog_rollup_date(sender, instance, raw=False, **kwargs):
+    """Day the row counted towards before an edit, which may move it to another day"""
+    instance._rollup_previous_date = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        previous = BatchLog.objects.filter(pk=instance.pk).values_list('Time', flat=True).first()
+        if previous is not None:
+            instance._rollup_previous_date = rollup_date(previous)
+
+
+@receiver(post_save, sender=BatchLog)
+def update_rollup_on_batchlog_save(sender, instance, created, **kwargs):
+    if created:
+        deltas = {}
+        add_rollup_delta(deltas, {field: getattr(instance, field) for field in ('Time', 'RecipeName') + ROLLUP_SUM_FIELDS})
+        apply_rollup_deltas(deltas)
+        invalidate_dashboard_metrics([rollup_date(instance.Time)])
+        return
+    dates = {rollup_date(instance.Time), getattr(instance, '_rollup_previous_date', None)} - {None}
+    rebuild_production_rollup(dates=dates)
+    invalidate_dashboard_metrics(dates)
+
+
+@receiver(post_delete, sender=BatchLog)
+def update_rollup_on_batchlog_delete(sender, instance, **kwargs):
+    dates = [rollup_date(instance.Time)]
+    rebuild_production_rollup(dates=dates)
+    invalidate_dashboard_metrics(dates)
+
+
+@receiver(post_delete, sender=ProcessedFile)
+def forget_remote_listing_on_processedfile_delete(sender, instance, **kwargs):
+    """Drop the listing snapshot so discovery checks the file again and re-ingests it"""
+    RemoteFileListing.objects.filter(file_name=instance.file_name).delete()
@@ -0,0 +1,62 @@
+// ==================== LIVE DASHBOARD UPDATES ====================
+// Subscribes the page to its dashboard topic over ws/dashboard/ and
+// re-dispatches each push as a 'dashboard:update' event on document.
+// Pages declare their topic in a #dashboard-topic JSON script, or call
+// DashboardLive.subscribe() themselves.
+const DashboardLive = (() => {
+    // Well within DASHBOARD_TOPIC_TTL, so the topic stays on the push list
+    const RESUBSCRIBE_INTERVAL = 15 * 60 * 1000;
+    let socket = null;
+    let topic = null;
+    let retryDelay = 1000;
+
+    const send = (action, target = topic) => {
+        if (socket && socket.readyState === WebSocket.OPEN && target) {
+            socket.send(JSON.stringify(Object.assign({ action }, target)));
+        }
+    };
+
+    const connect = () => {
+        const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        socket = new WebSocket(protocol + window.location.host + '/ws/dashboard/');
+
+        socket.onopen = () => {
+            retryDelay = 1000;
+            send('subscribe');
+        };
+
+        socket.onmessage = (e) => {
+            const data = JSON.parse(e.data);
+            if (data.type === 'dashboard.update') {
+                document.dispatchEvent(new CustomEvent('dashboard:update', { detail: data }));
+            } else if (data.type === 'error') {
+                console.error('Dashboard subscription error:', data.message);
+            }
+        };
+
+        socket.onclose = () => {
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 60000);
+        };
+    };
+
+    const subscribe = (newTopic) => {
+        send('unsubscribe');
+        topic = newTopic;
+        if (socket) {
+            send('subscribe');
+            return;
+        }
+        connect();
+        setInterval(() => send('subscribe'), RESUBSCRIBE_INTERVAL);
+    };
+
+    document.addEventListener('DOMContentLoaded', () => {
+        const topicElement = document.getElementById('dashboard-topic');
+        if (topicElement) {
+            subscribe(JSON.parse(topicElement.textContent));
+        }
+    });
+
+    return { subscribe };
+})();
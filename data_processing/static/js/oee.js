@@ -19,13 +19,24 @@ document.addEventListener('DOMContentLoaded', function() {
             currentDays = parseInt(this.dataset.days);
             // Reload data
             loadData();
+            DashboardLive.subscribe({ view: 'oee', time_range: currentDays });
         });
     });
 
+    // Figures pushed after new data lands, instead of reloading
+    document.addEventListener('dashboard:update', (event) => {
+        const update = event.detail;
+        if (update.view !== 'oee' || update.time_range !== currentDays) return;
+        updateKPIs(update.widgets);
+        updateRuntimeChart(update.widgets.runtime_data);
+        updateDryingTable(update.widgets.drying_efficiency);
+    });
+
     
 
     async function initDashboard() {
         await loadData();
+        DashboardLive.subscribe({ view: 'oee', time_range: currentDays });
     }
 
 
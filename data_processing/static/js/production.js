@@ -83,6 +83,28 @@ document.addEventListener('DOMContentLoaded', function() {
         initializeChart();
     }
 
+    // Figures pushed after new data lands; they are computed in tonnes
+    document.addEventListener('dashboard:update', (event) => {
+        const update = event.detail;
+        if (update.view !== 'production') return;
+
+        const widgets = update.widgets;
+        const scale = initialUnit === 'kt' ? 1000 : 1;
+        widgets.total_production = `${(widgets.production_total / scale).toLocaleString('en-US', {
+            minimumFractionDigits: 2, maximumFractionDigits: 2
+        })} ${initialUnit}`;
+        document.querySelectorAll('[data-widget]').forEach(element => {
+            const value = widgets[element.dataset.widget];
+            if (value !== undefined) element.textContent = value;
+        });
+
+        chartLabels.splice(0, chartLabels.length, ...widgets.chart_labels);
+        chartData.splice(0, chartData.length, ...widgets.chart_data.map(value => value / scale));
+        if (chartLabels.length > 0) {
+            initializeChart();
+        }
+    });
+
     // Apply filters handler
     document.getElementById('applyFilters').addEventListener('click', function() {
         const params = new URLSearchParams();
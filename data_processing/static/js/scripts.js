@@ -265,9 +265,9 @@
             }
             
             //  RAP Consumption Widget if exists
-            const rapElements = document.querySelectorAll('.small-box h3');
-            if (rapElements.length > 1 && widgetData.rap_consumption !== undefined) {
-                rapElements[1].textContent = widgetData.rap_consumption;
+            const rapElement = document.querySelector('.rap-data');
+            if (rapElement && widgetData.rap_consumption !== undefined) {
+                rapElement.textContent = widgetData.rap_consumption;
             }
 
             // Electricity Consumption Widget if exists
@@ -332,6 +332,26 @@
         initializeMaterialTable();
     });
 
+    // Live updates pushed to the home dashboards (see dashboard_live.js)
+    document.addEventListener('dashboard:update', (event) => {
+        const update = event.detail;
+        if (update.view !== 'home' || !document.getElementById('widget-data')) return;
+
+        const widgets = update.widgets;
+        document.getElementById('widget-data').textContent = JSON.stringify({
+            total_production: widgets.total_production,
+            rap_consumption: widgets.rap_consumption,
+            electricity_consumption: widgets.electricity_consumption
+        });
+        document.getElementById('chart-labels').textContent = widgets.labels;
+        document.getElementById('chart-values').textContent = widgets.values;
+        document.getElementById('material-data').textContent = widgets.material_data;
+
+        updateWidgets();
+        initializeProductionChart();
+        initializeMaterialTable();
+    });
+
 
     // ==================== DATA TABLES MODULE ====================
 
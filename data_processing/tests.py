@@ -1,6 +1,18 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import json
+import threading
+import time
+import xml.etree.ElementTree as ET
+from ftplib import error_perm
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
-from .models import ParsingSchedule, ProcessedFile
+from .models import BatchLog, DailyProductionRollup, ParsingSchedule, ProcessedFile, RemoteFileListing
 
 class ParsingTestCase(TestCase):
     def setUp(self):
@@ -14,4 +26,1589 @@ class ParsingTestCase(TestCase):
     def test_scheduled_parse(self):
         from .tasks import scheduled_parse
         result = scheduled_parse.delay(self.schedule.id)
-        self.assertIsNotNone(result.id)
\ No newline at end of file
+        self.assertIsNotNone(result.id)
+
+SAMPLE_DAILY_XML = b"""<?xml version="1.0"?>
+<DailyXMLReport>
+  <BatchLog><BatchNo>1</BatchNo><Time>2025-03-01T08:00:00</Time><JobNo>10</JobNo></BatchLog>
+  <BatchLog><BatchNo>2</BatchNo><Time>2025-03-01T08:05:00</Time><JobNo>10</JobNo></BatchLog>
+  <OEEPerformance><TotalProduction>120.5</TotalProduction></OEEPerformance>
+  <PlantRunTime><RunTime><ItemName>Mixer</ItemName><RunningTime>01:00:00</RunningTime></RunTime></PlantRunTime>
+  <RecipeTotals><RecipeTotal><RecipeNo>3</RecipeNo><Total>40</Total></RecipeTotal></RecipeTotals>
+  <MaterialTotals><Material><MaterialNo>7</MaterialNo><Quantity>5</Quantity></Material></MaterialTotals>
+</DailyXMLReport>"""
+
+
+class StreamingParserTestCase(SimpleTestCase):
+    def test_batches_and_sections_in_one_pass(self):
+        from .tasks import iter_xml_records
+        records = list(iter_xml_records(BytesIO(SAMPLE_DAILY_XML)))
+
+        self.assertEqual([kind for kind, _ in records], ['batch', 'batch', 'daily'])
+        daily = records[-1][1]
+        self.assertEqual(daily.findtext('OEEPerformance/TotalProduction'), '120.5')
+        self.assertEqual(len(daily.findall('.//PlantRunTime/RunTime')), 1)
+        self.assertEqual(len(daily.findall('.//RecipeTotals/RecipeTotal')), 1)
+        self.assertEqual(len(daily.findall('.//MaterialTotals/*')), 1)
+
+    def test_batches_are_cleared_after_processing(self):
+        from .tasks import iter_xml_records
+        seen = []
+        for kind, element in iter_xml_records(BytesIO(SAMPLE_DAILY_XML)):
+            if kind == 'batch':
+                self.assertEqual(element.findtext('JobNo'), '10')
+                seen.append(element)
+        self.assertTrue(all(len(element) == 0 for element in seen))
+
+    def test_rejects_unknown_root(self):
+        from .tasks import iter_xml_records
+        with self.assertRaises(ValueError):
+            list(iter_xml_records(BytesIO(b'<Other><BatchLog/></Other>')))
+
+
+class SafeDecimalTestCase(SimpleTestCase):
+    values = [
+        None, '', '   ', '0', '0.00', '12.5', ' 120.00 ', '-0.40', '.5', '5.', '-.5', '007.10',
+        '1,024.5', '12.5 kg', '+3', '1e5', '1.2.3', '-', '--1', '.', 'NaN', 'Infinity', '٣.٥',
+        '12-5', 7, 2.5, Decimal('1.10'),
+    ]
+
+    def test_parity_with_cleaning_path(self):
+        from .tasks import _clean_decimal, safe_decimal
+        for value in self.values:
+            with self.subTest(value=value):
+                expected = None if value is None else _clean_decimal(str(value).strip())
+                self.assertEqual(str(safe_decimal(value)), str(expected))
+
+    def test_repeated_literals_are_cached(self):
+        from .tasks import _parse_decimal, safe_decimal
+        _parse_decimal.cache_clear()
+        for _ in range(3):
+            safe_decimal('0.00')
+        self.assertEqual(_parse_decimal.cache_info().hits, 2)
+
+    def test_parse_batch_takes_first_matching_values(self):
+        from .tasks import parse_batch
+        batch_data = parse_batch(ET.fromstring(
+            "<BatchLog><BatchNo> 5 </BatchNo><Timestamp> 2025-03-01T08:00:00 </Timestamp><JobNo>10</JobNo>"
+            "<Bitumen><Target>120.00</Target></Bitumen><Bitumen><Actual>1,20.5</Actual><Actual>9</Actual></Bitumen>"
+            "<HotBin><Actual>5.50</Actual></HotBin><HotBin><Target>6</Target><Target>7</Target></HotBin></BatchLog>"
+        ))
+        self.assertEqual(batch_data['BatchNo'], '5')
+        self.assertEqual(batch_data['Time'], '2025-03-01T08:00:00')
+        self.assertEqual(batch_data['RecipeNo'], '')
+        self.assertEqual((batch_data['Bitumen_Actual'], batch_data['Bitumen_Target']), (Decimal('120.5'), Decimal('120.00')))
+        self.assertIsNone(batch_data['Filler_Actual'])
+        self.assertEqual((batch_data['HotBin1_Actual'], batch_data['HotBin1_Target']), (Decimal('5.50'), None))
+        self.assertEqual(batch_data['HotBin2_Target'], Decimal('6'))
+        self.assertNotIn('HotBin3_Actual', batch_data)
+
+
+class BatchWriterTestCase(TestCase):
+    def _batch(self, batch_no, time='2025-03-01T08:00:00', job_no='10', recipe_no='3'):
+        return ET.fromstring(
+            f"<BatchLog><BatchNo>{batch_no}</BatchNo><Time>{time}</Time><JobNo>{job_no}</JobNo>"
+            f"<RecipeNo>{recipe_no}</RecipeNo><Bitumen><Actual>12.5</Actual></Bitumen></BatchLog>"
+        )
+
+    def test_counts_inserted_duplicate_and_rejected(self):
+        from .tasks import BatchWriter
+        writer = BatchWriter('test.xml', chunk_size=2)
+        writer.add(self._batch(1))
+        writer.add(self._batch(2))
+        writer.add(self._batch(1))  # duplicate of an earlier chunk
+        writer.add(self._batch(3))
+        writer.add(self._batch(3))  # duplicate within the same chunk
+        writer.add(self._batch(4, job_no=''))  # missing required field
+        writer.add(self._batch(5, recipe_no='x'))  # not storable
+        writer.flush()
+
+        self.assertEqual((writer.inserted, writer.duplicates, writer.rejected), (3, 2, 2))
+        self.assertEqual(BatchLog.objects.count(), 3)
+
+    def test_matches_existing_rows(self):
+        from .tasks import BatchWriter, process_batch
+        self.assertTrue(process_batch(self._batch(1), 'old.xml'))
+
+        writer = BatchWriter('test.xml')
+        writer.add(self._batch(1))
+        writer.add(self._batch(2))
+        writer.flush()
+
+        self.assertEqual((writer.inserted, writer.duplicates), (1, 1))
+        self.assertEqual(BatchLog.objects.filter(BatchNo=1).count(), 1)
+
+    def test_replace_mode_updates_existing_rows(self):
+        from .tasks import BatchWriter, process_batch
+        self.assertTrue(process_batch(self._batch(1, recipe_no='3'), 'old.xml'))
+
+        writer = BatchWriter('test.xml', replace=True)
+        writer.add(self._batch(1, recipe_no='7'))
+        writer.add(self._batch(2))
+        writer.flush()
+
+        self.assertEqual((writer.inserted, writer.updated, writer.duplicates), (1, 1, 0))
+        self.assertEqual(BatchLog.objects.get(BatchNo=1).RecipeNo, 7)
+
+
+class ProductionRollupTestCase(TestCase):
+    def _batch(self, batch_no, time='2025-03-01T08:00:00', recipe='SMA', bitumen='12.5', temperature='160'):
+        return ET.fromstring(
+            f"<BatchLog><BatchNo>{batch_no}</BatchNo><Time>{time}</Time><JobNo>10</JobNo>"
+            f"<RecipeNo>3</RecipeNo><RecipeName>{recipe}</RecipeName><Bitumen><Actual>{bitumen}</Actual></Bitumen>"
+            f"<Temperature><Actual>{temperature}</Actual></Temperature></BatchLog>"
+        )
+
+    def _rollups(self):
+        return list(DailyProductionRollup.objects.order_by('date', 'RecipeName').values_list(
+            'date', 'RecipeName', 'batch_count', 'Bitumen_Actual', 'Temperature_Actual', 'Temperature_Actual_count'
+        ))
+
+    def test_ingest_updates_rollup_incrementally(self):
+        from .tasks import BatchWriter
+        writer = BatchWriter('test.xml', chunk_size=2)
+        writer.add(self._batch(1))
+        writer.add(self._batch(2, temperature=''))
+        writer.add(self._batch(3, recipe='HRA', bitumen='10'))
+        writer.add(self._batch(1))  # duplicate, not counted again
+        writer.add(self._batch(4, time='2025-03-02T23:30:00'))
+        writer.flush()
+
+        self.assertEqual(self._rollups(), [
+            (date(2025, 3, 1), 'HRA', 1, Decimal('10.00'), Decimal('160.00'), 1),
+            (date(2025, 3, 1), 'SMA', 2, Decimal('25.00'), Decimal('160.00'), 1),
+            (date(2025, 3, 2), 'SMA', 1, Decimal('12.50'), Decimal('160.00'), 1),
+        ])
+
+    def test_rebuild_matches_incremental_rollup(self):
+        from django.core.management import call_command
+        from .tasks import BatchWriter, process_batch
+        writer = BatchWriter('test.xml')
+        for n in range(5):
+            writer.add(self._batch(n, recipe='SMA' if n % 2 else 'HRA'))
+        writer.flush()
+        process_batch(self._batch(9, time='2025-03-03'), 'old.xml')
+        incremental = self._rollups()
+
+        DailyProductionRollup.objects.all().delete()
+        call_command('rebuild_production_rollup', stdout=StringIO())
+        self.assertEqual(self._rollups(), incremental)
+
+        DailyProductionRollup.objects.filter(date=date(2025, 3, 1)).delete()
+        call_command('rebuild_production_rollup', start='2025-03-01', end='2025-03-01', stdout=StringIO())
+        self.assertEqual(self._rollups(), incremental)
+
+    def test_batchlog_edits_and_deletes_update_rollup(self):
+        from django.contrib.auth.models import User
+        from django.forms.models import model_to_dict
+        from .tasks import process_batch
+        process_batch(self._batch(1), 'test.xml')
+        process_batch(self._batch(2), 'test.xml')
+        self.client.force_login(User.objects.create_user('manager', password='pw'))
+
+        data = {k: v for k, v in model_to_dict(BatchLog.objects.get(BatchNo=1)).items() if v is not None}
+        data.update(edit='1', batchlog_id=1, RecipeName='HRA', Time='2025-03-02 08:00:00')
+        self.assertEqual(self.client.post('/batchlogs/', data).status_code, 302)
+        self.assertEqual(self._rollups(), [
+            (date(2025, 3, 1), 'SMA', 1, Decimal('12.50'), Decimal('160.00'), 1),
+            (date(2025, 3, 2), 'HRA', 1, Decimal('12.50'), Decimal('160.00'), 1),
+        ])
+
+        self.client.post('/batchlogs/', {'delete': '1', 'batchlog_id': 2})
+        self.assertEqual(self._rollups(), [(date(2025, 3, 2), 'HRA', 1, Decimal('12.50'), Decimal('160.00'), 1)])
+
+    def test_rollup_changes_retire_cached_dashboards(self):
+        from django.core.management import call_command
+        from .tasks import process_batch
+        with mock.patch('data_processing.signals.invalidate_dashboard_metrics') as invalidate:
+            process_batch(self._batch(1), 'test.xml')
+            batch = BatchLog.objects.get()
+            batch.Time = timezone.datetime(2025, 3, 2, 8, tzinfo=batch.Time.tzinfo)
+            batch.save()
+            batch.delete()
+        self.assertEqual([set(call.args[0]) for call in invalidate.call_args_list], [
+            {date(2025, 3, 1)}, {date(2025, 3, 1), date(2025, 3, 2)}, {date(2025, 3, 2)},
+        ])
+
+        command = 'data_processing.management.commands.rebuild_production_rollup.invalidate_dashboard_metrics'
+        with mock.patch(command) as invalidate:
+            call_command('rebuild_production_rollup', start='2025-03-01', end='2025-03-02', stdout=StringIO())
+        invalidate.assert_called_once_with([date(2025, 3, 1), date(2025, 3, 2)])
+
+    def test_migration_backfills_existing_history(self):
+        from importlib import import_module
+        from django.apps import apps
+        from .tasks import parse_batch
+        migration = import_module('data_processing.migrations.0015_backfill_production_rollup')
+        # History stored before the rollup existed
+        BatchLog.objects.bulk_create([BatchLog(**parse_batch(self._batch(n, recipe=recipe))) for n, recipe in
+                                      enumerate(['SMA', 'SMA', 'HRA'])])
+
+        migration.backfill_production_rollup(apps, None)
+        self.assertEqual(self._rollups(), [
+            (date(2025, 3, 1), 'HRA', 1, Decimal('12.50'), Decimal('160.00'), 1),
+            (date(2025, 3, 1), 'SMA', 2, Decimal('25.00'), Decimal('320.00'), 2),
+        ])
+
+    def test_replace_mode_recomputes_days(self):
+        from .tasks import BatchWriter
+        writer = BatchWriter('test.xml')
+        writer.add(self._batch(1))
+        writer.flush()
+
+        writer = BatchWriter('test.xml', replace=True)
+        writer.add(self._batch(1, recipe='HRA', bitumen='11'))
+        writer.flush()
+        self.assertEqual(self._rollups(), [(date(2025, 3, 1), 'HRA', 1, Decimal('11.00'), Decimal('160.00'), 1)])
+
+    def test_concurrent_insert_is_not_counted_twice(self):
+        from .tasks import BatchWriter, process_batch
+        process_batch(self._batch(1), 'other.xml')
+        writer = BatchWriter('test.xml')
+        split_existing = writer._split_existing
+
+        def racing_split(rows):
+            # Another worker stored batch 1 after the lookup, before the insert
+            new_rows, existing_rows = split_existing(rows)
+            return existing_rows + new_rows, []
+
+        writer.add(self._batch(1))
+        writer.add(self._batch(2))
+        writer.add(self._batch(2))
+        with mock.patch.object(writer, '_split_existing', side_effect=racing_split):
+            writer.flush()
+
+        self.assertEqual((writer.inserted, writer.duplicates), (1, 2))
+        self.assertEqual(self._rollups(), [(date(2025, 3, 1), 'SMA', 2, Decimal('25.00'), Decimal('320.00'), 2)])
+
+
+class FakeFTPSession:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.closed = False
+
+    def voidcmd(self, cmd):
+        if not self.alive:
+            raise EOFError("connection closed")
+        return '200 NOOP ok'
+
+    def quit(self):
+        self.closed = True
+
+
+@override_settings(FTP_POOL_MAX_SIZE=1, FTP_POOL_IDLE_TIMEOUT=60)
+class FTPConnectionPoolTestCase(SimpleTestCase):
+    config = {'host': 'ftp.test', 'port': 21, 'user': 'user', 'remote_dir': '/archive'}
+
+    def setUp(self):
+        from .tasks import FTPConnectionPool
+        self.pool = FTPConnectionPool()
+        patcher = mock.patch.object(FTPConnectionPool, '_connect', side_effect=lambda config: FakeFTPSession())
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_released_session(self):
+        ftp = self.pool.acquire(self.config)
+        self.pool.release(self.config, ftp)
+        self.assertIs(self.pool.acquire(self.config), ftp)
+        self.assertEqual(self.connect.call_count, 1)
+
+    def test_replaces_dead_session(self):
+        ftp = self.pool.acquire(self.config)
+        self.pool.release(self.config, ftp)
+        ftp.alive = False
+        self.assertIsNot(self.pool.acquire(self.config), ftp)
+        self.assertTrue(ftp.closed)
+
+    def test_bounded_and_idle_eviction(self):
+        first, second = self.pool.acquire(self.config), self.pool.acquire(self.config)
+        self.pool.release(self.config, first)
+        self.pool.release(self.config, second)
+        self.assertTrue(second.closed)  # Pool only keeps one idle session
+
+        with mock.patch('data_processing.tasks.time.monotonic', return_value=time.monotonic() + 120):
+            self.assertIsNot(self.pool.acquire(self.config), first)
+        self.assertTrue(first.closed)
+
+
+class ListingFTP:
+    def __init__(self, entries, mlsd=True):
+        self.entries = entries
+        self.supports_mlsd = mlsd
+
+    def mlsd(self, path='', facts=()):
+        if not self.supports_mlsd:
+            raise error_perm('500 Unknown command')
+        for name, (size, modify) in self.entries.items():
+            yield name, {'type': 'file', 'size': str(size), 'modify': modify}
+
+    def retrlines(self, cmd, callback):
+        for name, (size, modify) in self.entries.items():
+            callback(f"03-01-25  10:00AM {size:>12} {name}")
+        callback("03-01-25  10:00AM       <DIR>          Old")
+
+
+class IncrementalDiscoveryTestCase(TestCase):
+    config = {'remote_dir': '/archive'}
+
+    def test_only_new_or_changed_files_are_pending(self):
+        from .tasks import discover_pending_files, record_remote_listing
+        ftp = ListingFTP({'a_010325.xml': (100, '20250301100000'), 'b_020325.xml': (200, '20250302100000')})
+
+        pending, meta = discover_pending_files(ftp, self.config)
+        self.assertEqual(pending, ['a_010325.xml', 'b_020325.xml'])
+        record_remote_listing('/archive', meta)
+
+        ftp.entries['b_020325.xml'] = (250, '20250303100000')
+        ftp.entries['c_040325.xml'] = (300, '20250304100000')
+        pending, meta = discover_pending_files(ftp, self.config)
+        self.assertEqual(pending, ['b_020325.xml', 'c_040325.xml'])
+        self.assertEqual(meta['b_020325.xml']['size'], 250)
+
+    def test_processed_files_seed_the_snapshot(self):
+        from .tasks import discover_pending_files
+        ProcessedFile.objects.create(file_name='a_010325.xml', file_type='XML', file_path='', status='success')
+        ftp = ListingFTP({'a_010325.xml': (100, '20250301100000')})
+
+        self.assertEqual(discover_pending_files(ftp, self.config)[0], [])
+        self.assertTrue(RemoteFileListing.objects.filter(file_name='a_010325.xml', size=100).exists())
+
+    def test_changed_processed_files_are_flagged_for_reingest(self):
+        from .tasks import discover_pending_files
+        ProcessedFile.objects.create(
+            file_name='a_010325.xml', file_type='XML', file_path='', status='success',
+            file_size=100, remote_modified=timezone.datetime(2025, 3, 1, 10, tzinfo=timezone.get_fixed_timezone(0))
+        )
+        ftp = ListingFTP({'a_010325.xml': (100, '20250301100000')})
+        self.assertEqual(discover_pending_files(ftp, self.config)[0], [])
+
+        ftp.entries['a_010325.xml'] = (120, '20250305100000')
+        pending, meta = discover_pending_files(ftp, self.config)
+        self.assertEqual(pending, ['a_010325.xml'])
+        self.assertTrue(meta['a_010325.xml']['reingest'])
+
+    def test_deleting_a_processed_file_forces_a_reingest(self):
+        from .tasks import discover_pending_files
+        processed = ProcessedFile.objects.create(file_name='a_010325.xml', file_type='XML', file_path='', status='success')
+        ftp = ListingFTP({'a_010325.xml': (100, '20250301100000')})
+        self.assertEqual(discover_pending_files(ftp, self.config)[0], [])
+
+        processed.delete()
+        self.assertEqual(discover_pending_files(ftp, self.config)[0], ['a_010325.xml'])
+
+    def test_list_fallback(self):
+        from .tasks import list_remote_files
+        listing = list_remote_files(ListingFTP({'a_010325.xml': (100, '')}, mlsd=False))
+        self.assertEqual(list(listing), ['a_010325.xml'])
+        self.assertEqual(listing['a_010325.xml']['size'], 100)
+        self.assertIsNotNone(listing['a_010325.xml']['modified'])
+
+
+class ContentDigestTestCase(TestCase):
+    config = {'host': 'ftp.test', 'remote_dir': '/archive'}
+    filename = 'Report_010325.xml'
+
+    class DownloadFTP:
+        def __init__(self, content):
+            self.content = content
+
+        def retrbinary(self, cmd, callback):
+            callback(self.content)
+
+    def _report(self, recipe_no):
+        return (
+            "<BatchLogs><BatchLog><BatchNo>1</BatchNo><Time>2025-03-01T08:00:00</Time>"
+            f"<JobNo>10</JobNo><RecipeNo>{recipe_no}</RecipeNo></BatchLog></BatchLogs>"
+        ).encode()
+
+    def _ingest(self, content, remote_meta):
+        from .tasks import ingest_xml_file
+        task = mock.Mock(request=mock.Mock(id='task-1'))
+        with mock.patch('data_processing.tasks.send_progress_update'):
+            return ingest_xml_file(
+                task, self.DownloadFTP(content), self.config, self.filename,
+                None, 'state', remote_meta=remote_meta
+            )
+
+    def test_unchanged_digest_skips_reingest(self):
+        self._ingest(self._report(3), {'size': 100, 'modified': None})
+        processed = ProcessedFile.objects.get(file_name=self.filename)
+        self.assertEqual(len(processed.content_digest), 64)
+
+        with mock.patch('data_processing.tasks.BatchWriter.add') as add:
+            self.assertEqual(self._ingest(self._report(3), {'size': 100, 'modified': None, 'reingest': True}), 0)
+        add.assert_not_called()
+        self.assertEqual(ProcessedFile.objects.count(), 1)
+
+    def test_changed_digest_reingests_in_place(self):
+        self._ingest(self._report(3), {'size': 100, 'modified': None})
+        self.assertEqual(self._ingest(self._report(7), {'size': 100, 'modified': None, 'reingest': True}), 1)
+
+        processed = ProcessedFile.objects.get(file_name=self.filename)
+        self.assertEqual((processed.batches_inserted, processed.batches_updated), (0, 1))
+        self.assertEqual(BatchLog.objects.get(BatchNo=1).RecipeNo, 7)
+
+    def test_failed_file_is_reingested_with_same_digest(self):
+        truncated = self._report(3).replace(b'</BatchLogs>', b'<BatchLog>')
+        self._ingest(truncated, {'size': 100, 'modified': None})
+        processed = ProcessedFile.objects.get(file_name=self.filename)
+        self.assertEqual((processed.status, processed.content_digest), ('error', ''))
+
+        # Error rows recorded with a digest do not skip the file either
+        ProcessedFile.objects.update(content_digest=hashlib.sha256(self._report(3)).hexdigest())
+        self.assertEqual(self._ingest(self._report(3), {'size': 100, 'modified': None, 'reingest': True}), 1)
+        self.assertEqual(ProcessedFile.objects.get(file_name=self.filename).status, 'success')
+
+
+class IngestPipelineTestCase(SimpleTestCase):
+    class ArchiveFTP:
+        def __init__(self, files):
+            self.files = files
+
+        def retrbinary(self, cmd, callback):
+            name = cmd.split(' ', 1)[1]
+            if name not in self.files:
+                raise error_perm('550 File not found')
+            callback(self.files[name])
+
+    def _report(self, batches):
+        return ("<BatchLogs>" + "".join(
+            f"<BatchLog><BatchNo>{n}</BatchNo><Time>2025-03-01T08:00:00</Time>"
+            f"<JobNo>10</JobNo><RecipeNo>3</RecipeNo></BatchLog>" for n in range(batches)
+        ) + "</BatchLogs>").encode()
+
+    @override_settings(BATCH_INSERT_CHUNK_SIZE=2, INGEST_PREFETCH_FILES=1, INGEST_PIPELINE_QUEUE_SIZE=1)
+    def test_threaded_stages_preserve_file_order(self):
+        from .tasks import IngestPipeline
+        files = {f'Report_0{n}0325.xml': self._report(n + 2) for n in range(1, 5)}
+        ftp = self.ArchiveFTP(dict(files, **{'Report_050325.xml': b'<BatchLogs><BatchLog>'}))
+
+        seen = []
+        with IngestPipeline(ftp, list(files) + ['Report_050325.xml', 'missing.xml'], threaded=True) as pipeline:
+            for filename, digest, records in pipeline:
+                kinds = [kind for kind, _ in records]
+                seen.append((filename, kinds.count('batch'), kinds[-1]))
+
+        self.assertEqual(seen, [
+            ('Report_010325.xml', 3, 'daily'),
+            ('Report_020325.xml', 4, 'daily'),
+            ('Report_030325.xml', 5, 'daily'),
+            ('Report_040325.xml', 6, 'daily'),
+            ('Report_050325.xml', 0, 'error'),
+            ('missing.xml', 0, 'error'),
+        ])
+
+    def test_unchanged_files_are_not_parsed(self):
+        from . import tasks
+        ftp = self.ArchiveFTP({'a.xml': self._report(2), 'b.xml': self._report(3)})
+        previous = {'a.xml': ProcessedFile(content_digest=hashlib.sha256(self._report(2)).hexdigest())}
+
+        with mock.patch.object(tasks, 'iter_xml_records', wraps=tasks.iter_xml_records) as parse:
+            with tasks.IngestPipeline(ftp, ['a.xml', 'b.xml'], previous=previous, threaded=True) as pipeline:
+                counts = {filename: len(list(records)) for filename, _, records in pipeline}
+
+        self.assertEqual(counts, {'a.xml': 0, 'b.xml': 4})
+        self.assertEqual(parse.call_count, 1)
+
+    @override_settings(INGEST_PREFETCH_FILES=1, INGEST_PIPELINE_JOIN_TIMEOUT=0.05)
+    def test_breaking_out_of_a_slow_download_drops_the_session(self):
+        from .tasks import FTPConnectionPool, IngestPipeline
+
+        class SlowFTP(self.ArchiveFTP):
+            closed = False
+
+            def __init__(self, files):
+                super().__init__(files)
+                self.transferring = threading.Event()
+                self.finish = threading.Event()
+
+            def retrbinary(self, cmd, callback):
+                if cmd.endswith('b.xml'):
+                    self.transferring.set()
+                    self.finish.wait(5)
+                super().retrbinary(cmd, callback)
+
+            def voidcmd(self, cmd):
+                if self.closed:
+                    raise ConnectionError('closed')
+
+            def quit(self):
+                self.closed = True
+
+        ftp = SlowFTP({'a.xml': self._report(2), 'b.xml': self._report(3)})
+        try:
+            with IngestPipeline(ftp, ['a.xml', 'b.xml'], threaded=True) as pipeline:
+                for filename, digest, records in pipeline:
+                    list(records)
+                    self.assertTrue(ftp.transferring.wait(5))
+                    break  # e.g. a pause arriving mid-transfer
+            self.assertTrue(ftp.closed)
+            self.assertFalse(FTPConnectionPool._is_alive(ftp))
+        finally:
+            ftp.finish.set()
+
+    def test_stopped_pipeline_keeps_an_idle_session(self):
+        from .tasks import IngestPipeline
+        ftp = self.ArchiveFTP({'a.xml': self._report(2), 'b.xml': self._report(3)})
+        ftp.quit = mock.Mock()
+        with IngestPipeline(ftp, ['a.xml', 'b.xml'], threaded=True) as pipeline:
+            for filename, digest, records in pipeline:
+                break
+        ftp.quit.assert_not_called()
+
+
+class StubFTPIngestTestCase(TestCase):
+    def test_generated_archive_ingests_over_stub_server(self):
+        from benchmarks.ftp_server import StubFTPServer
+        from benchmarks.xml_generator import generate_archive
+        from .models import DailyMaterials, OEEDailyData
+        from .tasks import ftp_pool, process_xml_files
+
+        archive = generate_archive(3, batches=20, hot_bins=2)
+        with StubFTPServer(archive) as server, mock.patch.dict('os.environ', {
+            'FTP_HOST': '127.0.0.1', 'FTP_PORT': str(server.port), 'REMOTE_DIR': '/archive',
+        }), mock.patch('data_processing.tasks.send_progress_update'):
+            try:
+                result = process_xml_files.apply(kwargs={'parallel': False}).result
+            finally:
+                ftp_pool.clear()
+
+        self.assertEqual((result['files_processed'], result['batches_processed']), (3, 60))
+        self.assertEqual(BatchLog.objects.count(), 60)
+        self.assertEqual(OEEDailyData.objects.count(), 3)
+        self.assertEqual(DailyMaterials.objects.count(), 18)
+        self.assertEqual(set(ProcessedFile.objects.values_list('status', flat=True)), {'success'})
+
+
+class ProgressReporterTestCase(SimpleTestCase):
+    def test_updates_within_interval_are_coalesced(self):
+        from .progress import ProgressReporter
+        now = [0.0]
+        sent = []
+        reporter = ProgressReporter(sent.append, max_rate=2, clock=lambda: now[0])
+
+        reporter.update({'progress': 0, 'description': 'Initializing connection'})
+        for progress in range(1, 100):
+            now[0] += 0.01
+            reporter.update(progress=progress, current_file=f'{progress}.xml')
+        self.assertEqual(len(sent), 2)  # The first update, then one when 0.5s had passed
+        self.assertEqual(sent[1], {'progress': 50, 'current_file': '50.xml'})
+
+        reporter.update({'status': 'completed', 'progress': 100}, final=True)
+        self.assertEqual(sent[-1], {'progress': 100, 'current_file': '99.xml', 'status': 'completed'})
+        self.assertFalse(reporter.flush())
+        self.assertEqual(reporter.published, 3)
+
+    def test_task_state_stored_with_each_publish(self):
+        from .progress import ProgressReporter
+        task = mock.Mock()
+        task.request.id = 'task-1'
+        with ProgressReporter(mock.Mock(), task=task, max_rate=1, clock=lambda: 0.0) as reporter:
+            reporter.update(progress=1)
+            reporter.update(progress=2)
+            self.assertEqual(task.update_state.call_count, 1)
+        task.update_state.assert_called_with(state='RUNNING', meta={'progress': 2})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LeaseLockTestCase(SimpleTestCase):
+    def test_only_the_owner_renews_or_releases(self):
+        from .locks import LeaseLock
+        first, second = LeaseLock('test-scope'), LeaseLock('test-scope')
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertFalse(second.renew())
+        self.assertFalse(second.release())
+        self.assertEqual(first.holder(), first.token)
+
+        # Another task can release the hold with its token
+        self.assertTrue(LeaseLock('test-scope', token=first.token).release())
+        self.assertTrue(second.acquire())
+        self.assertTrue(second.release())
+
+    def test_heartbeat_keeps_the_lease_past_its_ttl(self):
+        from .locks import LeaseLock
+        lock = LeaseLock('test-heartbeat', ttl=1)
+        self.assertTrue(lock.acquire())
+        lock.start_heartbeat(interval=0.2)
+        time.sleep(1.5)
+        self.assertFalse(LeaseLock('test-heartbeat').acquire())
+        self.assertTrue(lock.release())
+
+    def test_heartbeat_flags_a_lock_taken_over(self):
+        from django.core.cache import cache
+        from .locks import LeaseLock, LockLost
+        lock = LeaseLock('test-takeover', ttl=5)
+        self.assertTrue(lock.acquire())
+        cache.set(lock.key, 'other-holder', 5)
+        lock.start_heartbeat(interval=0.05)
+        self.assertTrue(lock.lost.wait(2))
+        with self.assertRaises(LockLost):
+            lock.check()
+        self.assertFalse(lock.release())
+        self.assertEqual(lock.holder(), 'other-holder')
+
+    def test_lock_scopes(self):
+        from .tasks import ingest_lock
+        config = {'host': 'ftp.test', 'remote_dir': '/archive/Galway'}
+        other = {'host': 'ftp.test', 'remote_dir': '/archive/Cork'}
+        self.assertEqual(ingest_lock(config).name, ingest_lock(dict(config)).name)
+        self.assertNotEqual(ingest_lock(config).name, ingest_lock(other).name)
+        with override_settings(INGEST_LOCK_SCOPE='schedule'):
+            self.assertEqual(ingest_lock(config, 3).name, ingest_lock(other, 3).name)
+            self.assertNotEqual(ingest_lock(config, 3).name, ingest_lock(config).name)
+        with override_settings(INGEST_LOCK_SCOPE='global'):
+            self.assertEqual(ingest_lock(config).name, 'parsing_lock')
+
+
+class ParsingTaskQueueTestCase(TestCase):
+    def test_claims_are_leased_and_expired_leases_taken_over(self):
+        from .ingest_queue import claim_files, complete_if_drained, create_parsing_task, finish_file
+        from .models import ParsingTask
+        job = create_parsing_task(['a.xml', 'b.xml', 'c.xml'], {'b.xml': {'size': 10}})
+
+        first = claim_files(job, 'worker-a', limit=2)
+        self.assertEqual([item.file_name for item in first], ['a.xml', 'b.xml'])
+        self.assertEqual(first[1].remote_meta, {'size': 10})
+        self.assertEqual([item.file_name for item in claim_files(job, 'worker-b', limit=5)], ['c.xml'])
+        self.assertEqual(claim_files(job, 'worker-b'), [])
+
+        self.assertTrue(finish_file(first[0], 5))
+        # worker-a stalls; once its lease runs out worker-b takes b.xml over
+        job.files.filter(file_name='b.xml').update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        taken = claim_files(job, 'worker-b')
+        self.assertEqual([(item.file_name, item.attempts) for item in taken], [('b.xml', 2)])
+        self.assertFalse(finish_file(first[1]))
+        self.assertFalse(complete_if_drained(job))
+
+        self.assertTrue(finish_file(taken[0], 2))
+        self.assertTrue(finish_file(job.files.get(file_name='c.xml')))
+        self.assertTrue(complete_if_drained(job))
+        job = ParsingTask.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.processed_files_count, job.batches_processed), ('completed', 3, 7))
+
+    @override_settings(INGEST_MAX_FILE_ATTEMPTS=2)
+    def test_file_given_up_after_repeated_expired_leases(self):
+        from .ingest_queue import claim_files, create_parsing_task
+        job = create_parsing_task(['a.xml'])
+        for _ in range(2):
+            self.assertEqual(len(claim_files(job, 'worker')), 1)
+            job.files.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_files(job, 'worker'), [])
+        self.assertEqual(job.files.get().status, 'failed')
+
+    def test_interrupted_job_resumes_at_first_unfinished_file(self):
+        from benchmarks.ftp_server import StubFTPServer
+        from benchmarks.xml_generator import generate_archive
+        from .ingest_queue import create_parsing_task
+        from .models import ParsingTask
+        from .tasks import download_xml_file, ftp_pool, monitor_stalled_tasks
+
+        archive = generate_archive(3, batches=20, hot_bins=2)
+        names = sorted(archive)
+        job = create_parsing_task(names)
+        # A worker finished the first file, then died holding a lease on the second
+        job.files.filter(file_name=names[0]).update(status='done', finished_at=timezone.now())
+        job.files.filter(file_name=names[1]).update(
+            status='claimed', lease_owner='dead-worker', attempts=1,
+            lease_expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        ParsingTask.objects.filter(pk=job.pk).update(
+            processed_files_count=1, last_updated=timezone.now() - timedelta(hours=1)
+        )
+
+        with StubFTPServer(archive) as server, mock.patch.dict('os.environ', {
+            'FTP_HOST': '127.0.0.1', 'FTP_PORT': str(server.port), 'REMOTE_DIR': '/archive',
+        }), mock.patch('data_processing.tasks.send_progress_update'), \
+                mock.patch('data_processing.tasks.download_xml_file', wraps=download_xml_file) as download:
+            try:
+                monitor_stalled_tasks()
+            finally:
+                ftp_pool.clear()
+
+        self.assertEqual(sorted(call.args[1] for call in download.call_args_list), names[1:])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_files_count, job.batches_processed), ('completed', 3, 40))
+        self.assertEqual(BatchLog.objects.count(), 40)
+        self.assertEqual(set(ProcessedFile.objects.values_list('task_id', flat=True)), {job.pk})
+
+    def test_check_interrupted_reports_next_file(self):
+        from .ingest_queue import create_parsing_task
+        from .models import ParsingTask
+        job = create_parsing_task(['a.xml', 'b.xml'])
+        job.files.filter(file_name='a.xml').update(status='done')
+        ParsingTask.objects.filter(pk=job.pk).update(
+            status='interrupted', processed_files_count=1, current_file='a.xml'
+        )
+        data = self.client.get('/api/check-interrupted/').json()
+        self.assertEqual(data, {
+            'found': True, 'task_id': str(job.pk), 'last_file': 'a.xml', 'next_file': 'b.xml', 'progress': 50
+        })
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    PARALLEL_INGEST_CHUNK_SIZE=2,
+)
+class ParallelIngestTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def _run(self, archive):
+        """Fan the archive out over an eager chord; returns the terminal progress message"""
+        from benchmarks.ftp_server import StubFTPServer
+        from .tasks import ftp_pool, process_xml_files
+        conf = process_xml_files.app.conf
+        was_eager, conf.task_always_eager = conf.task_always_eager, True
+        with StubFTPServer(archive) as server, mock.patch.dict('os.environ', {
+            'FTP_HOST': '127.0.0.1', 'FTP_PORT': str(server.port), 'REMOTE_DIR': '/archive',
+        }), mock.patch('data_processing.tasks.send_progress_update') as send_update:
+            try:
+                result = process_xml_files.apply(kwargs={'parallel': True}).result
+                self.assertEqual(result.get('status'), 'dispatched', result)
+            finally:
+                conf.task_always_eager = was_eager
+                ftp_pool.clear()
+        # Eagerly, the chord callback reports before the dispatch message is sent
+        return [call.args[1] for call in send_update.call_args_list if 'status' in call.args[1]][-1]
+
+    def _lock_is_free(self):
+        from .tasks import get_ftp_config, ingest_lock
+        with mock.patch.dict('os.environ', {'FTP_HOST': '127.0.0.1', 'REMOTE_DIR': '/archive'}):
+            lock = ingest_lock(get_ftp_config(None))
+        return lock.acquire()
+
+    def test_chunks_are_aggregated_by_the_chord_callback(self):
+        from benchmarks.xml_generator import generate_archive
+        from .models import ParsingTask
+        update = self._run(generate_archive(3, batches=20, hot_bins=2))
+
+        self.assertEqual(update['status'], 'completed')
+        self.assertEqual((update['files_processed'], update['batches_processed']), (3, 60))
+        self.assertEqual(ParsingTask.objects.get().status, 'completed')
+        self.assertEqual(BatchLog.objects.count(), 60)
+        self.assertTrue(self._lock_is_free())
+
+    def test_stopped_chunk_interrupts_the_job_and_releases_the_lock(self):
+        from benchmarks.xml_generator import generate_archive
+        from .locks import LockLost
+        from .models import ParsingTask
+        from .tasks import ingest_xml_file
+        archive = generate_archive(3, batches=20, hot_bins=2)
+        last = sorted(archive)[-1]
+
+        def ingest(task, ftp, ftp_config, filename, *args, **kwargs):
+            if filename == last:
+                raise LockLost("lease expired")
+            return ingest_xml_file(task, ftp, ftp_config, filename, *args, **kwargs)
+
+        with mock.patch('data_processing.tasks.ingest_xml_file', side_effect=ingest):
+            update = self._run(archive)
+
+        self.assertEqual(update['status'], 'interrupted')
+        self.assertEqual(update['files_processed'], 2)
+        self.assertIn('lease expired', update['message'])
+        job = ParsingTask.objects.get()
+        self.assertEqual(job.status, 'interrupted')
+        self.assertEqual(list(job.files.filter(status='pending').values_list('file_name', flat=True)), [last])
+        self.assertTrue(self._lock_is_free())
+
+    def test_failed_chord_is_reported_by_the_error_callback(self):
+        from .ingest_queue import create_parsing_task
+        from .locks import LeaseLock
+        from .models import ParsingTask
+        from .tasks import fail_xml_ingest
+        job = create_parsing_task(['a.xml'])
+        ParsingTask.objects.filter(pk=job.pk).update(status='processing')
+        lock = LeaseLock('ingest:test')
+        self.assertTrue(lock.acquire())
+
+        with mock.patch('data_processing.tasks.send_progress_update') as send_update:
+            fail_xml_ingest(None, RuntimeError('worker lost'), None, parent_task_id='parent',
+                            parsing_task_id=str(job.pk), lock_name=lock.name, lock_token=lock.token)
+
+        self.assertEqual(send_update.call_args.args[1]['status'], 'failed')
+        self.assertEqual(ParsingTask.objects.get(pk=job.pk).status, 'interrupted')
+        self.assertTrue(LeaseLock('ingest:test').acquire())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    INGEST_CONTROL_POLL_SECONDS=0.01,
+    PARALLEL_INGEST=False,
+)
+class ParsingControlTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_pause_frees_worker_and_resume_finishes_remaining_files(self):
+        from benchmarks.ftp_server import StubFTPServer
+        from benchmarks.xml_generator import generate_archive
+        from .control import publish_command
+        from .ingest_queue import finish_file
+        from .models import ParsingTask
+        from .tasks import download_xml_file, ftp_pool, process_xml_files, resume_parsing
+
+        archive = generate_archive(3, batches=20, hot_bins=2)
+        names = sorted(archive)
+
+        def pause_after_file(item, batches_processed=0):
+            finished = finish_file(item, batches_processed)
+            publish_command(item.task_id, 'pause')
+            time.sleep(0.2)  # Long enough for the listener to pick it up
+            return finished
+
+        with StubFTPServer(archive) as server, mock.patch.dict('os.environ', {
+            'FTP_HOST': '127.0.0.1', 'FTP_PORT': str(server.port), 'REMOTE_DIR': '/archive',
+        }), mock.patch('data_processing.tasks.send_progress_update'), \
+                mock.patch('data_processing.tasks.finish_file', side_effect=pause_after_file) as finish, \
+                mock.patch('data_processing.tasks.download_xml_file', wraps=download_xml_file) as download:
+            try:
+                paused = process_xml_files.apply(kwargs={'parallel': False}).result
+                job = ParsingTask.objects.get()
+                self.assertEqual((paused['status'], paused['files_processed']), ('paused', 1))
+                self.assertEqual(job.status, 'paused')
+                # Nothing stays leased to the stopped worker
+                self.assertEqual(
+                    list(job.files.order_by('position').values_list('status', flat=True)),
+                    ['done', 'pending', 'pending']
+                )
+
+                finish.side_effect = finish_file
+                download.reset_mock()
+                resume_parsing.apply()
+            finally:
+                ftp_pool.clear()
+
+        self.assertEqual(sorted(call.args[1] for call in download.call_args_list), names[1:])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_files_count, job.batches_processed), ('completed', 3, 60))
+        self.assertEqual(BatchLog.objects.count(), 60)
+
+    def test_commands_for_jobs_not_running(self):
+        from django.contrib.auth.models import User
+        from .control import publish_command
+        from .ingest_queue import create_parsing_task
+        from .models import ParsingTask
+        from .tasks import process_xml_files, resume_parsing_task
+
+        job = create_parsing_task(['a.xml', 'b.xml'])
+        # A pause sent while the job waits in the queue stops it before any file is claimed
+        publish_command(job.pk, 'pause')
+        with mock.patch('data_processing.tasks.FTPConnectionManager'), \
+                mock.patch('data_processing.tasks.send_progress_update'):
+            result = process_xml_files.apply(kwargs={'parsing_task_id': str(job.pk)}).result
+        self.assertEqual(result['status'], 'paused')
+        self.assertEqual(set(job.files.values_list('status', flat=True)), {'pending'})
+
+        self.client.force_login(User.objects.create_user('manager', password='pw'))
+        response = self.client.post(f'/api/parsing-tasks/{job.pk}/cancel/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ParsingTask.objects.get(pk=job.pk).status, 'cancelled')
+        self.assertIsNone(resume_parsing_task(str(job.pk)))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardMetricsTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import DailyMaterials, EnergyData, OEEDailyData
+        cache.clear()
+        today = timezone.now().date()
+        self.today = today
+        OEEDailyData.objects.create(date=today, TotalProduction=100, TotalEmptyOut=5)
+        OEEDailyData.objects.create(date=today - timedelta(days=20), TotalProduction=50, TotalEmptyOut=0)
+        EnergyData.objects.create(date=today, meter_name='Main', consumption=12.5)
+        DailyMaterials.objects.create(date=today, MaterialNo=3, MaterialName='Reclaim Asphalt', Quantity=30)
+        DailyMaterials.objects.create(date=today, MaterialNo=4, MaterialName='20mm', Quantity=40)
+
+    def test_metrics_are_computed_once_and_cached(self):
+        from .metrics import get_dashboard_metrics
+        with self.assertNumQueries(3):
+            metrics = get_dashboard_metrics(30, 'Manager')
+        self.assertEqual(metrics['total_production'], '155.00 t')
+        self.assertEqual(metrics['rap_consumption'], '30.00 t')
+        self.assertEqual(metrics['electricity_consumption'], '12.50 kWh')
+        self.assertEqual(len(json.loads(metrics['material_data'])), 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_metrics(30, 'Manager'), metrics)
+        self.assertEqual(get_dashboard_metrics(7, 'Operator')['total_production'], '105.00 t')
+
+    def test_invalidation_targets_windows_covering_the_dates(self):
+        from .metrics import get_dashboard_metrics, invalidate_dashboard_metrics
+        from .models import OEEDailyData
+        get_dashboard_metrics(7, 'Manager')
+        get_dashboard_metrics(0, 'Manager')
+
+        OEEDailyData.objects.create(date=self.today - timedelta(days=60), TotalProduction=10, TotalEmptyOut=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_dashboard_metrics([self.today - timedelta(days=60)])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_metrics(7, 'Manager')['total_production'], '105.00 t')
+        self.assertEqual(get_dashboard_metrics(0, 'Manager')['total_production'], '165.00 t')
+
+    def test_invalidation_retires_every_entry_of_covering_windows(self):
+        from .metrics import get_dashboard_metrics, invalidate_dashboard_metrics
+        from .models import OEEDailyData
+        # Entries cached independently, e.g. by concurrent requests
+        for time_range, role in [(7, 'Manager'), (7, 'Operator'), (5, 'Manager'), (30, 'Operator')]:
+            get_dashboard_metrics(time_range, role)
+
+        OEEDailyData.objects.create(date=self.today - timedelta(days=1), TotalProduction=10, TotalEmptyOut=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_dashboard_metrics([self.today - timedelta(days=1)])
+
+        for time_range, role in [(7, 'Manager'), (7, 'Operator'), (5, 'Manager')]:
+            self.assertEqual(get_dashboard_metrics(time_range, role)['total_production'], '115.00 t')
+        self.assertEqual(get_dashboard_metrics(30, 'Operator')['total_production'], '165.00 t')
+
+    def test_role_homes_share_the_service(self):
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('manager', password='pw')
+        user.profile.role = 'Manager'
+        user.profile.save()
+        self.client.force_login(user)
+
+        response = self.client.get('/manager/?time_range=7')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_production'], '105.00 t')
+        self.assertEqual(response.context['time_range'], 7)
+        self.assertEqual(self.client.get('/operator/').status_code, 302)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class OEEDashboardAPITestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from .models import DailyMaterials, EnergyData, OEEDailyData, PlantRunTime
+        cache.clear()
+        today = timezone.now().date()
+        OEEDailyData.objects.create(date=today, TotalProduction=100, TotalEmptyOut=5)
+        PlantRunTime.objects.create(date=today, Mixer=7200, Dryer=3600)
+        DailyMaterials.objects.create(date=today, MaterialNo=3, MaterialName='Reclaim Asphalt', Quantity=30)
+        EnergyData.objects.create(date=today, meter_name='Main', consumption=12.5)
+        EnergyData.objects.create(date=today - timedelta(days=90), meter_name='Main', consumption=100)
+        DailyProductionRollup.objects.create(
+            date=today, RecipeName='SMA', batch_count=2, Reclaim_Actual=Decimal('2000'), Bitumen_Actual=Decimal('1000')
+        )
+        self.client.force_login(User.objects.create_user('viewer', password='pw'))
+
+    def test_response_in_a_single_aggregate_query(self):
+        from .metrics import compute_oee_metrics
+        with self.assertNumQueries(1):
+            data = compute_oee_metrics(30)
+        self.assertEqual((data['total_production'], data['total_emptyout'], data['total_consumption']), (100, 5, 12.5))
+        self.assertEqual(data['runtime_data']['Mixer'], 7200)
+        self.assertEqual(data['runtime_data']['Screen'], 0)
+        self.assertEqual(data['drying_efficiency'], {
+            'avg_drying_rate': 13.5, 'total_materials': 30.0, 'total_rap': 2.0,
+            'total_bitumen': 1.0, 'total_mixer_hours': 2.0,
+        })
+        self.assertIn('computed_in_ms', data)
+        self.assertEqual(compute_oee_metrics(0)['total_consumption'], 112.5)
+
+    def test_conditional_requests_get_304_until_data_changes(self):
+        from .metrics import invalidate_dashboard_metrics
+        response = self.client.get('/api/oee/?days=7')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get('/api/oee/?days=7', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/oee/?days=30', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with mock.patch('data_processing.metrics.timezone.now', return_value=timezone.now() + timedelta(seconds=5)):
+            with self.captureOnCommitCallbacks(execute=True):
+                invalidate_dashboard_metrics([timezone.now().date()])
+        self.assertEqual(self.client.get('/api/oee/?days=7', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@skipUnless(importlib.util.find_spec('daphne'), 'daphne is not installed')
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class LiveDashboardTestCase(TransactionTestCase):
+    # Consumers close stale connections between messages, so no wrapping transaction
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import OEEDailyData
+        cache.clear()
+        self.today = timezone.now().date()
+        OEEDailyData.objects.create(date=self.today, TotalProduction=100, TotalEmptyOut=5)
+        OEEDailyData.objects.create(date=self.today - timedelta(days=20), TotalProduction=50, TotalEmptyOut=0)
+
+    async def _subscribe(self, **topic):
+        from asgiref.sync import sync_to_async
+        from channels.testing import WebsocketCommunicator
+        from django.contrib.auth.models import User
+        from .consumers import DashboardConsumer
+        communicator = WebsocketCommunicator(DashboardConsumer.as_asgi(), '/ws/dashboard/')
+        communicator.scope['user'] = await sync_to_async(User.objects.create_user)(
+            f"screen-{topic['view']}", password='pw'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to(dict(topic, action='subscribe'))
+        return communicator, await communicator.receive_json_from()
+
+    async def test_commits_are_pushed_once_to_affected_topics(self):
+        from asgiref.sync import sync_to_async
+        from .live_dashboard import broadcast_dashboard_updates
+        from .metrics import invalidate_dashboard_metrics
+
+        week, reply = await self._subscribe(view='home', time_range=7)
+        self.assertEqual(reply, {'type': 'subscribed', 'topic': 'dashboard.home.7.all'})
+        oee, _ = await self._subscribe(view='oee', time_range=7)
+
+        def commit_ingests():
+            # Two commits in one debounce window schedule one push
+            with mock.patch('data_processing.tasks.push_dashboard_updates.apply_async') as schedule:
+                for day in (self.today, self.today - timedelta(days=1)):
+                    invalidate_dashboard_metrics([day])
+            return schedule.call_count
+
+        self.assertEqual(await sync_to_async(commit_ingests)(), 1)
+        self.assertEqual(await sync_to_async(broadcast_dashboard_updates)(), 2)
+
+        update = await week.receive_json_from()
+        self.assertEqual(update['type'], 'dashboard.update')
+        self.assertEqual(update['changed_dates'], [
+            (self.today - timedelta(days=1)).isoformat(), self.today.isoformat()
+        ])
+        self.assertEqual(update['daily_totals'], {self.today.isoformat(): 105.0})
+        self.assertEqual(update['widgets']['total_production'], '105.00 t')
+        self.assertEqual((await oee.receive_json_from())['widgets']['total_production'], 100.0)
+
+        # A change older than every subscribed window pushes nothing
+        def commit_old_day():
+            with mock.patch('data_processing.tasks.push_dashboard_updates.apply_async'):
+                invalidate_dashboard_metrics([self.today - timedelta(days=20)])
+            return broadcast_dashboard_updates()
+
+        self.assertEqual(await sync_to_async(commit_old_day)(), 0)
+        self.assertTrue(await week.receive_nothing())
+        await week.disconnect()
+        await oee.disconnect()
+
+    async def test_invalid_topics_are_rejected(self):
+        communicator, reply = await self._subscribe(view='settings', time_range=7)
+        self.assertEqual(reply, {'type': 'error', 'message': 'Unknown dashboard view: settings'})
+        await communicator.disconnect()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        base = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        # Pairs of rows share a timestamp so the id tie-breaker matters
+        BatchLog.objects.bulk_create([
+            BatchLog(BatchNo=n, JobNo=1, RecipeNo=n % 3, RecipeName=None if n % 5 == 0 else f'R{n % 3}',
+                     Time=base + timedelta(minutes=n // 2))
+            for n in range(23)
+        ])
+        self.client.force_login(User.objects.create_user('viewer', password='pw'))
+
+    def _walk(self, column, direction, **extra):
+        """Page through raw_data_ajax following next_cursor; return BatchNos in order"""
+        seen, cursor, start = [], None, 0
+        while True:
+            params = {
+                'draw': 1, 'start': start, 'length': 5, 'pagination': 'keyset',
+                'order[0][column]': 0, 'order[0][dir]': direction, 'columns[0][data]': column, **extra,
+            }
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/raw_data_ajax/', params).json()
+            seen.extend(row['BatchNo'] for row in data['data'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return seen, data
+            start += 5
+
+    def test_cursor_walk_matches_offset_order(self):
+        for column, field in (('Time', 'Time'), ('RecipeName', 'RecipeName'), ('BatchNo', 'BatchNo')):
+            for direction in ('asc', 'desc'):
+                seen, data = self._walk(column, direction)
+                self.assertEqual(len(seen), 23)
+                self.assertEqual(len(set(seen)), 23, (column, direction))
+                if field != 'RecipeName':
+                    ordered = BatchLog.objects.order_by(('-' if direction == 'desc' else '') + field, '-id' if direction == 'desc' else 'id')
+                    self.assertEqual(seen, list(ordered.values_list('BatchNo', flat=True)))
+                self.assertEqual((data['recordsTotal'], data['recordsFiltered']), (23, 23))
+
+    def test_cursor_page_skips_offset_and_filtered_count_is_cached(self):
+        seen, _ = self._walk('Time', 'desc', recipe='R1')
+        self.assertEqual(sorted(seen), sorted(BatchLog.objects.filter(RecipeName='R1').values_list('BatchNo', flat=True)))
+
+        first = self.client.get('/raw_data_ajax/', {'length': 5, 'pagination': 'keyset', 'recipe': 'R1'}).json()
+        with self.assertNumQueries(3):  # session, user, page
+            page = self.client.get('/raw_data_ajax/', {
+                'start': 5, 'length': 5, 'pagination': 'keyset', 'recipe': 'R1', 'cursor': first['next_cursor'],
+            }).json()
+        self.assertEqual(page['recordsFiltered'], len(seen))
+
+    def test_invalid_cursor_falls_back_to_offset(self):
+        data = self.client.get('/raw_data_ajax/', {
+            'start': 20, 'length': 5, 'pagination': 'keyset', 'cursor': 'not-a-cursor',
+        }).json()
+        self.assertEqual(len(data['data']), 3)
+        self.assertIsNone(data['next_cursor'])
+
+
+class StreamingCSVExportTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.when = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        BatchLog.objects.create(BatchNo=1, JobNo=7, RecipeNo=2, RecipeName='SMA', Time=self.when,
+                                Bitumen_Actual=Decimal('55.50'), HotBin8_Target=Decimal('1.25'))
+        BatchLog.objects.create(BatchNo=2, JobNo=7, RecipeNo=3, RecipeName='AC', Time=self.when + timedelta(minutes=1))
+        self.client.force_login(User.objects.create_user('viewer', password='pw'))
+
+    def _rows(self, content):
+        import csv
+        return list(csv.reader(StringIO(content)))
+
+    def test_streams_csv_without_building_models(self):
+        with mock.patch.object(BatchLog, '__init__', side_effect=AssertionError('model instantiated')):
+            response = self.client.get('/raw_data_ajax/', {'export_csv': 'true', 'recipe': 'SMA'})
+            self.assertTrue(response.streaming)
+            rows = self._rows(b''.join(response.streaming_content).decode())
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('BatchLog_ALL-DATES.csv', response['Content-Disposition'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(rows[0]), 31)
+        self.assertEqual(rows[1][:8], [
+            str(BatchLog.objects.get(BatchNo=1).id), self.when.strftime('%Y-%m-%d'),
+            self.when.strftime('%H:%M:%S'), '1', '7', '2', 'SMA', '55.50',
+        ])
+        self.assertEqual(rows[1][-1], '1.25')
+        self.assertEqual(rows[1][-2], '')
+
+    def test_gzip_output_and_small_buffers(self):
+        import gzip
+        from .exports import iter_batchlog_csv
+        response = self.client.get('/raw_data_ajax/', {'export_csv': 'true', 'gzip': '1', 'date_start': '2000-01-01'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('BatchLog_01JAN2000-CURRENT.csv.gz', response['Content-Disposition'])
+        rows = self._rows(gzip.decompress(b''.join(response.streaming_content)).decode())
+        self.assertEqual([row[3] for row in rows[1:]], ['1', '2'])
+
+        chunks = list(iter_batchlog_csv(BatchLog.objects.all(), chunk_size=1, buffer_bytes=1))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(self._rows(''.join(chunks))[1:], rows[1:])
+
+
+@skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    EXPORT_ROW_GROUP_SIZE=2,
+)
+class ColumnarExportJobTestCase(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.contrib.auth.models import User
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.when = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        for n in range(5):
+            BatchLog.objects.create(BatchNo=n, JobNo=1, RecipeNo=1, RecipeName='SMA' if n % 2 else 'AC',
+                                    Time=self.when + timedelta(minutes=n), Bitumen_Actual=Decimal(f'{n}.25'))
+        self.user = User.objects.create_user('analyst', password='pw')
+        self.client.force_login(self.user)
+
+    def _run(self, **fields):
+        from .models import ExportJob
+        from .tasks import run_export_job
+        job = ExportJob.objects.create(created_by=self.user, **fields)
+        with mock.patch('data_processing.tasks.send_export_update') as send_update:
+            run_export_job.apply(args=[str(job.id)])
+        job.refresh_from_db()
+        return job, send_update
+
+    def test_parquet_export_in_row_groups(self):
+        import pyarrow.parquet as pq
+        from django.conf import settings
+        job, send_update = self._run(dataset='batchlog', file_format='parquet', filters={'recipe': 'SMA'})
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual((job.rows_total, job.rows_written, job.progress), (2, 2, 100))
+        # running, one full row group, completed
+        self.assertEqual(send_update.call_count, 3)
+
+        parquet = pq.ParquetFile(f'{settings.MEDIA_ROOT}/{job.file_path}')
+        self.assertEqual(parquet.metadata.num_row_groups, 1)
+        table = parquet.read()
+        self.assertEqual(table.column('BatchNo').to_pylist(), [1, 3])
+        self.assertEqual(table.column('Bitumen_Actual').to_pylist(), [Decimal('1.25'), Decimal('3.25')])
+        self.assertEqual(str(table.schema.field('Time').type), 'timestamp[us, tz=UTC]')
+
+    def test_arrow_export_of_daily_table_and_download(self):
+        import pyarrow as pa
+        from .models import DailyMaterials
+        DailyMaterials.objects.bulk_create([
+            DailyMaterials(date=date(2025, 1, day), MaterialNo=1, MaterialName='Sand', Quantity=day * 1.5)
+            for day in range(1, 6)
+        ])
+        job, _ = self._run(dataset='daily_materials', file_format='arrow',
+                           filters={'date_start': '2025-01-02', 'date_end': '2025-01-04'})
+        self.assertEqual(job.status, 'completed')
+
+        response = self.client.get(f'/api/exports/{job.id}/')
+        self.assertEqual(response.json()['download_url'], f'/api/exports/{job.id}/download/')
+        download = self.client.get(response.json()['download_url'])
+        self.assertIn('daily_materials_02JAN2025-04JAN2025.arrow', download['Content-Disposition'])
+        table = pa.ipc.open_file(pa.BufferReader(b''.join(download.streaming_content))).read_all()
+        self.assertEqual(table.column('Quantity').to_pylist(), [3.0, 4.5, 6.0])
+
+    def test_download_of_removed_file_fails_the_job(self):
+        import os
+        from django.conf import settings
+        job, _ = self._run(dataset='energy_data', file_format='arrow')
+        os.remove(os.path.join(settings.MEDIA_ROOT, job.file_path))
+
+        response = self.client.get(f'/api/exports/{job.id}/download/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(self.client.get(f'/api/exports/{job.id}/').json()['status'], 'failed')
+
+    def test_create_endpoint_queues_job_for_owner_only(self):
+        from django.contrib.auth.models import User
+        from .models import ExportJob
+        with mock.patch('data_processing.views.run_export_job.delay', return_value=mock.Mock(id='celery-1')) as delay:
+            response = self.client.post('/api/exports/', {'dataset': 'energy_data', 'file_format': 'arrow'})
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get()
+        delay.assert_called_once_with(str(job.id))
+        self.assertEqual((job.celery_task_id, response.json()['status']), ('celery-1', 'pending'))
+        self.assertEqual(self.client.get(f'/api/exports/{job.id}/download/').status_code, 404)
+        self.assertEqual(self.client.post('/api/exports/', {'dataset': 'users'}).status_code, 400)
+
+        self.client.force_login(User.objects.create_user('other', password='pw'))
+        self.assertEqual(self.client.get(f'/api/exports/{job.id}/').status_code, 404)
+
+
+class BatchLogPartitioningTestCase(TestCase):
+    def test_time_range_q_matches_local_dates(self):
+        from .partitioning import add_months, time_range_q
+        self.assertEqual(add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+
+        midnight = timezone.make_aware(datetime(2025, 6, 1))
+        for minutes, batch_no in ((-1, 1), (0, 2), (24 * 60 - 1, 3), (24 * 60, 4)):
+            BatchLog.objects.create(BatchNo=batch_no, JobNo=1, RecipeNo=1, Time=midnight + timedelta(minutes=minutes))
+        in_range = BatchLog.objects.filter(time_range_q('2025-06-01', '2025-06-01'))
+        self.assertEqual(sorted(in_range.values_list('BatchNo', flat=True)), [2, 3])
+        self.assertEqual(
+            set(in_range.values_list('BatchNo', flat=True)),
+            set(BatchLog.objects.filter(Time__date='2025-06-01').values_list('BatchNo', flat=True))
+        )
+        self.assertEqual(BatchLog.objects.filter(time_range_q(date_end=date(2025, 5, 31))).get().BatchNo, 1)
+        with self.assertRaises(ValueError):
+            time_range_q('June')
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL only')
+    def test_new_partition_takes_rows_from_default(self):
+        from .partitioning import _partitions, is_partitioned
+        from .tasks import create_batchlog_partitions
+        self.assertTrue(is_partitioned())
+        far = timezone.now() + timedelta(days=3 * 366)
+        BatchLog.objects.create(BatchNo=1, JobNo=1, RecipeNo=1, Time=far)
+
+        result = create_batchlog_partitions(months_ahead=40)
+        with connection.cursor() as cursor:
+            self.assertIn(f'BatchLogs_y{far:%Y}m{timezone.localtime(far):%m}', _partitions(cursor, 'BatchLogs'))
+            cursor.execute('SELECT count(*) FROM "BatchLogs_default"')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertTrue(result['created'])
+        self.assertEqual(BatchLog.objects.get().Time, far)
+        self.assertEqual(create_batchlog_partitions(months_ahead=40)['created'], [])
+
+
+class CentiDecimalFieldTestCase(TestCase):
+    def test_hotbins_are_plain_decimals_by_default(self):
+        from django.db.models import Avg, Sum
+        BatchLog.objects.create(BatchNo=1, JobNo=1, RecipeNo=1, Time=timezone.now(), HotBin1_Actual=Decimal('12.34'))
+        BatchLog.objects.create(BatchNo=2, JobNo=1, RecipeNo=1, Time=timezone.now(), HotBin1_Actual=Decimal('0.66'))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT "HotBin1_Actual" FROM "BatchLogs" ORDER BY "BatchNo"')
+            self.assertEqual([Decimal(str(value)) for value, in cursor.fetchall()], [Decimal('12.34'), Decimal('0.66')])
+
+        self.assertEqual(
+            BatchLog.objects.aggregate(total=Sum('HotBin1_Actual'), mean=Avg('HotBin1_Actual')),
+            {'total': Decimal('13.00'), 'mean': Decimal('6.50')}
+        )
+
+    def test_form_keeps_decimal_validation(self):
+        from .forms import BatchLogForm
+        data = {'BatchNo': 1, 'JobNo': 1, 'RecipeNo': 1, 'Time': '2025-01-01 10:00:00', 'HotBin4_Target': '100000000.00'}
+        form = BatchLogForm(data)
+        self.assertIn('HotBin4_Target', form.errors)
+        form = BatchLogForm({**data, 'HotBin4_Target': '99999999.99'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().HotBin4_Target, Decimal('99999999.99'))
+
+
+class CompactDecimalColumnsTestCase(TransactionTestCase):
+    def _convert(self, compact):
+        from django.core.management import call_command
+        with override_settings(COMPACT_DECIMAL_COLUMNS=compact):
+            call_command('convert_compact_columns', stdout=StringIO())
+
+    def _hotbin_columns(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT "HotBin1_Actual", "HotBin1_Target", "HotBin2_Actual", "HotBin3_Actual" '
+                           'FROM "BatchLogs" ORDER BY "BatchNo"')
+            return cursor.fetchall()
+
+    def test_hotbins_stored_as_hundredths(self):
+        from django.db.models import Max, Sum
+        from .forms import BatchLogForm
+        BatchLog.objects.create(BatchNo=1, JobNo=1, RecipeNo=1, Time=timezone.now(), HotBin1_Actual=Decimal('0.66'))
+        self.addCleanup(self._convert, False)
+        self._convert(True)
+        # Existing values are rescaled
+        self.assertEqual(self._hotbin_columns(), [(66, None, None, None)])
+
+        with override_settings(COMPACT_DECIMAL_COLUMNS=True):
+            batch = BatchLog.objects.create(
+                BatchNo=2, JobNo=1, RecipeNo=1, Time=timezone.now(),
+                HotBin1_Actual=Decimal('12.345'), HotBin1_Target='7.5', HotBin2_Actual=0,
+            )
+            self.assertEqual(self._hotbin_columns()[1], (1234, 750, 0, None))
+
+            batch.refresh_from_db()
+            self.assertEqual(
+                (batch.HotBin1_Actual, batch.HotBin1_Target, batch.HotBin2_Actual, batch.HotBin3_Actual),
+                (Decimal('12.34'), Decimal('7.50'), Decimal('0.00'), None)
+            )
+            self.assertEqual(str(batch.HotBin1_Target), '7.50')
+            self.assertTrue(BatchLog.objects.filter(HotBin1_Target__gt=Decimal('7.49'), HotBin1_Actual__in=['12.34']).exists())
+            self.assertEqual(
+                BatchLog.objects.aggregate(total=Sum('HotBin1_Actual'), peak=Max('HotBin1_Actual')),
+                {'total': Decimal('13.00'), 'peak': Decimal('12.34')}
+            )
+
+            data = {'BatchNo': 3, 'JobNo': 1, 'RecipeNo': 1, 'Time': '2025-01-01 10:00:00'}
+            self.assertIn('HotBin4_Target', BatchLogForm({**data, 'HotBin4_Target': '21474836.48'}).errors)
+            self.assertTrue(BatchLogForm({**data, 'HotBin4_Target': '21474836.47'}).is_valid())
+
+        self._convert(False)
+        self.assertEqual([Decimal(str(row[0])) for row in self._hotbin_columns()], [Decimal('0.66'), Decimal('12.34')])
+
+
+DAILY_REPORT_XML = b"""<DailyXMLReport>
+  <OEEPerformance><TotalProduction>100.5</TotalProduction><TotalEmptyOut>2</TotalEmptyOut>
+    <ProductionBatches>40</ProductionBatches><EmptyOutBatches>1</EmptyOutBatches></OEEPerformance>
+  <PlantRunTime>
+    <RunTime><ItemName>Mixer</ItemName><RunningTime>01:00:00</RunningTime></RunTime>
+    <RunTime><ItemName>Dryer</ItemName><RunningTime>00:30:00</RunningTime></RunTime>
+  </PlantRunTime>
+  <RecipeTotals>
+    <RecipeTotal><RecipeNo>1</RecipeNo><RecipeName>SMA</RecipeName><Total>10</Total></RecipeTotal>
+    <RecipeTotal><RecipeNo>2</RecipeNo><RecipeName>AC</RecipeName><Total>20</Total></RecipeTotal>
+    <RecipeTotal><RecipeNo>2</RecipeNo><RecipeName>AC</RecipeName><Total>25</Total></RecipeTotal>
+    <RecipeTotal><RecipeNo></RecipeNo><RecipeName>Unknown</RecipeName><Total>1</Total></RecipeTotal>
+  </RecipeTotals>
+  <MaterialTotals>
+    <Material><MaterialNo>3</MaterialNo><Name>Reclaim Asphalt</Name><Quantity>30</Quantity></Material>
+    <Material><MaterialNo>4</MaterialNo><Name>Sand</Name><Quantity>12.5</Quantity></Material>
+  </MaterialTotals>
+</DailyXMLReport>"""
+
+
+class DailyReportUpsertTestCase(TestCase):
+    def test_report_written_with_bulk_upserts(self):
+        from .models import DailyMaterials, DailyRecipes, OEEDailyData, PlantRunTime
+        from .tasks import process_daily_report
+        root = ET.fromstring(DAILY_REPORT_XML)
+        day = date(2025, 3, 1)
+
+        # One lookup and one upsert per section inside a savepoint; the NULL RecipeNo
+        # row takes the update_or_create path (5 queries)
+        with self.assertNumQueries(16):
+            self.assertEqual(process_daily_report(root, 'Report_010325.xml', day), (1, 1, 3, 2))
+        self.assertEqual(DailyRecipes.objects.get(date=day, RecipeNo=2).Total, 25)
+        self.assertEqual(PlantRunTime.objects.get(date=day).Mixer, 3600)
+
+        # A second delivery of the same day updates in place
+        PlantRunTime.objects.filter(date=day).update(Screen=99)
+        root.find('.//MaterialTotals/Material/Quantity').text = '31'
+        root.find('PlantRunTime').remove(root.find('.//PlantRunTime/RunTime'))
+        self.assertEqual(process_daily_report(root, 'Report_010325.xml', day), (0, 0, 0, 0))
+        self.assertEqual(DailyMaterials.objects.get(date=day, MaterialNo=3).Quantity, 31)
+        runtime = PlantRunTime.objects.get(date=day)
+        self.assertEqual((runtime.Mixer, runtime.Dryer, runtime.Screen), (3600, 1800, 99))
+        self.assertEqual(OEEDailyData.objects.count(), 1)
+        self.assertEqual(DailyRecipes.objects.count(), 3)
+
+
+class StubConsumptionsAPI:
+    """Local GetConsumptions API: two meters read at 00:00 and 12:00 on every requested day"""
+    def __init__(self, delay=0.05, fail_from=None):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.delay = delay
+        self.fail_from = fail_from
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}/GetConsumptions/72/1716'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request):
+        with self.lock:
+            self.requests.append(request.path)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            start, end = [date.fromisoformat(part) for part in request.path.rstrip('/').split('/')[-2:]]
+            if self.fail_from and start >= self.fail_from:
+                # Failures answer at once, ahead of the earlier windows still in flight
+                request.send_response(500)
+                request.end_headers()
+                return
+            time.sleep(self.delay)
+            records = [
+                {'timestamp': f'{start + timedelta(days=n)}T{hour}:00:00', 'meterName': meter,
+                 'value': 1.5, 'consumption': 0.5}
+                for n in range((end - start).days + 1) for hour in ('00', '12') for meter in ('Main', 'Dryer')
+            ]
+            body = json.dumps(records).encode()
+            request.send_response(200)
+            request.send_header('Content-Type', 'application/json')
+            request.send_header('Content-Length', str(len(body)))
+            request.end_headers()
+            request.wfile.write(body)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@override_settings(ENERGY_FETCH_WINDOW_DAYS=7, ENERGY_FETCH_CONCURRENCY=2, ENERGY_FETCH_TIMEOUT=5)
+class EnergyBackfillTestCase(TestCase):
+    def test_windows_overlap_on_boundary_days(self):
+        from .energy import energy_windows
+        self.assertEqual(
+            energy_windows(date(2025, 1, 1), date(2025, 1, 17)),
+            [(date(2025, 1, 1), date(2025, 1, 8)), (date(2025, 1, 8), date(2025, 1, 15)),
+             (date(2025, 1, 15), date(2025, 1, 17))]
+        )
+        self.assertEqual(energy_windows(date(2025, 1, 1), date(2025, 1, 1)), [(date(2025, 1, 1), date(2025, 1, 1))])
+
+    @override_settings(PROGRESS_UPDATES_PER_SECOND=0)
+    def test_backfill_from_stub_api(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from .energy import dublin_tz
+        from .models import EnergyData, EnergyMeterWatermark
+        from .tasks import fetch_energy_data
+
+        today = timezone.now().astimezone(dublin_tz).date()
+        first_day = today - timedelta(days=20)
+        reading = EnergyData.objects.create(
+            date=first_day, meter_name='Main', value=1.5, consumption=0.5,
+            timestamp=dublin_tz.localize(datetime.combine(first_day, datetime.min.time()))
+        )
+        EnergyMeterWatermark.objects.create(meter_name='Main', last_timestamp=reading.timestamp)
+        layer = get_channel_layer()
+        async_to_sync(layer.group_add)('energy_backfill-test', 'test-channel')
+
+        with StubConsumptionsAPI() as api, override_settings(ENERGY_API_BASE_URL=api.base_url):
+            result = fetch_energy_data.apply(task_id='backfill-test').get()
+
+        # 21 days in three overlapping windows, never more than two requests at once
+        self.assertEqual(len(api.requests), 3)
+        self.assertLessEqual(api.max_in_flight, 2)
+        self.assertEqual(result['records_added'], 21 * 4 - 1)
+        self.assertEqual(EnergyData.objects.count(), 21 * 4)
+
+        updates = []
+        for _ in range(4):
+            updates.append(async_to_sync(layer.receive)('test-channel')['data'])
+        self.assertEqual([update['progress'] for update in updates], [33, 66, 100, 100])
+        self.assertEqual(updates[0]['message'], f'Processed {first_day} to {first_day + timedelta(days=7)}')
+        self.assertEqual(updates[-1]['records_added'], 21 * 4 - 1)
+        self.assertEqual(
+            dict(EnergyMeterWatermark.objects.values_list('meter_name', 'last_timestamp')),
+            {meter: dublin_tz.localize(datetime.combine(today, datetime.min.time()).replace(hour=12))
+             for meter in ('Main', 'Dryer')}
+        )
+
+    def test_windows_before_a_failed_request_are_yielded_in_order(self):
+        import requests
+        from .energy import energy_windows, iter_energy_windows
+        windows = energy_windows(date(2025, 1, 1), date(2025, 1, 29))
+        yielded = []
+        with StubConsumptionsAPI(fail_from=date(2025, 1, 15)) as api, \
+                override_settings(ENERGY_API_BASE_URL=api.base_url):
+            with self.assertRaises(requests.HTTPError):
+                for window, payload in iter_energy_windows(windows, concurrency=len(windows)):
+                    yielded.append(window)
+        self.assertEqual(yielded, windows[:2])
+
+    def test_gap_scanner_refetches_only_missing_days(self):
+        from .energy import dublin_tz, find_energy_gaps
+        from .models import EnergyData, EnergyDataGap, EnergyMeterWatermark
+        from .tasks import fetch_energy_data, scan_energy_gaps
+
+        start = date(2025, 2, 1)
+        days = [start + timedelta(days=n) for n in range(10)]
+        missing = {('Dryer', days[3]), ('Dryer', days[4]), ('Main', days[6])}
+        EnergyData.objects.bulk_create(
+            EnergyData(date=day, meter_name=meter, value=1.5, consumption=0.5,
+                       timestamp=dublin_tz.localize(datetime.combine(day, datetime.min.time())))
+            for day in days for meter in ('Main', 'Dryer') if (meter, day) not in missing
+        )
+        for meter in ('Main', 'Dryer'):
+            EnergyMeterWatermark.objects.create(
+                meter_name=meter, last_timestamp=dublin_tz.localize(datetime(2025, 2, 10, 12))
+            )
+
+        self.assertEqual(find_energy_gaps(), {'Dryer': [(days[3], days[4])], 'Main': [(days[6], days[6])]})
+        with mock.patch.object(fetch_energy_data, 'delay') as delay:
+            self.assertEqual(scan_energy_gaps()['refetch_ranges'], 2)
+        ranges = delay.call_args.kwargs['ranges']
+        self.assertEqual(ranges, [['2025-02-04', '2025-02-05'], ['2025-02-07', '2025-02-07']])
+        self.assertEqual(list(EnergyDataGap.objects.values_list('meter_name', 'attempts')), [('Dryer', 1), ('Main', 1)])
+
+        with StubConsumptionsAPI() as api, override_settings(ENERGY_API_BASE_URL=api.base_url):
+            result = fetch_energy_data.apply(kwargs={'ranges': ranges}).get()
+        self.assertEqual(len(api.requests), 2)
+        self.assertEqual(result['records_added'], 3 * 4 - 3)
+
+        self.assertEqual(scan_energy_gaps()['gaps'], 0)
+        self.assertFalse(EnergyDataGap.objects.exists())
+        # Refills never move a watermark backwards
+        self.assertEqual(EnergyMeterWatermark.objects.get(meter_name='Main').last_timestamp,
+                         dublin_tz.localize(datetime(2025, 2, 10, 12)))
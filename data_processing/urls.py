@@ -24,6 +24,8 @@ from .views import (
     create_schedule,
     toggle_schedule,
     check_interrupted,
+    resume_interrupted,
+    cancel_parsing_task,
     pause_parsing_view,
     resume_parsing,
     task_state,
@@ -45,6 +47,8 @@ urlpatterns = [
     path('api/get-parsing-state/', login_required(get_parsing_state), name='get_parsing_state'),
 
     path('api/check-interrupted/', check_interrupted, name='check_interrupted'),
+    path('api/parsing-tasks/<uuid:task_id>/resume/', resume_interrupted, name='resume_interrupted'),
+    path('api/parsing-tasks/<uuid:task_id>/cancel/', cancel_parsing_task, name='cancel_parsing_task'),
     path('api/resume-parsing/', resume_parsing, name='resume_parsing'),
     path('api/task-state/<str:task_id>/', task_state, name='task_state'),
     path('api/pause-parsing/', pause_parsing_view, name='pause_parsing'),
@@ -68,6 +72,11 @@ urlpatterns = [
     path('raw_data_ajax/', views.raw_data_ajax, name='raw_data_ajax'),
     path('batchlogs/', views.batchlog_list, name='batchlog_list'),
 
+    # Background columnar exports
+    path('api/exports/', views.export_job_create, name='export_job_create'),
+    path('api/exports/<uuid:job_id>/', views.export_job_status, name='export_job_status'),
+    path('api/exports/<uuid:job_id>/download/', views.export_job_download, name='export_job_download'),
+
     # Schedule API endpoints (keep these if you're using them)
     path('api/schedules/<int:schedule_id>/toggle/', login_required(toggle_schedule), name='toggle_schedule'),
     path('api/schedules/create/', login_required(create_schedule), name='create_schedule'),
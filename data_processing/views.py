@@ -1,26 +1,35 @@
 from django.core.cache import cache
 import json
+import os
 import csv
 from django.core.paginator import Paginator
 from django.core.serializers.json import DjangoJSONEncoder
-from datetime import timedelta, datetime
+import hashlib
+from datetime import timedelta, datetime, timezone as dt_timezone
 from django.utils import timezone
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, JsonResponse, FileResponse
+from django.urls import reverse
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
-from .tasks import process_xml_files, resume_parsing_task, fetch_energy_data
-from .models import BatchLog,ParsingSchedule, ProcessedFile, OEEDailyData, PlantRunTime, DailyMaterials, DailyRecipes, EnergyData
+from .tasks import process_xml_files, resume_parsing_task, control_parsing_task, fetch_energy_data, run_export_job
+from .models import BatchLog,ParsingSchedule, ParsingTask, ProcessedFile, OEEDailyData, PlantRunTime, DailyMaterials, DailyRecipes, EnergyData, DailyProductionRollup, ExportJob
 from .forms import BatchLogForm
+from .metrics import compute_oee_metrics, compute_production_metrics, dashboard_data_modified, get_dashboard_metrics
+from .exports import export_date_range, export_job_payload, filtered_batchlogs, gzip_stream, iter_batchlog_csv
+from .partitioning import time_range_q
+from .pagination import (
+    cached_count, decode_cursor, encode_cursor, estimated_row_count, keyset_order, keyset_seek
+)
 from decimal import Decimal
 from django.core.files.storage import default_storage
 from celery.result import AsyncResult
 from roadstone_project.celery import app
-from django.views.decorators.http import require_GET, require_http_methods
+from django.views.decorators.http import condition, require_GET, require_http_methods
 from django.db.models import F, ExpressionWrapper, DecimalField, Sum, Q, FloatField, Avg, Value
 from django.db.models.functions import Coalesce, Cast, TruncDate 
 from django.db import models
@@ -30,6 +39,13 @@ import logging
 # Configure logger  
 logger = logging.getLogger(__name__)
 
+# Columns raw_data_ajax can page through with a keyset cursor
+KEYSET_ORDER_FIELDS = {
+    'id', 'Time', 'BatchNo', 'JobNo', 'RecipeNo', 'RecipeName',
+    'Bitumen_Actual', 'Filler_Actual', 'Reclaim_Actual', 'Temperature_Actual',
+    'Bitumen_Target', 'Filler_Target', 'Reclaim_Target', 'Temperature_Target',
+} | {f'HotBin{n}_{kind}' for n in range(1, 9) for kind in ('Actual', 'Target')}
+
 class CustomLoginView(View):
     template_name = 'login.html'  
 
@@ -70,239 +86,34 @@ def admin_home(request):
     return HttpResponse("Admin Home Page")
 
 
-@login_required
-def manager_home(request):
-    print("Received time_range:", request.GET.get('time_range'))
-    if not hasattr(request.user, 'profile') or request.user.profile.role != 'Manager':
+def _role_home(request, role, template_name):
+    """Shared Manager/Operator home page backed by the cached metrics service"""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != role:
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('home')
 
-    # Default values
-    time_range = 30
-    labels = []
-    values = []
-    total_production = 0
-    rap_consumption = 0
-    electricity_consumption = 0
-    material_data = []
-
     # Get time range from request
+    time_range = 30
     if 'time_range' in request.GET:
         try:
             time_range = int(request.GET.get('time_range'))
         except (ValueError, TypeError):
             pass
 
-    # Standardized date filtering
-    end_date = timezone.now().date()
-    if time_range > 0:
-        start_date = end_date - timedelta(days=time_range)
-        date_filter = Q(date__gte=start_date) & Q(date__lte=end_date)
-        material_cutoff = start_date
-    else:
-        date_filter = Q()  # All time
-        material_cutoff = None
-
-    # Filter data based on time range
-    oee_data = OEEDailyData.objects.filter(date_filter)
-    energy_data = EnergyData.objects.filter(date_filter)
-
-    # Standardized total production calculation
-    production_aggregate = oee_data.aggregate(
-        total_combined=Coalesce(
-            Sum(F('TotalProduction') + F('TotalEmptyOut')),
-            0.0,
-            output_field=FloatField()
-        )
-    )
-    total_production = production_aggregate['total_combined']
-    formatted_total_production = "{:,.2f} t".format(total_production)
-
-    # Calculate Electricity Consumption
-    electricity_aggregate = energy_data.aggregate(
-        total=Coalesce(Sum('consumption'), 0.0, output_field=FloatField())
+    context = dict(
+        get_dashboard_metrics(time_range, role),
+        time_range=time_range,
+        dashboard_topic={'view': 'home', 'time_range': time_range},
     )
-    electricity_consumption = electricity_aggregate['total']
-    formatted_electricity = "{:,.2f} kWh".format(electricity_consumption)
-
-    # Calculate RAP Consumption
-    rap_query = Q(MaterialName='Reclaim Asphalt')
-    if material_cutoff:
-        rap_query &= Q(date__gte=material_cutoff)
-    
-    rap_aggregate = DailyMaterials.objects.filter(rap_query).aggregate(
-        total=Coalesce(Sum('Quantity'), 0.0, output_field=FloatField())
-    )
-    rap_consumption = rap_aggregate['total']
-    formatted_rap_consumption = "{:,.2f} t".format(rap_consumption)
-
-
-    # Fetch Material Consumption Data
-    material_query = Q()
-    if material_cutoff:
-        material_query = Q(date__gte=material_cutoff)
-        
-    materials = DailyMaterials.objects.filter(material_query) \
-        .exclude(MaterialName__isnull=True) \
-        .exclude(MaterialName__exact='') \
-        .exclude(MaterialName__iexact='undefined') \
-        .values('MaterialName') \
-        .annotate(total_quantity=Sum('Quantity')) \
-        .order_by('MaterialName')
-
-    material_data = []
-    for index, material in enumerate(materials, start=1):
-        # Clean the material name
-        material_name = material['MaterialName'].strip() if material['MaterialName'] else 'Other Material'
-        
-        # Only include if name is valid
-        if material_name and material_name.lower() not in ['null', 'undefined', '']:
-            material_data.append({
-                'index': index,
-                'MaterialName': material_name,
-                'Quantity': "{:,.2f}".format(material['total_quantity']) if material['total_quantity'] is not None else "0.00"
-            })
-
-    # Prepare OEE data for chart
-    chart_data = oee_data.annotate(
-        daily_production=ExpressionWrapper(
-            F('TotalProduction') + F('TotalEmptyOut'),
-            output_field=FloatField()
-        )
-    ).values('date', 'daily_production').order_by('date')
-
-    # Prepare chart data
-    if chart_data.exists():
-        labels = [entry['date'].strftime('%Y-%m-%d') for entry in chart_data]
-        values = [float(entry['daily_production']) for entry in chart_data]
-
-    return render(request, 'manager_home.html', {
-        'labels': json.dumps(labels),
-        'values': json.dumps(values),
-        'time_range': time_range,
-        'total_production': formatted_total_production,
-        'rap_consumption': formatted_rap_consumption,
-        'electricity_consumption': formatted_electricity,
-        'material_data': json.dumps(material_data),
-    })
-
+    return render(request, template_name, context)
 
+@login_required
+def manager_home(request):
+    return _role_home(request, 'Manager', 'manager_home.html')
 
 @login_required
 def operator_home(request):
-    print("Received time_range:", request.GET.get('time_range'))
-    if not hasattr(request.user, 'profile') or request.user.profile.role != 'Operator':
-        messages.error(request, 'You do not have permission to access this page.')
-        return redirect('home')
-
-    # Default values
-    time_range = 30
-    labels = []
-    values = []
-    total_production = 0
-    rap_consumption = 0
-    electricity_consumption = 0
-    material_data = []
-
-    # Get time range from request
-    if 'time_range' in request.GET:
-        try:
-            time_range = int(request.GET.get('time_range'))
-        except (ValueError, TypeError):
-            pass
-
-    # Standardized date filtering
-    end_date = timezone.now().date()
-    if time_range > 0:
-        start_date = end_date - timedelta(days=time_range)
-        date_filter = Q(date__gte=start_date) & Q(date__lte=end_date)
-        material_cutoff = start_date
-    else:
-        date_filter = Q()  # All time
-        material_cutoff = None
-
-    # Filter data based on time range
-    oee_data = OEEDailyData.objects.filter(date_filter)
-    energy_data = EnergyData.objects.filter(date_filter)
-
-    # Standardized total production calculation
-    production_aggregate = oee_data.aggregate(
-        total_combined=Coalesce(
-            Sum(F('TotalProduction') + F('TotalEmptyOut')),
-            0.0,
-            output_field=FloatField()
-        )
-    )
-    total_production = production_aggregate['total_combined']
-    formatted_total_production = "{:,.2f} t".format(total_production)
-
-    # Calculate Electricity Consumption
-    electricity_aggregate = energy_data.aggregate(
-        total=Coalesce(Sum('consumption'), 0.0, output_field=FloatField())
-    )
-    electricity_consumption = electricity_aggregate['total']
-    formatted_electricity = "{:,.2f} kWh".format(electricity_consumption)
-
-    # Calculate RAP Consumption
-    rap_query = Q(MaterialName='Reclaim Asphalt')
-    if material_cutoff:
-        rap_query &= Q(date__gte=material_cutoff)
-    
-    rap_aggregate = DailyMaterials.objects.filter(rap_query).aggregate(
-        total=Coalesce(Sum('Quantity'), 0.0, output_field=FloatField())
-    )
-    rap_consumption = rap_aggregate['total']
-    formatted_rap_consumption = "{:,.2f} t".format(rap_consumption)
-
-
-    # Fetch Material Consumption Data
-    material_query = Q()
-    if material_cutoff:
-        material_query = Q(date__gte=material_cutoff)
-        
-    materials = DailyMaterials.objects.filter(material_query) \
-        .exclude(MaterialName__isnull=True) \
-        .exclude(MaterialName__exact='') \
-        .exclude(MaterialName__iexact='undefined') \
-        .values('MaterialName') \
-        .annotate(total_quantity=Sum('Quantity')) \
-        .order_by('MaterialName')
-
-    material_data = []
-    for index, material in enumerate(materials, start=1):
-        # Clean the material name
-        material_name = material['MaterialName'].strip() if material['MaterialName'] else 'Other Material'
-        
-        # Only include if name is valid
-        if material_name and material_name.lower() not in ['null', 'undefined', '']:
-            material_data.append({
-                'index': index,
-                'MaterialName': material_name,
-                'Quantity': "{:,.2f}".format(material['total_quantity']) if material['total_quantity'] is not None else "0.00"
-            })
-
-    # Prepare OEE data for chart
-    chart_data = oee_data.annotate(
-        daily_production=ExpressionWrapper(
-            F('TotalProduction') + F('TotalEmptyOut'),
-            output_field=FloatField()
-        )
-    ).values('date', 'daily_production').order_by('date')
-
-    # Prepare chart data
-    if chart_data.exists():
-        labels = [entry['date'].strftime('%Y-%m-%d') for entry in chart_data]
-        values = [float(entry['daily_production']) for entry in chart_data]
-
-    return render(request, 'operator_home.html', {
-        'labels': json.dumps(labels),
-        'values': json.dumps(values),
-        'time_range': time_range,
-        'total_production': formatted_total_production,
-        'rap_consumption': formatted_rap_consumption,
-        'electricity_consumption': formatted_electricity,
-        'material_data': json.dumps(material_data),
-    })
+    return _role_home(request, 'Operator', 'operator_home.html')
 
 @login_required
 def custom_logout(request):
@@ -328,92 +139,36 @@ def oee_dashboard(request):
     """Render the OEE dashboard template"""
     return render(request, 'oee_dashboard.html')
 
+def _oee_days(request):
+    try:
+        return int(request.GET.get('days', 30))
+    except (TypeError, ValueError):
+        return 30
+
+def _oee_last_modified(request):
+    # Rolling windows move at midnight even without new data
+    modified = dashboard_data_modified()
+    if _oee_days(request):
+        midnight = datetime.combine(timezone.now().date(), datetime.min.time(), tzinfo=dt_timezone.utc)
+        modified = max(modified, midnight)
+    return modified
+
+def _oee_etag(request):
+    return hashlib.md5(
+        f"{_oee_days(request)}:{timezone.now().date()}:{dashboard_data_modified().isoformat()}".encode()
+    ).hexdigest()
+
 @login_required
+@condition(etag_func=_oee_etag, last_modified_func=_oee_last_modified)
 def oee_dashboard_api(request):
     """API endpoint for OEE dashboard with complete time range support"""
     try:
         days = int(request.GET.get('days', 30))
-        end_date = timezone.now().date()
-        
-        # Handle "All Time" case
-        if days == 0:
-            start_date = None
-        else:
-            start_date = end_date - timedelta(days=days)
-
-        # Base filter for date-based models
-        date_filter = Q()
-        if start_date:
-            date_filter = Q(date__gte=start_date) & Q(date__lte=end_date)
-            
-
-        # 1. Get OEEDailyData
-        oee_data = OEEDailyData.objects.filter(date_filter).aggregate(
-            total_production=Coalesce(Sum('TotalProduction', output_field=FloatField()), 0.0),
-            total_emptyout=Coalesce(Sum('TotalEmptyOut', output_field=FloatField()), 0.0)
-        ) # OEEDailyData_TotalProduction + OEEDailyData_TotalEmptyOut
-
-        # 2. Get Plant Runtime Data
-        runtime_fields = [
-            'MixingActive', 'Mixer', 'Screen', 'HotElevator', 'Dryer',
-            'BurnerFlameOn', 'SlingerForward', 'SlingerReverse',
-            'CollectConveyor', 'DustBlower', 'DustBlowerRotaryValve'
-        ]
-        runtime_data = PlantRunTime.objects.filter(date_filter).aggregate(
-            **{field: Sum(field) for field in runtime_fields}
-        )
-
-        # 3. Get Materials Data
-        material_data = DailyMaterials.objects.filter(date_filter).aggregate(
-            total_materials=Coalesce(Sum('Quantity', output_field=FloatField()), 0.0)
-        )
-
-        # 4. Get RAP and Bitumen from BatchLog
-        batch_filter = Q()
-        if start_date:
-            batch_filter = Q(Time__date__gte=start_date) & Q(Time__date__lte=end_date)
-            
-        rap_bitumen = BatchLog.objects.filter(batch_filter).aggregate(
-            total_rap=Coalesce(Sum('Reclaim_Actual', output_field=FloatField())/1000, 0.0),
-            total_bitumen=Coalesce(Sum('Bitumen_Actual', output_field=FloatField())/1000, 0.0)
-        )
-
-        # 5. Get Electricity Consumption
-        electricity_data = EnergyData.objects.filter(date_filter).aggregate(
-            total_consumption=Coalesce(Sum('consumption', output_field=FloatField()), 0.0)
-        )
+        response = JsonResponse(compute_oee_metrics(days))
+        # Browsers must revalidate so polling gets 304s once nothing changed
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
-        # 5. Calculate Mixer Hours
-        total_mixer_seconds = runtime_data.get('Mixer', 0) or 0
-        total_mixer_hours = total_mixer_seconds / 3600 if total_mixer_seconds else 0
-
-        # 6. Prepare response
-        response_data = {
-            'total_production': float(oee_data['total_production']),
-            'total_emptyout': float(oee_data['total_emptyout']),
-            'total_consumption': float(electricity_data['total_consumption']),
-            'total_consumption': float(electricity_data['total_consumption']),
-            'runtime_data': {k: float(v or 0) for k, v in runtime_data.items()},
-            'drying_efficiency': {
-                'avg_drying_rate': 0.0,
-                'total_materials': float(material_data['total_materials']),
-                'total_rap': float(rap_bitumen['total_rap']),
-                'total_bitumen': float(rap_bitumen['total_bitumen']),
-                'total_mixer_hours': float(total_mixer_hours)
-            }
-        }
-
-        # Calculate average drying rate safely
-        if total_mixer_hours > 0:
-            numerator = (response_data['drying_efficiency']['total_materials'] 
-                        - response_data['drying_efficiency']['total_rap'] 
-                        - response_data['drying_efficiency']['total_bitumen'])
-            response_data['drying_efficiency']['avg_drying_rate'] = round(
-                numerator / total_mixer_hours, 2
-            )
-
-        return JsonResponse(response_data)
-        
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -424,133 +179,19 @@ def production_dashboard(request):
     selected_recipe = request.GET.get('recipe', '').strip()
     unit = request.GET.get('unit', 't')
 
-    # Calculate date range
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=time_range) if time_range > 0 else None
-
-    # Base queries
-    daily_recipes = DailyRecipes.objects.all()
-    batch_logs = BatchLog.objects.all()
-    rap_materials = DailyMaterials.objects.filter(MaterialName='Reclaim Asphalt')
-    
-    # Apply date filters
-    if start_date:
-        daily_recipes = daily_recipes.filter(date__gte=start_date.date(), date__lte=end_date.date())
-        batch_logs = batch_logs.filter(Time__gte=start_date, Time__lte=end_date)
-        rap_materials = rap_materials.filter(date__gte=start_date.date(), date__lte=end_date.date())
-
-    # Get available recipes from DailyRecipes
-    recipe_names = daily_recipes.exclude(RecipeName__isnull=True)\
-                              .order_by('RecipeName')\
-                              .values_list('RecipeName', flat=True)\
-                              .distinct()
-    
-    # Apply recipe filter
-    if selected_recipe:
-        daily_recipes = daily_recipes.filter(RecipeName=selected_recipe)
-        batch_logs = batch_logs.filter(RecipeName=selected_recipe)
-        # Note: DailyMaterials typically doesn't have RecipeName, so it don't filter it but the date range is possible
-
-    # Production calculation from DailyRecipes
-    production_expression = ExpressionWrapper(
-        Coalesce(F('Total'), Value(0.0)),
-        output_field=FloatField()
-    )
-
-    # Aggregate metrics
-    production_metrics = daily_recipes.aggregate(
-        total_production=Coalesce(Sum(production_expression, output_field=FloatField()), 0.0)
-    )
-
-    # Get RAP consumption from DailyMaterials
-    if selected_recipe:
-        # Calculate RAP from BatchLog's Reclaim_Actual for the selected recipe
-        rap_metrics = batch_logs.aggregate(
-            total_reclaim=Coalesce(Sum('Reclaim_Actual', output_field=FloatField()), Value(0.0, output_field=FloatField())
-        ))
-    else:
-        # Calculate RAP from DailyMaterials
-        rap_metrics = rap_materials.aggregate(
-            total_reclaim=Coalesce(Sum('Quantity', output_field=FloatField()), Value(0.0, output_field=FloatField())
-        ))
-
-    bitumen_metrics = batch_logs.aggregate(
-        total_bitumen=Coalesce(Sum('Bitumen_Actual', output_field=FloatField()), 0.0)
-    )
-
-    temp_metrics = batch_logs.aggregate(
-        avg_temp_target=Coalesce(Avg('Temperature_Target', output_field=FloatField()), 0.0),
-        avg_temp_actual=Coalesce(Avg('Temperature_Actual', output_field=FloatField()), 0.0)
-    )
-
-    # Convert values based on selected unit
-    conversion_factor = 1000 if unit == 'kt' else 1
-    production_total = float(production_metrics['total_production'])
-    total_prod = production_total / conversion_factor
-
-    # Calculate RAP in tons and apply conversion factor
-    if selected_recipe:
-        rap_total = float(rap_metrics['total_reclaim']) / 1000  # Convert kg to tons
-    else:
-        rap_total = float(rap_metrics['total_reclaim'])  # Already in tons
-    total_reclaim = rap_total / conversion_factor
-
-    # Bitumen conversion (kg to tons)
-    bitumen_total = float(bitumen_metrics['total_bitumen']) / 1000  # Convert kg to tons
-    total_bitumen = bitumen_total / conversion_factor
-    
-    # Calculate percentages - now using RAP from DailyMaterials
-    if production_total > 0:
-        rap_percent = (rap_total / production_total) * 100
-        bitumen_percent = (bitumen_total / production_total) * 100
-        aggregates_percent = 100 - rap_percent - bitumen_percent
-    else:
-        rap_percent = 0.0
-        bitumen_percent = 0.0
-        aggregates_percent = 0.0
-
-    # Temperature metrics
-    avg_temp_target = float(temp_metrics['avg_temp_target'])
-    avg_temp_actual = float(temp_metrics['avg_temp_actual'])
-    temp_deviation = avg_temp_actual - avg_temp_target  
-
-    # Chart data
-    chart_data = daily_recipes.values('date').annotate(
-        daily_total=ExpressionWrapper(
-            Coalesce(Sum(production_expression, output_field=FloatField()), 0.0) / conversion_factor,
-            output_field=FloatField()
-        )
-    ).order_by('date')
-
-    # Prepare context
-    context = {
+    context = dict(
+        compute_production_metrics(time_range, selected_recipe, unit),
         # Filter parameters
-        'time_range': time_range,
-        'selected_recipe': selected_recipe,
-        'unit': unit,
-        'recipe_names': recipe_names,
-        
-        # Production metrics
-        'total_production': f"{total_prod:,.2f} {unit}",
-        'rap_percentage': f"{rap_percent:.2f}%",
-        'bitumen_percentage': f"{bitumen_percent:.2f}%",
-        'aggregates_percentage': f"{aggregates_percent:.2f}%",
-        
-        # Temperature metrics
-        'avg_temp_target': f"{avg_temp_target:.1f}°C",
-        'avg_temp_actual': f"{avg_temp_actual:.1f}°C",
-        'temp_deviation': f"{temp_deviation:.1f}°C",
-        
-        # Chart data
-        'chart_labels': [item['date'].isoformat() for item in chart_data],
-        'chart_data': [float(item['daily_total']) for item in chart_data],
-        'has_data': daily_recipes.exists(),
-        
+        time_range=time_range,
+        selected_recipe=selected_recipe,
+        unit=unit,
         # For JavaScript
-        'unit_json': json.dumps(unit),
-        'time_range_json': json.dumps(time_range),
-        'selected_recipe_json': json.dumps(selected_recipe)
-    }
+        unit_json=json.dumps(unit),
+        time_range_json=json.dumps(time_range),
+        selected_recipe_json=json.dumps(selected_recipe),
+        # Live updates over ws/dashboard/
+        dashboard_topic={'view': 'production', 'time_range': time_range, 'recipe': selected_recipe},
+    )
     
     return render(request, 'production.html', context)
 
@@ -565,7 +206,7 @@ def upload_xml(request):
     
     # Get parsing state
     parsing_active = cache.get('parsing_active', False)
-    pause_parsing = cache.get('pause_parsing', False)
+    pause_parsing = ParsingTask.objects.filter(status='paused').exists()
     
     active_schedules = ParsingSchedule.objects.filter(is_active=True)
     return render(request, 'upload_xml.html', {
@@ -627,7 +268,6 @@ def trigger_parsing(request):
 
         # Manual parsing
         try:
-            cache.set('pause_parsing', False, timeout=None)
             task = process_xml_files.delay()
             if not task.id:
                 raise ValueError("Task ID not generated")
@@ -656,26 +296,46 @@ def trigger_parsing(request):
 @csrf_exempt
 def check_interrupted(request):
     """Check for tasks that can be resumed"""
-    last_interrupted = ProcessedFile.objects.filter(
-        status='interrupted'
-    ).order_by('-export_time').first()
+    last_interrupted = ParsingTask.objects.filter(status='interrupted').order_by('-last_updated').first()
     
     if last_interrupted:
+        next_file = last_interrupted.files.filter(status__in=['pending', 'claimed']).order_by('position').first()
         return JsonResponse({
             'found': True,
-            'task_id': last_interrupted.task.id,
-            'last_file': last_interrupted.file_name,
-            'progress': int((last_interrupted.task.processed_files / last_interrupted.task.total_files) * 100)
+            'task_id': str(last_interrupted.id),
+            'last_file': last_interrupted.current_file,
+            'next_file': next_file.file_name if next_file else None,
+            'progress': last_interrupted.progress
         })
     return JsonResponse({'found': False})    
 
 
+@require_http_methods(["POST"])
+@login_required
+def resume_interrupted(request, task_id):
+    """Resume an interrupted or paused parsing task from its first unfinished file"""
+    parsing_task = get_object_or_404(ParsingTask, pk=task_id, status__in=['interrupted', 'paused'])
+    resume_parsing_task.delay(str(parsing_task.id))
+    return JsonResponse({'status': 'resuming', 'task_id': str(parsing_task.id)}, status=202)
+
+
+@require_http_methods(["POST"])
+@login_required
+def cancel_parsing_task(request, task_id):
+    """Cancel a parsing task; a running one stops at its next file"""
+    parsing_task = get_object_or_404(
+        ParsingTask, pk=task_id, status__in=['pending', 'processing', 'paused', 'interrupted']
+    )
+    control_parsing_task(parsing_task, 'cancel')
+    return JsonResponse({'status': 'cancelling', 'task_id': str(parsing_task.id)}, status=202)
+
+
 @require_http_methods(["POST"])
 @login_required
 def toggle_parsing(request):
     """Toggle pause/resume state"""
     try:
-        if cache.get('pause_parsing', False):
+        if ParsingTask.objects.filter(status='paused').exists():
             resume_parsing.delay()
             return JsonResponse({'status': 'resumed'})
         else:
@@ -702,7 +362,7 @@ def get_parsing_state(request):
     current_task_id = cache.get('current_parsing_task')
     task_data = {
         'is_active': bool(current_task_id),
-        'is_paused': cache.get('pause_parsing', False),
+        'is_paused': ParsingTask.objects.filter(status='paused').exists(),
         'current_task': current_task_id,
         'schedules': []
     }
@@ -860,6 +520,66 @@ def fetch_energy_data_page(request):
     })
 
 
+@require_http_methods(["POST"])
+@login_required
+def export_job_create(request):
+    """Start a background Parquet / Arrow export of a dataset"""
+    dataset = request.POST.get('dataset', 'batchlog')
+    file_format = request.POST.get('file_format', 'parquet')
+    if dataset not in dict(ExportJob.DATASET_CHOICES) or file_format not in dict(ExportJob.FORMAT_CHOICES):
+        return JsonResponse({'status': 'error', 'message': 'Unknown dataset or format'}, status=400)
+
+    job = ExportJob.objects.create(
+        dataset=dataset,
+        file_format=file_format,
+        filters={key: request.POST[key] for key in ('date_start', 'date_end', 'recipe') if request.POST.get(key)},
+        created_by=request.user,
+    )
+    task = run_export_job.delay(str(job.id))
+    ExportJob.objects.filter(pk=job.pk, celery_task_id='').update(celery_task_id=task.id)
+    job.refresh_from_db()
+    return JsonResponse({
+        **export_job_payload(job),
+        'status_url': reverse('export_job_status', args=[job.id]),
+        'ws_path': f'/ws/exports/{job.id}/',
+    }, status=202)
+
+
+def _user_export_job(request, job_id):
+    jobs = ExportJob.objects.all()
+    if not request.user.is_superuser:
+        jobs = jobs.filter(created_by=request.user)
+    return get_object_or_404(jobs, pk=job_id)
+
+
+@login_required
+def export_job_status(request, job_id):
+    """Current status and progress of an export job"""
+    return JsonResponse(export_job_payload(_user_export_job(request, job_id)))
+
+
+@login_required
+def export_job_download(request, job_id):
+    """Download the finished file of an export job"""
+    job = _user_export_job(request, job_id)
+    if job.status != 'completed' or not job.file_path:
+        return JsonResponse({'status': 'error', 'message': 'Export is not ready'}, status=404)
+    try:
+        export_file = open(os.path.join(settings.MEDIA_ROOT, job.file_path), 'rb')
+    except FileNotFoundError:
+        # Cleaned up, or written to another worker's disk: the client can export again
+        message = 'Export file is no longer available, please export again'
+        ExportJob.objects.filter(pk=job.pk, status='completed').update(status='failed', error_message=message)
+        return JsonResponse({'status': 'error', 'message': message}, status=404)
+    date_range = export_date_range(job.filters.get('date_start', ''), job.filters.get('date_end', ''))
+    extension = os.path.splitext(job.file_path)[1]
+    return FileResponse(
+        export_file,
+        as_attachment=True,
+        filename=f"{job.dataset}_{date_range}{extension}",
+    )
+
+
 @login_required
 def batchlog_list(request):
     if request.method == 'POST' and 'edit' in request.POST:
@@ -885,86 +605,17 @@ def batchlog_list(request):
 def raw_data_ajax(request):
     try:
 
-        # Handle CSV Export
+        # Handle CSV Export: streamed row by row, optionally gzipped
         if request.GET.get('export_csv'):
-            from_date = request.GET.get('date_start', '')
-            to_date = request.GET.get('date_end', '')
-            
-            # Format the date range for filename
-            date_range = ""
-            if from_date and to_date:
-                from_formatted = datetime.strptime(from_date, '%Y-%m-%d').strftime('%d%b%Y').upper()
-                to_formatted = datetime.strptime(to_date, '%Y-%m-%d').strftime('%d%b%Y').upper()
-                date_range = f"{from_formatted}-{to_formatted}"
-            elif from_date:
-                date_range = datetime.strptime(from_date, '%Y-%m-%d').strftime('%d%b%Y').upper() + "-CURRENT"
-            elif to_date:
-                date_range = "START-" + datetime.strptime(to_date, '%Y-%m-%d').strftime('%d%b%Y').upper()
+            date_range = export_date_range(request.GET.get('date_start', ''), request.GET.get('date_end', ''))
+            content = iter_batchlog_csv(filtered_batchlogs(request.GET))
+            filename = f"BatchLog_{date_range}.csv"
+            if request.GET.get('gzip'):
+                response = StreamingHttpResponse(gzip_stream(content), content_type='application/gzip')
+                filename += '.gz'
             else:
-                date_range = "ALL-DATES"
-            
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="BatchLog_{date_range}.csv"'
-            
-            writer = csv.writer(response)
-            
-            # Write headers
-            writer.writerow([
-                'ID', 'Date', 'Time', 'Batch No', 'Job No', 'Recipe No', 'Recipe Name',
-                'Bitumen Actual', 'Filler Actual', 'Reclaim Actual', 'Temperature Actual',
-                'HotBin 1 Actual', 'HotBin 2 Actual','HotBin 3 Actual', 'HotBin 4 Actual',
-                'HotBin 5 Actual', 'HotBin 6 Actual', 'HotBin 7 Actual', 'HotBin 8 Actual',
-                'Bitumen Target', 'Filler Target', 'Reclaim Target', 'Temperature Target',
-                'HotBin 1 Target', 'HotBin 2 Target', 'HotBin 3 Target', 'HotBin 4 Target',
-                'HotBin 5 Target', 'HotBin 6 Target', 'HotBin 7 Target', 'HotBin 8 Target',
-            ])
-            
-            # Apply the same filters as the table
-            queryset = BatchLog.objects.all()
-            
-            if request.GET.get('date_start'):
-                queryset = queryset.filter(Time__date__gte=request.GET['date_start'])
-            if request.GET.get('date_end'):
-                queryset = queryset.filter(Time__date__lte=request.GET['date_end'])
-            if request.GET.get('recipe'):
-                queryset = queryset.filter(RecipeName=request.GET['recipe'])
-            
-            # Write data rows
-            for item in queryset:
-                writer.writerow([
-                    item.id,
-                    item.Time.strftime('%Y-%m-%d') if item.Time else '',
-                    item.Time.strftime('%H:%M:%S') if item.Time else '',
-                    item.BatchNo,
-                    item.JobNo,
-                    item.RecipeNo,
-                    item.RecipeName,
-                    item.Bitumen_Actual,
-                    item.Filler_Actual,
-                    item.Reclaim_Actual,
-                    item.Temperature_Actual,
-                    item.HotBin1_Actual,
-                    item.HotBin2_Actual,
-                    item.HotBin3_Actual,
-                    item.HotBin4_Actual,
-                    item.HotBin5_Actual,    
-                    item.HotBin6_Actual,
-                    item.HotBin7_Actual,
-                    item.HotBin8_Actual,
-                    item.Bitumen_Target,
-                    item.Filler_Target,
-                    item.Reclaim_Target,
-                    item.Temperature_Target,
-                    item.HotBin1_Target,
-                    item.HotBin2_Target,
-                    item.HotBin3_Target,
-                    item.HotBin4_Target,
-                    item.HotBin5_Target,
-                    item.HotBin6_Target,
-                    item.HotBin7_Target,
-                    item.HotBin8_Target
-                ])
-            
+                response = StreamingHttpResponse(content, content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
             return response
 
         # Get filters from request
@@ -983,11 +634,8 @@ def raw_data_ajax(request):
         # Base queryset
         queryset = BatchLog.objects.all()
 
-        # Apply date filters
-        if date_start:
-            queryset = queryset.filter(Time__date__gte=date_start)
-        if date_end:
-            queryset = queryset.filter(Time__date__lte=date_end)
+        # Apply date filters as a Time range so BatchLogs partitions are pruned
+        queryset = queryset.filter(time_range_q(date_start, date_end))
         
         # Apply recipe filter
         if recipe_name:
@@ -1008,12 +656,6 @@ def raw_data_ajax(request):
                 Q(RecipeName__icontains=search_value)
             )
 
-        # Total records count (before filtering)
-        total_records = BatchLog.objects.count()
-        
-        # Filtered count (after all filters)
-        filtered_records = queryset.count()
-
         # Ordering
         order_col = int(request.GET.get('order[0][column]', 1))
         order_dir = request.GET.get('order[0][dir]', 'desc')
@@ -1030,13 +672,50 @@ def raw_data_ajax(request):
             'RecipeName': 'RecipeName'
         }
         order_field = field_mapping.get(order_field, order_field)
-        
-        if order_dir == 'desc':
-            order_field = f'-{order_field}'
-        queryset = queryset.order_by(order_field)
 
-        # Pagination
-        queryset = queryset[start:start + length]
+        next_cursor = None
+        if request.GET.get('pagination') == 'keyset':
+            # Keyset mode: seek past the cursor row instead of OFFSET, and
+            # answer counts from cached estimates, so page N costs the
+            # same as page 1
+            if order_field not in KEYSET_ORDER_FIELDS:
+                order_field = 'Time'
+            descending = order_dir == 'desc'
+
+            total_records = estimated_row_count(BatchLog)
+            if date_start or date_end or recipe_name or search_value:
+                filtered_records = cached_count(
+                    queryset, f'{date_start}|{date_end}|{recipe_name}|{search_value}'
+                )
+            else:
+                filtered_records = total_records
+
+            queryset = keyset_order(queryset, order_field, descending)
+            position = decode_cursor(request.GET.get('cursor', ''), BatchLog, order_field)
+            if position is not None:
+                queryset = keyset_seek(queryset, order_field, descending, *position)
+                page = list(queryset[:length])
+            else:
+                # No cursor for this page (first page, or a jump): fall back to OFFSET
+                page = list(queryset[start:start + length])
+
+            if len(page) == length:
+                last = page[-1]
+                next_cursor = encode_cursor(order_field, getattr(last, order_field), last.pk)
+            queryset = page
+        else:
+            # Total records count (before filtering)
+            total_records = BatchLog.objects.count()
+
+            # Filtered count (after all filters)
+            filtered_records = queryset.count()
+
+            if order_dir == 'desc':
+                order_field = f'-{order_field}'
+            queryset = queryset.order_by(order_field)
+
+            # Pagination
+            queryset = queryset[start:start + length]
 
         # Prepare response data
         data = []
@@ -1076,12 +755,15 @@ def raw_data_ajax(request):
                 "HotBin8_Target": item.HotBin8_Target
             })
         
-        return JsonResponse({
+        response_data = {
             "draw": draw,
             "recordsTotal": total_records,
             "recordsFiltered": filtered_records,
             "data": data
-        })
+        }
+        if request.GET.get('pagination') == 'keyset':
+            response_data["next_cursor"] = next_cursor
+        return JsonResponse(response_data)
 
     except Exception as e:
         logger.error(f"Error in raw_data_ajax: {str(e)}")
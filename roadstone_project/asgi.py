@@ -10,18 +10,21 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roadstone_project.settings')
+
+# Set up Django before the websocket routes are imported
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from data_processing.routing import websocket_urlpatterns
-from . import routing 
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roadstone_project.settings')
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": URLRouter(
+    "http": django_asgi_app,
+    "websocket": AuthMiddlewareStack(
         URLRouter(
-            routing.websocket_urlpatterns
+            websocket_urlpatterns
         )
     ),
 })
@@ -21,6 +21,18 @@ app.conf.beat_schedule = {
         'schedule': crontab(minute=0, hour='*/1'),  # Runs hourly at :00
         'kwargs': {'schedule_id': 1}  # Optional: Pass schedule ID
     },
+    'monitor-stalled-tasks': {
+        'task': 'data_processing.tasks.monitor_stalled_tasks',
+        'schedule': 300.0,  # Every 5 minutes; resumes ingestion jobs left unfinished
+    },
+    'create-batchlog-partitions': {
+        'task': 'data_processing.tasks.create_batchlog_partitions',
+        'schedule': crontab(minute=30, hour=2),  # Daily; partitions are created months ahead
+    },
+    'scan-energy-gaps': {
+        'task': 'data_processing.tasks.scan_energy_gaps',
+        'schedule': crontab(minute=15, hour=3),  # Daily; refetches days missing from each meter
+    },
 }
 
 app.autodiscover_tasks(['data_processing'])
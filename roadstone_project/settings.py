@@ -229,6 +229,35 @@ CELERY_BEAT_SCHEDULE = {
 PROCESSING_CHUNK_SIZE = 30
 CACHE_LOCK_TIMEOUT = 60 * 5
 
+# XML ingestion: stream files with iterparse instead of building the full tree
+XML_STREAMING_PARSER = True
+XML_SPOOL_MAX_SIZE = 8 * 1024 * 1024  # Downloads larger than this spill to a temp file
+XML_STREAMING_PROGRESS_EVERY = 100  # Batches between progress updates when streaming
+BATCH_INSERT_CHUNK_SIZE = 500  # BatchLog rows per bulk insert transaction
+PARALLEL_INGEST = False  # Fan pending files out to subtasks via a Celery chord
+PARALLEL_INGEST_CHUNK_SIZE = 10  # Files per fan-out subtask
+DISCOVERY_LOOKUP_BATCH_SIZE = 500  # File names per ProcessedFile lookup during discovery
+INGEST_PIPELINE = True  # Overlap FTP downloads, parsing and DB writes within the ingest task
+INGEST_PREFETCH_FILES = 2  # Downloaded files allowed to wait ahead of the parser
+INGEST_PIPELINE_QUEUE_SIZE = 4  # Parsed record chunks allowed to wait ahead of the DB writer
+INGEST_PIPELINE_JOIN_TIMEOUT = 30  # Seconds a stopped pipeline waits for its download/parse threads before dropping the FTP session
+INGEST_CLAIM_BATCH_SIZE = 10  # Files an ingest worker leases from its job's queue at a time
+INGEST_LEASE_SECONDS = 600  # Lease on claimed files, renewed after each file; expired claims can be taken over
+INGEST_MAX_FILE_ATTEMPTS = 3  # Claims of one file before it is marked failed instead of retried
+INGEST_LOCK_TTL = 120  # Seconds an ingest lock lease lasts; the running task renews it every third of that
+INGEST_LOCK_SCOPE = 'directory'  # Concurrent ingest runs: one per 'directory', per 'schedule', or 'global'
+INGEST_CONTROL_POLL_SECONDS = 1  # How often a worker re-reads pause/cancel commands when the cache has no pub/sub
+PROGRESS_UPDATES_PER_SECOND = 2  # WebSocket/result-backend progress updates per task; updates in between are merged (0 = no limit)
+DECIMAL_PARSE_CACHE_SIZE = 4096  # Distinct numeric literals memoised by safe_decimal
+DASHBOARD_METRICS_CACHE_TIMEOUT = 600  # Seconds a cached home dashboard stays valid without new data
+DASHBOARD_PUSH_DEBOUNCE_SECONDS = 5  # Commits within this window are pushed to live dashboards together
+DASHBOARD_TOPIC_TTL = 3600  # Seconds a live dashboard topic stays on the push list after its last subscribe
+PAGINATION_COUNT_CACHE_TIMEOUT = 300  # Seconds a cached BatchLog row count estimate is reused by keyset paging
+CSV_EXPORT_CHUNK_SIZE = 2000  # BatchLog rows fetched per server-side cursor round trip when streaming CSV
+EXPORT_ROW_GROUP_SIZE = 50000  # Rows per Parquet row group / Arrow record batch in background exports
+BATCHLOG_PARTITION_MONTHS_AHEAD = 3  # Future monthly BatchLogs partitions kept in place (PostgreSQL)
+COMPACT_DECIMAL_COLUMNS = False  # Store CentiDecimalField columns (BatchLog hot bins) as integer hundredths; run convert_compact_columns when changing
+
 
 # FTP Configuration (Use environment variables for sensitive data)
 FTP_HOST = os.getenv('FTP_HOST', 'waws-prod-db3-169.ftp.azurewebsites.windows.net')
@@ -236,9 +265,19 @@ FTP_USER = os.getenv('FTP_USER', 'tzcftp\\tzcftp2')
 FTP_PASS = os.getenv('FTP_PASS', 'M6@yPcCldNWXsmoyW')
 FTP_PORT = int(os.getenv('FTP_PORT', 21))  # Default FTP port
 REMOTE_DIR = os.getenv('REMOTE_DIR', '/site/wwwroot/ArchiveFiles/Roadstone Galway')
+FTP_POOL_MAX_SIZE = 4  # Idle sessions kept per host/user/directory (0 disables pooling)
+FTP_POOL_IDLE_TIMEOUT = 120  # Seconds before an idle pooled session is closed
 
 # Priority Metrics API
 PRIORITY_METRICS_API_KEY = os.getenv('PRIORITY_METRICS_API_KEY', 'og3jhZwwK5880')  # Default for dev
+ENERGY_API_BASE_URL = os.getenv(
+    'ENERGY_API_BASE_URL', 'https://tzcapi.azurewebsites.net/publicapi/GetConsumptions/72/1716'
+)  # GetConsumptions endpoint; /<start>/<end> dates are appended
+ENERGY_FETCH_WINDOW_DAYS = 7  # Days requested per GetConsumptions call during a backfill
+ENERGY_FETCH_CONCURRENCY = 4  # GetConsumptions calls in flight at once (also the HTTP pool size)
+ENERGY_FETCH_TIMEOUT = 30  # Seconds per GetConsumptions call
+ENERGY_GAP_MIN_READINGS = 1  # Readings a meter needs on a day for the gap scanner to count it as present
+ENERGY_GAP_MAX_ATTEMPTS = 3  # Refetches the gap scanner requests for a gap before leaving it
 
 
 